@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""Compare the per-frame latency of separate and batched OCR of detected boxes."""
+
+from __future__ import print_function
+
+import argparse
+from os.path import dirname, join
+from time import time
+from typing import Dict, List, Optional, Sequence  # noqa: F401
+
+from PIL import Image
+from twisted.internet import defer, task
+from twisted.internet.defer import Deferred  # noqa: F401
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+
+SCREEN = join(dirname(dirname(__file__)), "tests", "login.png")
+
+
+@defer.inlineCallbacks
+def bench(reactor, args):
+    # type: (object, argparse.Namespace) -> Deferred
+    with Image.open(args.screen) as img:
+        img.load()
+
+    results = {}  # type: Dict[str, List[float]]
+    for mode in args.modes:
+        algo = OCRAlgorithm(OCRConfig(ocr_mode=mode, ocr_cache_size=0, lang=args.lang))
+        durations = results[mode] = []
+        for _ in range(args.rounds):
+            start = time()
+            yield algo.find_text_in_image(img, args.text)
+            durations.append(time() - start)
+
+    for mode, durations in results.items():
+        print("%-10s min=%.3fs avg=%.3fs max=%.3fs" % (mode, min(durations), sum(durations) / len(durations), max(durations)))
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--screen", default=SCREEN, help="Screen image to analyze")
+    parser.add_argument("--text", default="LOGIN", help="Text to search")
+    parser.add_argument("--lang", default="eng", help="Tesseract language")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of frames per mode")
+    parser.add_argument("--modes", nargs="+", default=["separate", "batch"], help="OCR modes to compare")
+    args = parser.parse_args(argv)
+    task.react(bench, (args,))
+
+
+if __name__ == "__main__":
+    main()
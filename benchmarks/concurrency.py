@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+Compare driving many sessions from asyncio with the threaded vncdotool `api`.
+
+Each session connects to a local fake VNC server, waits several times for
+a text and disconnects. The threaded path drives each session from its own
+thread through `api.connect`. The asyncio path drives all sessions from one
+event loop through `vncautomate.aio`. OCR is simulated by a backend
+answering after a delay, with the same number of concurrent jobs in both
+modes. Each mode runs in its own process, as the reactors differ. Reported
+are the wall and CPU time, the peak number of threads and the peak memory:
+
+    PYTHONPATH=src python3 benchmarks/concurrency.py --sessions 50 --rounds 3
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import threading
+from time import process_time, time
+from typing import Any, List, Optional, Sequence  # noqa: F401
+
+MODES = ["threaded", "asyncio"]
+TEXT = "Next"
+HOCR = b"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><body>
+<p class='ocr_par'><span class='ocrx_word' title='bbox 100 100 180 120'>Next</span></p>
+</body></html>"""
+
+
+def delay_backend(workers, delay):
+    # type: (int, float) -> Any
+    """OCR backend recognizing the text in every image after the delay."""
+    from twisted.internet import reactor
+    from twisted.internet.task import deferLater
+
+    from vncautomate.backend import OCRBackend
+
+    class DelayBackend(OCRBackend):
+        def _recognize(self, img, lang):
+            # type: (Any, str) -> Any
+            return deferLater(reactor, delay, lambda: HOCR)
+
+    return DelayBackend(workers)
+
+
+def options(args):
+    # type: (argparse.Namespace) -> dict
+    return {"ocr_cache_size": 0, "poll_min_interval": args.poll_interval, "analysis_workers": args.analysis_workers}
+
+
+def report(args, start, cpu, threads, found):
+    # type: (argparse.Namespace, float, float, List[int], int) -> None
+    print(
+        "%-8s sessions=%3d found=%4d/%-4d wall=%6.2fs cpu=%6.2fs threads=%4d maxrss=%6.1fMB"
+        % (
+            args.mode,
+            args.sessions,
+            found,
+            args.sessions * args.rounds,
+            time() - start,
+            process_time() - cpu,
+            max(threads),
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        )
+    )
+
+
+def screen():
+    # type: () -> Any
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (1024, 768), "white")
+    ImageDraw.Draw(img).rectangle((90, 90, 190, 130), outline="black")
+    return img
+
+
+def bench_threaded(args):
+    # type: (argparse.Namespace) -> None
+    from twisted.internet import reactor
+    from vncdotool import api
+    from wakeup import FakeVNCFactory
+
+    from vncautomate.client import VNCAutomateFactory
+
+    class Factory(VNCAutomateFactory):
+        def buildProtocol(self, addr):
+            # type: (Any) -> Any
+            client = VNCAutomateFactory.buildProtocol(self, addr)
+            client.ocr_algo.backend = delay_backend(client.ocr_algo.config.ocr_workers, args.ocr_delay)
+            return client
+
+    port = reactor.listenTCP(0, FakeVNCFactory(screen()), interface="127.0.0.1")
+    address = "127.0.0.1::%d" % (port.getHost().port,)
+    threads = [threading.active_count()]
+    found = []  # type: List[Any]
+    start, cpu = time(), process_time()
+
+    def session(client):
+        # type: (Any) -> None
+        client.updateOCRConfig(**options(args))
+        for _ in range(args.rounds):
+            client.waitForText(TEXT, timeout=60, result=found)
+            threads.append(threading.active_count())
+        client.disconnect()
+
+    clients = [api.connect(address, factory_class=Factory) for _ in range(args.sessions)]
+    workers = [threading.Thread(target=session, args=(client,)) for client in clients]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    report(args, start, cpu, threads, len(found))
+    api.shutdown()
+
+
+def bench_asyncio(args):
+    # type: (argparse.Namespace) -> None
+    from twisted.internet import asyncioreactor
+
+    asyncioreactor.install()
+
+    import asyncio
+
+    from twisted.internet import reactor
+    from wakeup import FakeVNCFactory
+
+    from vncautomate.aio import AsyncSessionManager, run
+    from vncautomate.config import OCRConfig
+
+    port = reactor.listenTCP(0, FakeVNCFactory(screen()), interface="127.0.0.1")
+    address = "127.0.0.1::%d" % (port.getHost().port,)
+    threads = [threading.active_count()]
+    found = []  # type: List[Any]
+
+    async def session(manager, name):
+        # type: (AsyncSessionManager, str) -> None
+        client = await manager.connect(name, address)
+        for _ in range(args.rounds):
+            found.append(await client.wait_for_text(TEXT, timeout=60))
+            threads.append(threading.active_count())
+        await manager.disconnect(name)
+
+    async def main():
+        # type: () -> None
+        start, cpu = time(), process_time()
+        config = OCRConfig(**options(args))
+        backend = delay_backend(config.ocr_workers * args.sessions, args.ocr_delay)
+        async with AsyncSessionManager(config, backend) as manager:
+            await asyncio.gather(*[session(manager, "vm%d" % (isession,)) for isession in range(args.sessions)])
+        report(args, start, cpu, threads, len(found))
+
+    run(main)
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Number of concurrent sessions")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of searches per session")
+    parser.add_argument("--ocr-delay", type=float, default=0.2, help="Seconds of each simulated OCR job")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Minimum interval between two analyses poll_min_interval")
+    parser.add_argument("--analysis-workers", type=int, default=2, help="Threads analyzing screens analysis_workers")
+    parser.add_argument("--mode", choices=MODES, help="Run only this mode in this process")
+    args = parser.parse_args(argv)
+
+    if args.mode == "threaded":
+        bench_threaded(args)
+    elif args.mode == "asyncio":
+        bench_asyncio(args)
+    else:
+        for mode in MODES:
+            sys.stdout.flush()
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), "--mode", mode] + list(argv or sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
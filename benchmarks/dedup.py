@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+Compare the OCR coverage of a snapshot recognizing every box with merging the boxes and blanking them in the screen.
+
+The boxes of the test screen and of synthetic screens with buttons are
+detected. Reported are the areas and pixels passed to tesseract, the pixels
+per pixel of the screen, the CPU time of the snapshot and the labels found in
+the synthetic buttons:
+
+    PYTHONPATH=src python3 benchmarks/dedup.py
+"""
+
+from __future__ import print_function
+
+import argparse
+import resource
+from os.path import basename
+from time import process_time
+from typing import Any, List, Optional, Sequence, Tuple  # noqa: F401
+
+from PIL import Image
+from resize import SCREEN, SYNTHETIC, EmptyBackend, Label, synthetic_screen  # noqa: F401
+from twisted.internet import defer, task
+from twisted.internet.defer import Deferred  # noqa: F401
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+
+
+@defer.inlineCallbacks
+def bench(reactor, args):
+    # type: (Any, argparse.Namespace) -> Deferred
+    screens = []  # type: List[Tuple[str, Image.Image, Optional[List[Label]]]]
+    for path in args.screens:
+        with Image.open(path) as img:
+            screens.append((basename(path), img.convert("RGB"), None))
+    for spec in args.synthetic:
+        resolution, boxes = spec.split(":")
+        width, height = (int(i) for i in resolution.split("x"))
+        img, labels = synthetic_screen(width, height, int(boxes))
+        screens.append((spec, img, labels))
+
+    for name, img, labels in screens:
+        for coverage in ("all", "dedup"):
+            algo = OCRAlgorithm(OCRConfig(ocr_cache_size=0, lang=args.lang, img_resize=args.resize, ocr_coverage=coverage))
+            if args.skip_ocr:
+                algo.backend = EmptyBackend()
+            areas = []  # type: List[int]
+            recognize = algo.backend.recognize
+
+            def _counting(img, lang, recognize=recognize, areas=areas):
+                # type: (Image.Image, str, Any, List[int]) -> Deferred
+                areas.append(img.width * img.height)
+                return recognize(img, lang)
+
+            algo.backend.recognize = _counting
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            start = process_time()
+            snapshot = yield algo.snapshot(img)
+            cpu = process_time() - start
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu += usage.ru_utime + usage.ru_stime - children.ru_utime - children.ru_stime
+
+            found = "-"
+            if labels:
+                found = "%d/%d" % (sum(1 for label, _box in labels if snapshot.match(label)[1]), len(labels))
+            print(
+                "%-16s %-6s areas=%3d pixels=%6.2fM ratio=%.2f cpu=%7.2fs found=%s"
+                % (name, coverage, len(areas), sum(areas) / 1e6, algo.coverage.ratio, cpu, found)
+            )
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--screens", nargs="*", default=[SCREEN], help="Screen images to analyze")
+    parser.add_argument("--synthetic", nargs="*", default=SYNTHETIC, help="Synthetic screens WIDTHxHEIGHT:BOXES")
+    parser.add_argument("--resize", type=float, default=OCRConfig.img_resize, help="Resize factor img_resize")
+    parser.add_argument("--lang", default="eng", help="Tesseract language")
+    parser.add_argument("--skip-ocr", action="store_true", help="Do not run tesseract, only count the pixels")
+    args = parser.parse_args(argv)
+    task.react(bench, (args,))
+
+
+if __name__ == "__main__":
+    main()
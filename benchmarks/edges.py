@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""Compare the edge detection using scipy.signal.sepfir2d with the integer box filter."""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+from typing import Optional, Sequence, Tuple  # noqa: F401
+
+import numpy as np
+from scipy.signal import sepfir2d
+
+from vncautomate.edges import SMOOTHING, EdgeDetector
+
+RESOLUTIONS = ["1024x768", "1920x1080", "3840x2160"]
+
+
+def sepfir_edges(mat):
+    # type: (np.ndarray) -> Tuple[np.ndarray, np.ndarray]
+    """The edge detection with scipy.signal.sepfir2d replaced by `EdgeDetector`."""
+    mat = np.asarray(mat, dtype=np.float32)
+    gradient_kernel = np.array((0, 1, 0, -1, 0), dtype="float32")
+    smoothing_kernel = np.ones(SMOOTHING, dtype="float32")
+
+    vertical_edges = sepfir2d(mat, gradient_kernel, smoothing_kernel) / SMOOTHING
+    vertical_edges_positive = vertical_edges * (vertical_edges > 0)
+    vertical_edges_negative = vertical_edges * (vertical_edges < 0)
+    vertical_edges = (np.roll(vertical_edges_positive, -1, axis=1) - np.roll(vertical_edges_negative, 1, axis=1)) / 2
+
+    horizontal_edges = sepfir2d(mat, smoothing_kernel, gradient_kernel) / SMOOTHING
+    horizontal_edges_positive = horizontal_edges * (horizontal_edges > 0)
+    horizontal_edges_negative = horizontal_edges * (horizontal_edges < 0)
+    horizontal_edges = (np.roll(horizontal_edges_positive, -1, axis=0) - np.roll(horizontal_edges_negative, 1, axis=0)) / 2
+
+    return horizontal_edges, vertical_edges
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=10, help="Number of repetitions per resolution")
+    parser.add_argument("resolutions", nargs="*", default=RESOLUTIONS, help="Screen sizes WIDTHxHEIGHT")
+    args = parser.parse_args(argv)
+
+    rng = np.random.RandomState(0)
+    for resolution in args.resolutions:
+        width, height = (int(i) for i in resolution.split("x"))
+        mat = (rng.rand(height, width) > 0.9).astype(np.uint8) * 255
+        detector = EdgeDetector()
+        detector.detect(mat)
+
+        old = min(timeit.repeat(lambda: sepfir_edges(mat), number=1, repeat=args.rounds))
+        new = min(timeit.repeat(lambda: detector.detect(mat), number=1, repeat=args.rounds))
+        diff = max(np.abs(a - b).max() for a, b in zip(sepfir_edges(mat), detector.detect(mat)))
+        print("%-10s sepfir2d=%.1fms box=%.1fms speedup=%.1fx max_diff=%.2g" % (resolution, old * 1e3, new * 1e3, old / new, diff))
+
+
+if __name__ == "__main__":
+    main()
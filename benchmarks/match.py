@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""Compare the difflib based word matching with WordMatcher on large multi-paragraph screens."""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+from operator import itemgetter
+from typing import Iterator, Optional, Sequence, Tuple  # noqa: F401
+
+import numpy as np
+
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.words import Word, WordTable  # noqa: F401
+
+VOCABULARY = """
+Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua
+Installation Weiter Zurück Abbrechen Next Back Cancel Partition Festplatte Benutzername Passwort Domäne Rechnername
+""".split()
+
+
+def scan_line(line, pattern):
+    # type: (Sequence[Word], Sequence[str]) -> Iterator[Tuple[float, Sequence[Word]]]
+    """The scoring of all windows of the line with difflib replaced by `WordMatcher`."""
+    for iword, _ in enumerate(line):
+        words = line[iword : iword + len(pattern)]
+        scores = np.array([word.fuzzy_match(pat) for word, pat in zip(words, pattern)])
+        scores.resize(len(pattern), refcheck=False)
+        penalty = (1.0 * len(pattern)) / len(line)
+        yield (scores.mean() * (0.9 + penalty * 0.1), words)
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=3, help="Number of repetitions")
+    parser.add_argument("--lines", type=int, default=400, help="Number of OCR lines on the screen")
+    parser.add_argument("--words", type=int, default=15, help="Maximum number of words per line")
+    parser.add_argument("--min-score", type=float, default=0.7, help="Minimum score for pruning")
+    parser.add_argument("patterns", nargs="*", default=["Weiter", "Festplatte partitionieren", "Next"], help="Search patterns")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    lines = [[rng.choice(VOCABULARY) for _ in range(rng.randint(1, args.words))] for _ in range(args.lines)]
+    texts = [text for line in lines for text in line]
+    paragraphs = [iline for iline, line in enumerate(lines) for _ in line]
+    all_words = WordTable(texts, np.zeros((len(texts), 4)), paragraphs, len(lines)).lines()
+    algo = OCRAlgorithm()
+
+    def _difflib():
+        return max(
+            (m for pattern in args.patterns for line in all_words for m in scan_line(line, pattern.lower().split())),
+            key=itemgetter(0),
+        )
+
+    def _matcher():
+        return algo.find_best_matching_words(all_words, *args.patterns)
+
+    def _pruned():
+        return algo.find_best_matching_words(all_words, *args.patterns, min_score=args.min_score)
+
+    print("%d lines, %d words" % (len(all_words), sum(len(line) for line in all_words)))
+    for name, func in [("difflib", _difflib), ("matcher", _matcher), ("pruned", _pruned)]:
+        duration = min(timeit.repeat(func, number=1, repeat=args.rounds))
+        score, words = func()
+        print("%-8s %8.1fms score=%.3f match=%s" % (name, duration * 1e3, score, " ".join(word.word for word in words)))
+
+
+if __name__ == "__main__":
+    main()
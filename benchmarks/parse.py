@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""Compare parsing the words of large hOCR and TSV documents of 4K screens."""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+from typing import List, Optional, Sequence, Tuple  # noqa: F401
+
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.words import parse_hocr, parse_tsv
+
+VOCABULARY = """
+Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua
+Installation Weiter Zurück Abbrechen Next Back Cancel Partition Festplatte Benutzername Passwort Domäne Rechnername
+""".split()
+
+HOCR_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+def make_documents(width, height, seed=0):
+    # type: (int, int, int) -> Tuple[bytes, bytes, int]
+    """Fill the screen with paragraphs of words and render them as hOCR and TSV as tesseract does."""
+    rng = random.Random(seed)
+    hocr = [HOCR_HEADER, "<div class='ocr_page' id='page_1' title='bbox 0 0 %d %d'>" % (width, height)]
+    tsv = [TSV_HEADER, "1\t1\t0\t0\t0\t0\t0\t0\t%d\t%d\t-1\t" % (width, height)]
+    count = 0
+    block = 0
+    top = 10
+    while top + 40 < height:
+        block += 1
+        lines = rng.randint(1, 6)
+        bottom = top + 40 * lines
+        hocr.append("<div class='ocr_carea' id='block_1_%d' title='bbox 10 %d %d %d'>" % (block, top, width - 10, bottom))
+        hocr.append("<p class='ocr_par' id='par_1_%d' lang='eng' title='bbox 10 %d %d %d'>" % (block, top, width - 10, bottom))
+        tsv.append("2\t1\t%d\t0\t0\t0\t10\t%d\t%d\t%d\t-1\t" % (block, top, width - 20, bottom - top))
+        tsv.append("3\t1\t%d\t1\t0\t0\t10\t%d\t%d\t%d\t-1\t" % (block, top, width - 20, bottom - top))
+        for line in range(1, lines + 1):
+            hocr.append(
+                "<span class='ocr_line' id='line_1_%d' title='bbox 10 %d %d %d; baseline 0 -6; x_size 30'>"
+                % (count, top, width - 10, top + 30)
+            )
+            tsv.append("4\t1\t%d\t1\t%d\t0\t10\t%d\t%d\t30\t-1\t" % (block, line, top, width - 20))
+            left = 10
+            word = 0
+            while left < width - 300:
+                word += 1
+                count += 1
+                text = rng.choice(VOCABULARY)
+                size = 18 * len(text)
+                conf = rng.randint(50, 96)
+                markup = "<strong>%s</strong>" % text if rng.random() < 0.1 else text
+                hocr.append(
+                    "<span class='ocrx_word' id='word_1_%d' title='bbox %d %d %d %d; x_wconf %d'>%s</span> "
+                    % (count, left, top, left + size, top + 30, conf, markup)
+                )
+                tsv.append("5\t1\t%d\t1\t%d\t%d\t%d\t%d\t%d\t30\t%d\t%s" % (block, line, word, left, top, size, conf, text))
+                left += size + 20
+            hocr.append("</span>\n")
+            top += 40
+        hocr.append("</p></div>\n")
+        top += 20
+    hocr.append("</div></body></html>")
+    return "".join(hocr).encode("utf-8"), ("\n".join(tsv) + "\n").encode("utf-8"), count
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=5, help="Number of repetitions")
+    parser.add_argument("--width", type=int, default=3840, help="Width of the screen")
+    parser.add_argument("--height", type=int, default=2160, help="Height of the screen")
+    parser.add_argument("--resize", type=float, default=2.0, help="Resize factor of the image recognized by tesseract")
+    args = parser.parse_args(argv)
+
+    hocr, tsv, count = make_documents(int(args.width * args.resize), int(args.height * args.resize))
+    print("%d words, hOCR %.1f MB, TSV %.1f MB" % (count, len(hocr) / 1e6, len(tsv) / 1e6))
+
+    algo = OCRAlgorithm()
+    expected = [[(word.word, word.bbox.tolist()) for word in line] for line in algo.get_words_from_hocr(hocr)]
+    for name, func, data in [
+        ("hocr", algo.get_words_from_hocr, hocr),
+        ("tsv", algo.get_words_from_hocr, tsv),
+        ("hocr-columns", parse_hocr, hocr),
+        ("tsv-columns", parse_tsv, tsv),
+    ]:
+        duration = min(timeit.repeat(lambda: func(data), number=1, repeat=args.rounds))
+        result = func(data)
+        if isinstance(result, list):
+            same = [[(word.word, word.bbox.tolist()) for word in line] for line in result] == expected
+        else:
+            same = len(result) == count
+        print("%-13s %8.1fms %s" % (name, duration * 1e3, "ok" if same else "DIFFERENT"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+Compare recognizing boxes resized by `img_resize` and adapted to the height of their text.
+
+The boxes of the test screen are detected, those of synthetic screens with
+buttons of several font sizes are known. Each box is recognized on its own.
+Reported are the pixels passed to tesseract, the CPU time of the recognition,
+the boxes recognized with the same text as by the fixed factor and the labels
+found in their buttons:
+
+    PYTHONPATH=src python3 benchmarks/resize.py --text-height 24
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import resource
+from os.path import basename, dirname, join
+from time import process_time
+from typing import Any, Dict, List, Optional, Sequence, Tuple  # noqa: F401
+
+from PIL import Image, ImageDraw, ImageFont
+from twisted.internet import defer, task
+from twisted.internet.defer import Deferred, succeed  # noqa: F401
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+
+SCREEN = join(dirname(dirname(__file__)), "tests", "login.png")
+SYNTHETIC = ["1920x1080:30"]
+LABELS = ["Next", "Back", "Cancel", "OK", "Weiter", "Abbrechen", "Install", "Username", "Password", "Select disk"]
+FONT_SIZES = [10, 12, 16, 20, 24, 32, 48]
+
+Label = Tuple[str, Tuple[int, int, int, int]]
+
+
+class EmptyBackend(object):
+    """Backend recognizing nothing for counting the pixels without tesseract."""
+
+    def recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        return succeed((b"", 0.0))
+
+
+def synthetic_screen(width, height, boxes, seed=0):
+    # type: (int, int, int, int) -> Tuple[Image.Image, List[Label]]
+    """Draw a light screen with framed buttons of several font sizes and return it with the labels and the buttons."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (236, 236, 236))
+    draw = ImageDraw.Draw(img)
+    labels = []  # type: List[Label]
+    for _ in range(boxes):
+        label = rng.choice(LABELS)
+        font = ImageFont.load_default(size=rng.choice(FONT_SIZES))
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        box_width, box_height = right + 2 * (bottom - top), 3 * (bottom - top)
+        x, y = rng.randint(0, width - box_width - 1), rng.randint(0, height - box_height - 1)
+        draw.rectangle((x, y, x + box_width, y + box_height), fill="white", outline=(64, 64, 64))
+        draw.text((x + (bottom - top), y + (bottom - top) - top), label, fill="black", font=font)
+        labels.append((label, (x, y, x + box_width + 1, y + box_height + 1)))
+    return img, labels
+
+
+@defer.inlineCallbacks
+def bench_screen(algo, img, labels):
+    # type: (OCRAlgorithm, Image.Image, Optional[List[Label]]) -> Deferred
+    gray = img.convert("L")
+    boxes = [box for _label, box in labels] if labels else algo.boxes_from_image(gray)
+    pixels = []  # type: List[int]
+    recognize = algo.backend.recognize
+
+    def _counting(img, lang):
+        # type: (Image.Image, str) -> Deferred
+        pixels.append(img.width * img.height)
+        return recognize(img, lang)
+
+    algo.backend.recognize = _counting
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = process_time()
+    areas = yield defer.gatherResults([algo.ocr_img(gray, box) for box in boxes])
+    cpu = process_time() - start
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu += usage.ru_utime + usage.ru_stime - children.ru_utime - children.ru_stime
+    algo.backend.recognize = recognize
+
+    texts = [" ".join(word.word for line in words for word in line) for words in areas]
+    found = None
+    if labels:
+        min_score = algo.config.min_str_match_score
+        found = sum(1 for (label, _box), words in zip(labels, areas) if algo.find_best_matching_words(words, label, min_score=min_score)[1])
+    defer.returnValue({"boxes": len(boxes), "pixels": sum(pixels), "cpu": cpu, "texts": texts, "found": found})
+
+
+@defer.inlineCallbacks
+def bench(reactor, args):
+    # type: (Any, argparse.Namespace) -> Deferred
+    screens = []  # type: List[Tuple[str, Image.Image, Optional[List[Label]]]]
+    for path in args.screens:
+        with Image.open(path) as img:
+            screens.append((basename(path), img.convert("RGB"), None))
+    for spec in args.synthetic:
+        resolution, boxes = spec.split(":")
+        width, height = (int(i) for i in resolution.split("x"))
+        img, labels = synthetic_screen(width, height, int(boxes))
+        screens.append((spec, img, labels))
+
+    for name, img, labels in screens:
+        results = {}  # type: Dict[str, Dict[str, Any]]
+        for mode, text_height in (("fixed", 0), ("adaptive", args.text_height)):
+            algo = OCRAlgorithm(OCRConfig(ocr_cache_size=0, lang=args.lang, img_resize=args.resize, ocr_text_height=text_height))
+            if args.skip_ocr:
+                algo.backend = EmptyBackend()
+            results[mode] = result = yield bench_screen(algo, img, labels)
+            same = sum(text == fixed for text, fixed in zip(result["texts"], results["fixed"]["texts"]))
+            print(
+                "%-16s %-9s boxes=%3d pixels=%6.2fM cpu=%7.2fs same=%3d/%-3d found=%s"
+                % (
+                    name,
+                    mode,
+                    result["boxes"],
+                    result["pixels"] / 1e6,
+                    result["cpu"],
+                    same,
+                    result["boxes"],
+                    "-" if result["found"] is None else "%d/%d" % (result["found"], len(labels or [])),
+                )
+            )
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--screens", nargs="*", default=[SCREEN], help="Screen images to analyze")
+    parser.add_argument("--synthetic", nargs="*", default=SYNTHETIC, help="Synthetic screens WIDTHxHEIGHT:BOXES")
+    parser.add_argument("--resize", type=float, default=OCRConfig.img_resize, help="Resize factor img_resize")
+    parser.add_argument("--text-height", type=int, default=24, help="Target height of the lines of text ocr_text_height")
+    parser.add_argument("--lang", default="eng", help="Tesseract language")
+    parser.add_argument("--skip-ocr", action="store_true", help="Do not run tesseract, only count the pixels")
+    args = parser.parse_args(argv)
+    task.react(bench, (args,))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+Time the stages of the OCR pipeline separately.
+
+The stages run on the test screen and on synthetic screens with buttons at
+several resolutions and box densities. The results are written as JSON and
+can be compared to a previous run, failing on regressions:
+
+    PYTHONPATH=src python3 benchmarks/stages.py --output baseline.json
+    PYTHONPATH=src python3 benchmarks/stages.py --baseline baseline.json --tolerance 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import platform
+import random
+import sys
+from os.path import basename, dirname, join
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple  # noqa: F401
+
+import numpy as np
+from PIL import Image, ImageDraw
+from twisted.internet import defer, task
+from twisted.internet.defer import Deferred  # noqa: F401
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+
+SCREEN = join(dirname(dirname(__file__)), "tests", "login.png")
+SYNTHETIC = ["1024x768:10", "1024x768:50", "1920x1080:20", "1920x1080:100"]
+LABELS = ["Next", "Back", "Cancel", "OK", "Weiter", "Abbrechen", "Install", "Username", "Password", "Select disk"]
+STAGES = ["detect_edges", "find_lines", "detect_boxes", "ocr_img", "get_words_from_hocr", "find_best_matching_words"]
+
+Label = Tuple[str, Tuple[int, int, int, int]]
+
+
+def synthetic_screen(width, height, boxes, seed=0):
+    # type: (int, int, int, int) -> Tuple[Image.Image, List[Label]]
+    """Draw a light screen with framed buttons and return it with the labels and their bounding boxes."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), (236, 236, 236))
+    draw = ImageDraw.Draw(img)
+    labels = []  # type: List[Label]
+    for _ in range(boxes):
+        label = rng.choice(LABELS)
+        box_width, box_height = rng.randint(80, 240), rng.randint(24, 48)
+        left, top = rng.randint(0, width - box_width - 1), rng.randint(0, height - box_height - 1)
+        draw.rectangle((left, top, left + box_width, top + box_height), fill="white", outline=(64, 64, 64))
+        bbox = draw.textbbox((left + 8, top + box_height // 2 - 5), label)
+        draw.text((left + 8, top + box_height // 2 - 5), label, fill="black")
+        labels.append((label, bbox))
+    return img, labels
+
+
+def synthetic_hocr(labels, resize):
+    # type: (Sequence[Label], float) -> bytes
+    """hOCR document as tesseract would return for the labels of a screen resized by `resize`."""
+    paragraphs = []
+    for label, bbox in labels:
+        left, top, right, bottom = (int(round(i * resize)) for i in bbox)
+        words = label.split()
+        step = (right - left) // len(words)
+        spans = "".join(
+            "<span class='ocrx_word' title='bbox %d %d %d %d'>%s</span>" % (left + i * step, top, left + (i + 1) * step, bottom, word)
+            for i, word in enumerate(words)
+        )
+        paragraphs.append("<p class='ocr_par'><span class='ocr_line'>%s</span></p>" % (spans,))
+    body = "".join(paragraphs).encode("utf-8")
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>' + body + b"</body></html>"
+
+
+def timed(func, rounds):
+    # type: (Callable[[], Any], int) -> Dict[str, float]
+    durations = []
+    for _ in range(rounds):
+        start = time()
+        func()
+        durations.append(time() - start)
+    return {"min": min(durations), "median": float(np.median(durations))}
+
+
+@defer.inlineCallbacks
+def timed_async(func, rounds):
+    # type: (Callable[[], Deferred], int) -> Deferred
+    durations = []
+    for _ in range(rounds):
+        start = time()
+        yield func()
+        durations.append(time() - start)
+    defer.returnValue({"min": min(durations), "median": float(np.median(durations))})
+
+
+@defer.inlineCallbacks
+def bench_screen(algo, img, labels, args):
+    # type: (OCRAlgorithm, Image.Image, Optional[List[Label]], argparse.Namespace) -> Deferred
+    results = {}  # type: Dict[str, Dict[str, float]]
+    gray = img.convert("L")
+    mat_shape = tuple(reversed(gray.size))
+    find_lines = algo.LINE_ENGINES[algo.config.line_engine]
+
+    results["detect_edges"] = timed(lambda: algo.detect_edges(gray), args.rounds)
+    horizontal_edges, vertical_edges = (edges.copy() for edges in algo.detect_edges(gray))
+
+    def _find_lines():
+        # type: () -> Tuple[Any, Any, Any, Any]
+        vertical_segments = -np.ones(mat_shape, dtype="int64")
+        vertical_lines = find_lines(vertical_edges, vertical_segments, algo.config)
+        horizontal_segments = -np.ones(mat_shape, dtype="int64")
+        horizontal_lines = find_lines(horizontal_edges, horizontal_segments, algo.config)
+        return horizontal_lines, vertical_lines, horizontal_segments, vertical_segments
+
+    results["find_lines"] = timed(_find_lines, args.rounds)
+    lines = _find_lines()
+    results["detect_boxes"] = timed(lambda: list(algo.detect_boxes(*lines)), args.rounds)
+
+    hocr = None  # type: Optional[bytes]
+    if not args.skip_ocr:
+        results["ocr_img"] = yield timed_async(lambda: algo.ocr_img(gray, None), args.rounds)
+        prepared, _origin = algo._prepare(gray, [None]).crop(None)
+        hocr, _duration = yield algo.backend.recognize(prepared, algo.config.lang)
+    elif labels is not None:
+        hocr = synthetic_hocr(labels, algo.config.img_resize)
+
+    if hocr is not None:
+        results["get_words_from_hocr"] = timed(lambda: algo.get_words_from_hocr(hocr), args.rounds)
+        words = algo._transform(algo.get_word_table(hocr), (0, 0), algo.config.img_resize)
+        results["find_best_matching_words"] = timed(lambda: [algo.find_best_matching_words(words, text) for text in LABELS], args.rounds)
+
+    defer.returnValue(results)
+
+
+def compare(results, baseline, tolerance):
+    # type: (Dict[str, Dict[str, Dict[str, float]]], Dict[str, Dict[str, Dict[str, float]]], float) -> List[str]
+    """Print the change of the median durations and return the regressed stages."""
+    regressions = []
+    for screen, stages in sorted(results.items()):
+        for stage, result in sorted(stages.items()):
+            try:
+                before = baseline[screen][stage]["median"]
+            except KeyError:
+                continue
+            change = 100.0 * (result["median"] / before - 1) if before else 0.0
+            regressed = change > tolerance
+            flag = " REGRESSION" if regressed else ""
+            print("%-24s %-26s %8.2fms -> %8.2fms %+7.1f%%%s" % (screen, stage, before * 1e3, result["median"] * 1e3, change, flag))
+            if regressed:
+                regressions.append("%s/%s" % (screen, stage))
+    return regressions
+
+
+@defer.inlineCallbacks
+def bench(reactor, args):
+    # type: (Any, argparse.Namespace) -> Deferred
+    algo = OCRAlgorithm(OCRConfig(ocr_cache_size=0, lang=args.lang, line_engine=args.line_engine))
+    screens = []  # type: List[Tuple[str, Image.Image, Optional[List[Label]]]]
+    for path in args.screens:
+        with Image.open(path) as img:
+            screens.append((basename(path), img.convert("RGB"), None))
+    for spec in args.synthetic:
+        resolution, boxes = spec.split(":")
+        width, height = (int(i) for i in resolution.split("x"))
+        img, labels = synthetic_screen(width, height, int(boxes))
+        screens.append((spec, img, labels))
+
+    results = {}  # type: Dict[str, Dict[str, Dict[str, float]]]
+    for name, img, labels in screens:
+        results[name] = yield bench_screen(algo, img, labels, args)
+        for stage in STAGES:
+            if stage in results[name]:
+                result = results[name][stage]
+                print("%-24s %-26s min=%8.2fms median=%8.2fms" % (name, stage, result["min"] * 1e3, result["median"] * 1e3))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rounds": args.rounds,
+        "line_engine": args.line_engine,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)["results"]
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions above %.0f%%: %s" % (args.tolerance, ", ".join(regressions)), file=sys.stderr)
+            raise SystemExit(1)
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--screens", nargs="*", default=[SCREEN], help="Screen images to analyze")
+    parser.add_argument("--synthetic", nargs="*", default=SYNTHETIC, help="Synthetic screens WIDTHxHEIGHT:BOXES")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of repetitions per stage")
+    parser.add_argument("--lang", default="eng", help="Tesseract language")
+    parser.add_argument(
+        "--line-engine", default=OCRConfig.line_engine, choices=sorted(OCRAlgorithm.LINE_ENGINES), help="Line segmentation engine"
+    )
+    parser.add_argument("--skip-ocr", action="store_true", help="Do not run tesseract, parse synthetic hOCR instead")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Percentage by which a median may exceed the baseline")
+    args = parser.parse_args(argv)
+    task.react(bench, (args,))
+
+
+if __name__ == "__main__":
+    main()
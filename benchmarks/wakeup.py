@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+Measure how fast waitForText notices a new screen.
+
+A scripted local VNC server shows an empty screen and switches to the test
+screen after a delay. The latency between the switch and the end of
+waitForText is compared for fixed polling and for waking up on changes.
+"""
+
+from __future__ import print_function
+
+import argparse
+import struct
+from os.path import dirname, join
+from time import time
+from typing import Any, List, Optional, Sequence  # noqa: F401
+
+from PIL import Image
+from twisted.internet import defer, protocol, task
+from twisted.internet.defer import Deferred  # noqa: F401
+
+from vncautomate.client import VNCAutomateFactory
+
+SCREEN = join(dirname(dirname(__file__)), "tests", "login.png")
+
+MODES = {
+    # minimum and maximum interval between two analyses
+    "fixed": (2.0, 2.0),
+    "event": (0.2, 2.0),
+}
+
+
+class FakeVNCServer(protocol.Protocol):
+    """Minimal RFB 3.8 server sending raw 32 bit BGRX framebuffer updates."""
+
+    MESSAGE_SIZES = {0: 20, 3: 10, 4: 8, 5: 6}
+
+    def connectionMade(self):
+        # type: () -> None
+        self.buffer = b""
+        self.state = "version"
+        self.pending = False  # incremental update request waiting for a change
+        self.factory.clients.append(self)
+        self.transport.write(b"RFB 003.008\n")
+
+    def connectionLost(self, reason):
+        # type: (Any) -> None
+        self.factory.clients.remove(self)
+
+    def dataReceived(self, data):
+        # type: (bytes) -> None
+        self.buffer += data
+        while self.buffer and self._handle():
+            pass
+
+    def _consume(self, size):
+        # type: (int) -> Optional[bytes]
+        if len(self.buffer) < size:
+            return None
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _handle(self):
+        # type: () -> bool
+        if self.state == "version":
+            if self._consume(12) is None:
+                return False
+            self.transport.write(b"\x01\x01")  # security type None
+            self.state = "security"
+        elif self.state == "security":
+            if self._consume(1) is None:
+                return False
+            self.transport.write(struct.pack("!I", 0))
+            self.state = "init"
+        elif self.state == "init":
+            if self._consume(1) is None:
+                return False
+            width, height = self.factory.screen.size
+            pixel_format = struct.pack("!BBBBHHHBBBxxx", 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+            name = b"fake"
+            self.transport.write(struct.pack("!HH", width, height) + pixel_format + struct.pack("!I", len(name)) + name)
+            self.state = "normal"
+        else:
+            return self._handle_message()
+        return True
+
+    def _handle_message(self):
+        # type: () -> bool
+        msg_type = ord(self.buffer[0:1])
+        if msg_type == 2:  # SetEncodings
+            if len(self.buffer) < 4:
+                return False
+            (count,) = struct.unpack("!H", self.buffer[2:4])
+            return self._consume(4 + 4 * count) is not None
+        if msg_type == 6:  # ClientCutText
+            if len(self.buffer) < 8:
+                return False
+            (length,) = struct.unpack("!I", self.buffer[4:8])
+            return self._consume(8 + length) is not None
+
+        data = self._consume(self.MESSAGE_SIZES[msg_type])
+        if data is None:
+            return False
+        if msg_type == 3:  # FramebufferUpdateRequest
+            if data[1]:
+                self.pending = True
+            else:
+                self.send_screen()
+        return True
+
+    def send_screen(self):
+        # type: () -> None
+        self.pending = False
+        screen = self.factory.screen
+        width, height = screen.size
+        header = struct.pack("!BxHHHHHi", 0, 1, 0, 0, width, height, 0)
+        self.transport.write(header + screen.convert("RGBX").tobytes("raw", "BGRX"))
+
+    def screen_changed(self):
+        # type: () -> None
+        if self.pending:
+            self.send_screen()
+
+
+class FakeVNCFactory(protocol.Factory):
+    protocol = FakeVNCServer
+
+    def __init__(self, screen):
+        # type: (Image.Image) -> None
+        self.screen = screen
+        self.clients = []  # type: List[FakeVNCServer]
+
+    def show(self, screen):
+        # type: (Image.Image) -> float
+        self.screen = screen
+        for client in self.clients:
+            client.screen_changed()
+        return time()
+
+
+@defer.inlineCallbacks
+def bench(reactor, args):
+    # type: (Any, argparse.Namespace) -> Deferred
+    with Image.open(args.screen) as img:
+        target = img.convert("RGB")
+    blank = Image.new("RGB", target.size, "white")
+
+    results = {}  # type: dict
+    for mode in args.modes:
+        poll_min_interval, poll_max_interval = MODES[mode]
+        latencies = results[mode] = []
+        for _ in range(args.rounds):
+            server = FakeVNCFactory(blank)
+            port = reactor.listenTCP(0, server, interface="127.0.0.1")
+            factory = VNCAutomateFactory()
+            reactor.connectTCP("127.0.0.1", port.getHost().port, factory)
+            client = yield factory.deferred
+            client.updateOCRConfig(poll_min_interval=poll_min_interval, poll_max_interval=poll_max_interval, ocr_cache_size=0)
+
+            switched = []  # type: List[float]
+            reactor.callLater(args.delay, lambda: switched.append(server.show(target)))
+            found = []  # type: List[Any]
+            yield client.waitForText(args.text, timeout=args.delay + 30, result=found)
+            if found:
+                latencies.append(time() - switched[0])
+
+            client.transport.loseConnection()
+            yield port.stopListening()
+
+    for mode, latencies in results.items():
+        if latencies:
+            print("%-6s min=%.2fs avg=%.2fs max=%.2fs" % (mode, min(latencies), sum(latencies) / len(latencies), max(latencies)))
+        else:
+            print("%-6s text not found" % (mode,))
+
+
+def main(argv=None):
+    # type: (Optional[Sequence[str]]) -> None
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--screen", default=SCREEN, help="Screen image shown after the delay")
+    parser.add_argument("--text", default="LOGIN", help="Text to wait for")
+    parser.add_argument("--delay", type=float, default=3.3, help="Seconds until the screen is switched")
+    parser.add_argument("--rounds", type=int, default=3, help="Number of measurements per mode")
+    parser.add_argument("--modes", nargs="+", default=sorted(MODES), choices=sorted(MODES), help="Polling modes to compare")
+    args = parser.parse_args(argv)
+    task.react(bench, (args,))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ setup(
             sources=["src/vncautomate/segment_line.pyx"],
             language="c++",
         ),
+        Extension(
+            "vncautomate.similarity",
+            sources=["src/vncautomate/similarity.pyx"],
+            language="c++",
+        ),
     ],
     test_suite="tests",
 )
@@ -12,6 +12,7 @@ from typing import Optional, Type  # noqa: F401
 from vncdotool import api
 
 from .client import VNCAutomateClient, VNCAutomateFactory  # noqa: F401
+from .sessions import SessionManager  # noqa: F401
 
 
 def init_logger(debug_level="info"):
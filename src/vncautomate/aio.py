@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+"""
+asyncio front end of `VNCAutomateClient` and `SessionManager`.
+
+The Twisted reactor has to run on the asyncio event loop, so the asyncio
+reactor must be installed before `vncautomate` is imported:
+
+    from twisted.internet import asyncioreactor
+    asyncioreactor.install()
+
+    from vncautomate.aio import AsyncSessionManager, run
+
+Each awaited call runs in the event loop without a thread per session.
+Cancelling the awaiting task cancels the underlying Deferred, which stops
+waiting for the screen and cancels the queued and running OCR jobs of the
+search.
+"""
+
+from __future__ import absolute_import
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple  # noqa: F401
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.internet.task import deferLater, react
+
+from .client import VNCAutomateClient  # noqa: F401
+from .config import OCRConfig  # noqa: F401
+from .ocr import BBox, ScreenSnapshot  # noqa: F401
+from .sessions import SessionManager
+
+__all__ = [
+    "AsyncClient",
+    "AsyncSessionManager",
+    "run",
+]
+
+
+def _check_reactor():
+    # type: () -> None
+    from twisted.internet.asyncioreactor import AsyncioSelectorReactor
+
+    if not isinstance(reactor, AsyncioSelectorReactor):
+        raise RuntimeError("The asyncio reactor must be installed before importing vncautomate, found %s" % (reactor.__class__.__name__,))
+
+
+def _wait(deferred):
+    # type: (Deferred) -> asyncio.Future
+    """Wrap the Deferred into a Future of the running event loop. Cancelling the Future cancels the Deferred."""
+    return deferred.asFuture(asyncio.get_event_loop())
+
+
+class AsyncClient(object):
+    """
+    Awaitable interface of a connected `VNCAutomateClient`.
+
+    Unlike the methods of the client, failures such as a timeout are raised
+    as `VNCAutomateException` instead of being dropped.
+    """
+
+    def __init__(self, client):
+        # type: (VNCAutomateClient) -> None
+        self.client = client
+
+    async def wait_for_any_text(self, texts, timeout=30, wait=True, region=None):
+        # type: (Sequence[str], int, bool, Optional[BBox]) -> Tuple[str, Tuple[int, int]]
+        """
+        Wait until one of the texts is shown.
+
+        :returns: the best matching text and its position.
+        """
+        self.client.log.info("wait_for_any_text(%r, timeout=%.1f)", texts, timeout)
+        return await _wait(self.client._find_any_text(texts, timeout=timeout, wait=wait, region=region))
+
+    async def wait_for_text(self, text, timeout=30, wait=True, region=None):
+        # type: (str, int, bool, Optional[BBox]) -> Tuple[int, int]
+        """
+        Wait until the text is shown.
+
+        :returns: the position of the text.
+        """
+        self.client.log.info('wait_for_text("%s", timeout=%.1f)', text, timeout)
+        return await _wait(self.client._find_text(text, timeout=timeout, wait=wait, region=region))
+
+    async def click_on_text(self, text, timeout=30, region=None):
+        # type: (str, int, Optional[BBox]) -> Tuple[int, int]
+        """
+        Wait until the text is shown and click on it.
+
+        :returns: the position clicked on.
+        """
+        self.client.log.info('click_on_text("%s", timeout=%.1f)', text, timeout)
+        pos = await _wait(self.client._find_text(text, timeout=timeout, region=region))
+        self.client.mouseMove(*pos)
+        await _wait(deferLater(reactor, 0.1, self.client.mousePress, 1))
+        await _wait(deferLater(reactor, 0.1, self.client.mouseMove, 0, 0))
+        return pos
+
+    async def enter_text(self, text):
+        # type: (str) -> None
+        """Type the text key by key."""
+        self.client.log.info("enter_text(%r)", text)
+        await _wait(maybeDeferred(self.client.enterKeys, text, log=False))
+
+    async def snapshot(self):
+        # type: () -> ScreenSnapshot
+        """Recognize the current screen once."""
+        self.client.log.info("snapshot()")
+        await _wait(self.client.refreshScreen())
+        return await _wait(self.client._snapshot())
+
+
+class AsyncSessionManager(object):
+    """
+    Awaitable interface of a `SessionManager`.
+
+    >>> async def main():
+    ...     async with AsyncSessionManager(OCRConfig(lang="deu")) as manager:  # doctest: +SKIP
+    ...         vm1 = await manager.connect("vm1", "isala:2")
+    ...         await vm1.click_on_text("Weiter", timeout=120)
+    """
+
+    def __init__(self, config=None, backend=None):
+        # type: (Optional[OCRConfig], Any) -> None
+        _check_reactor()
+        self.manager = SessionManager(config, backend)
+
+    async def connect(self, name, server, password=None, **options):
+        # type: (str, str, Optional[str], **Any) -> AsyncClient
+        """Connect a new session, see `SessionManager.connect`."""
+        client = await _wait(self.manager.connect(name, server, password, **options))
+        return AsyncClient(client)
+
+    async def disconnect(self, name):
+        # type: (str) -> None
+        await _wait(self.manager.disconnect(name))
+
+    async def close(self):
+        # type: () -> None
+        await _wait(self.manager.close())
+
+    async def __aenter__(self):
+        # type: () -> AsyncSessionManager
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # type: (*Any) -> None
+        await self.close()
+
+
+def run(main, *args):
+    # type: (Callable[..., Awaitable[Any]], *Any) -> None
+    """
+    Run the coroutine function in the event loop of the running asyncio reactor and exit when it returns.
+
+    The reactor is started like by `twisted.internet.task.react`, so OCR
+    processes and analysis threads are managed by it.
+    """
+    _check_reactor()
+    react(lambda _reactor: Deferred.fromFuture(asyncio.ensure_future(main(*args))))
@@ -0,0 +1,487 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import logging
+import os
+import threading
+from collections import deque
+from io import BytesIO
+from tempfile import gettempdir, mkstemp
+from time import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple  # noqa: F401
+
+from PIL import Image  # noqa: F401
+from twisted.internet import reactor
+from twisted.internet.defer import CancelledError, Deferred, DeferredSemaphore, fail
+from twisted.internet.error import ProcessDone, ProcessExitedAlready
+from twisted.internet.protocol import ProcessProtocol
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
+
+from .config import OCRConfig  # noqa: F401
+from .trace import Tracer
+
+__all__ = [
+    "DaemonThreadPool",
+    "FairOCRPool",
+    "OCRBackend",
+    "OCRQueueFull",
+    "TesseractBackend",
+    "TesserocrBackend",
+    "create_backend",
+    "run_in_pool",
+]
+
+# debug only: keep tesseract input and output in gettempdir()
+KEEP_TMP = os.getenv("VNCAUTOMATE_TMP", "")
+
+HOCR_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+HOCR_FOOTER = b"</body></html>"
+
+
+class OCRQueueFull(RuntimeError):
+    """Raised for OCR requests exceeding the `max_queued` requests waiting for a worker."""
+
+
+class DaemonThreadPool(ThreadPool):
+    """
+    Thread pool whose threads do not keep the process alive.
+
+    The pool is stopped on reactor shutdown, but a process exiting without
+    stopping the reactor must not hang joining the idle worker threads.
+    """
+
+    def threadFactory(self, *args, **kwargs):
+        # type: (*Any, **Any) -> threading.Thread
+        thread = threading.Thread(*args, **kwargs)
+        thread.daemon = True
+        return thread
+
+
+def run_in_pool(pool, func, *args):
+    # type: (ThreadPool, Callable[..., Any], *Any) -> Deferred
+    """
+    Run the function in the thread pool.
+
+    :returns: Deferred firing in the reactor thread. A running function cannot
+        be interrupted, so cancelling the Deferred only drops its result.
+    """
+    deferred = Deferred(lambda _: None)
+
+    def _forward(result):
+        # type: (Any) -> None
+        if not deferred.called:
+            deferred.callback(result)
+
+    deferToThreadPool(reactor, pool, func, *args).addBoth(_forward)
+    return deferred
+
+
+class OCRBackend(object):
+    """
+    Interface for running tesseract on images.
+
+    At most `workers` images are recognized at the same time, further requests
+    are queued until a worker becomes available. If `max_queued` requests are
+    waiting already, further ones fail with `OCRQueueFull` instead of holding
+    their images without bound. The recognized words are returned in the
+    `output` format, either "hocr" or "tsv".
+    """
+
+    OUTPUTS = ("hocr", "tsv")
+
+    def __init__(self, workers=4, output="hocr", max_queued=0):
+        # type: (int, str, int) -> None
+        if output not in self.OUTPUTS:
+            raise ValueError("Unknown OCR output %r" % (output,))
+        self.log = logging.getLogger(__name__)
+        self.workers = max(1, workers)
+        self.output = output
+        self.max_queued = max_queued
+        self.semaphore = DeferredSemaphore(self.workers)
+        self.tracer = Tracer()
+
+    @property
+    def queued(self):
+        # type: () -> int
+        """Number of requests waiting for a free worker."""
+        return len(self.semaphore.waiting)
+
+    def recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        """
+        Recognize text in the given image.
+
+        :returns: Deferred firing with the hOCR or TSV document and the run time in seconds.
+            Cancelling it drops a queued request or stops a running one.
+        """
+        if self._full():
+            return fail(OCRQueueFull("%d OCR requests are waiting already" % (self.queued,)))
+        if self.queued:
+            self.log.debug("OCR request queued behind %d others", self.queued)
+        queued = self.tracer.span("queued", lanes="queue", size=img.size)
+        return self.semaphore.run(self._timed, img, lang, queued).addBoth(queued.close)
+
+    def _full(self):
+        # type: () -> bool
+        if self.max_queued <= 0 or self.queued < self.max_queued:
+            return False
+        self.log.warning("Rejecting OCR request, %d requests are waiting already", self.queued)
+        return True
+
+    def _timed(self, img, lang, queued):
+        # type: (Image.Image, str, Any) -> Deferred
+        queued.end()
+        span = self.tracer.span("recognize", lanes="workers", size=img.size)
+        start = time()
+        deferred = self._recognize(img, lang)
+        deferred.addBoth(span.close)
+        deferred.addCallback(lambda hocr_data: (hocr_data, time() - start))
+        return deferred
+
+    def _recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        raise NotImplementedError()
+
+    def close(self):
+        # type: () -> None
+        pass
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(workers=%d, queued=%d)" % (self.__class__.__name__, self.workers, self.queued)
+
+
+class _TesseractProtocol(ProcessProtocol):
+    """Feed the encoded image to tesseract via stdin and collect its output from stdout."""
+
+    def __init__(self, img_data, deferred):
+        # type: (bytes, Deferred) -> None
+        self.img_data = img_data
+        self.deferred = deferred
+        self.out = []  # type: List[bytes]
+        self.err = []  # type: List[bytes]
+
+    def connectionMade(self):
+        # type: () -> None
+        self.transport.write(self.img_data)
+        self.transport.closeStdin()
+
+    def outReceived(self, data):
+        # type: (bytes) -> None
+        self.out.append(data)
+
+    def errReceived(self, data):
+        # type: (bytes) -> None
+        self.err.append(data)
+
+    def processEnded(self, reason):
+        # type: (Failure) -> None
+        if self.deferred.called:
+            # cancelled
+            return
+        if reason.check(ProcessDone):
+            self.deferred.callback(b"".join(self.out))
+        else:
+            self.deferred.errback(reason)
+
+
+class TesseractBackend(OCRBackend):
+    """
+    Run the tesseract executable for each image, streaming data via stdin and stdout.
+
+    Images are encoded in the thread pool of the reactor, so the reactor keeps
+    serving the VNC connections meanwhile.
+    """
+
+    TESSERACT = "/usr/bin/tesseract"
+    FORMAT = "PNG"
+
+    def _recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        if not reactor.running:
+            return self._run(self._encode(img), lang)
+        return run_in_pool(reactor.getThreadPool(), self._encode, img).addCallback(self._run, lang)
+
+    def _encode(self, img):
+        # type: (Image.Image) -> bytes
+        buf = BytesIO()
+        img.save(buf, self.FORMAT)
+        return buf.getvalue()
+
+    def _run(self, img_data, lang):
+        # type: (bytes, str) -> Deferred
+        def _process_output(hocr_data):
+            # type: (bytes) -> bytes
+            self.log.debug("Read %d bytes from tesseract", len(hocr_data))
+            if KEEP_TMP:
+                self._dump(img_data, hocr_data)
+            return hocr_data
+
+        def _process_error(failure):
+            # type: (Failure) -> Failure
+            if failure.check(CancelledError):
+                return failure
+            stderr = b"".join(protocol.err).decode("utf-8", "replace").strip()
+            self.log.warning("tesseract failed: %s: %s", failure.getErrorMessage(), stderr)
+            if KEEP_TMP:
+                self._dump(img_data, b"")
+            return failure
+
+        def _kill(deferred):
+            # type: (Deferred) -> None
+            self.log.debug("Killing tesseract process %s", transport.pid)
+            try:
+                transport.signalProcess("KILL")
+            except ProcessExitedAlready:
+                pass
+
+        deferred = Deferred(_kill)
+        protocol = _TesseractProtocol(img_data, deferred)
+        cmd = [self.TESSERACT, "stdin", "stdout", "-l", lang, self.output]
+        self.log.debug("Running command: %s", " ".join(cmd))
+        transport = reactor.spawnProcess(protocol, cmd[0], cmd, os.environ)
+        deferred.addCallbacks(_process_output, _process_error)
+        return deferred
+
+    def _dump(self, img_data, hocr_data):
+        # type: (bytes, bytes) -> None
+        """Keep tesseract input and output for debugging if `VNCAUTOMATE_TMP` is set."""
+        fd, img_file_path = mkstemp(prefix="vnc_automate_", suffix="." + self.FORMAT.lower(), dir=gettempdir())
+        with os.fdopen(fd, "wb") as img_file:
+            img_file.write(img_data)
+        hocr_file_path = os.path.splitext(img_file_path)[0] + "." + self.output
+        with open(hocr_file_path, "wb") as hocr_file:
+            hocr_file.write(hocr_data)
+        self.log.debug("Dumped %r and %r", img_file_path, hocr_file_path)
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    Keep warm tesseract instances in a thread pool.
+
+    Each worker thread loads the language model once and reuses it for all
+    following images. Requires the optional `tesserocr` module.
+    """
+
+    def __init__(self, workers=4, output="hocr", max_queued=0):
+        # type: (int, str, int) -> None
+        import tesserocr  # noqa: F401
+
+        super(TesserocrBackend, self).__init__(workers, output, max_queued)
+        self.local = threading.local()
+        self.pool = DaemonThreadPool(self.workers, self.workers, "vncautomate-ocr")
+        self.pool.start()
+        self.trigger = reactor.addSystemEventTrigger("during", "shutdown", self.pool.stop)
+
+    def _recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        return run_in_pool(self.pool, self._run, img, lang)
+
+    def _run(self, img, lang):
+        # type: (Image.Image, str) -> bytes
+        import tesserocr
+
+        apis = self.local.__dict__.setdefault("apis", {})  # type: Dict[str, Any]
+        api = apis.get(lang)
+        if api is None:
+            self.log.debug("Loading tesseract model %r in %s", lang, threading.current_thread().name)
+            api = apis[lang] = tesserocr.PyTessBaseAPI(lang=lang)
+
+        api.SetImage(img)
+        if self.output == "tsv":
+            tsv = api.GetTSVText(0)
+            api.Clear()
+            return tsv.encode("utf-8")
+        hocr = api.GetHOCRText(0)
+        api.Clear()
+        return HOCR_HEADER + hocr.encode("utf-8") + HOCR_FOOTER
+
+    def close(self):
+        # type: () -> None
+        reactor.removeSystemEventTrigger(self.trigger)
+        self.pool.stop()
+
+
+class _Request(object):
+    """OCR request of a session waiting in the queue of a `FairOCRPool` or running."""
+
+    __slots__ = ("session", "img", "lang", "queued", "deferred", "running")
+
+    def __init__(self, session, img, lang, queued):
+        # type: (SessionBackend, Image.Image, str, Any) -> None
+        self.session = session
+        self.img = img
+        self.lang = lang
+        self.queued = queued
+        self.deferred = Deferred(self.cancel)
+        self.running = None  # type: Optional[Deferred]
+
+    def cancel(self, deferred):
+        # type: (Deferred) -> None
+        if self.running is None:
+            self.session.pool._drop(self)
+        else:
+            self.running.cancel()
+
+    def forward(self, result):
+        # type: (Any) -> None
+        if self.deferred.called:
+            return
+        if isinstance(result, Failure):
+            self.deferred.errback(result)
+        else:
+            self.deferred.callback(result)
+
+
+class SessionBackend(OCRBackend):
+    """
+    View of a `FairOCRPool` for one session.
+
+    It is used like any other backend by the `OCRAlgorithm` of the session.
+    Its requests are queued separately and run by the backend of the pool.
+    """
+
+    def __init__(self, pool, name):
+        # type: (FairOCRPool, str) -> None
+        super(SessionBackend, self).__init__(pool.workers, pool.backend.output, pool.backend.max_queued)
+        self.pool = pool
+        self.name = name
+        self.requests = deque()  # type: Deque[_Request]
+        self.served = 0
+
+    @property
+    def queued(self):
+        # type: () -> int
+        return len(self.requests)
+
+    def recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        if self._full():
+            return fail(OCRQueueFull("%d OCR requests of session %r are waiting already" % (self.queued, self.name)))
+        queued = self.tracer.span("queued", lanes="queue", size=img.size)
+        request = _Request(self, img, lang, queued)
+        self.pool._submit(request)
+        return request.deferred.addBoth(queued.close)
+
+    def _recognize(self, img, lang):
+        # type: (Image.Image, str) -> Deferred
+        return self.pool.backend._recognize(img, lang)
+
+    def close(self):
+        # type: () -> None
+        """Cancel the queued requests and leave the pool."""
+        self.pool.leave(self)
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(%r, queued=%d, served=%d)" % (self.__class__.__name__, self.name, self.queued, self.served)
+
+
+class FairOCRPool(object):
+    """
+    Share the workers of one OCR backend between several sessions.
+
+    Each session queues its requests separately. Whenever a worker becomes
+    available, the sessions with queued requests take turns, so a session
+    recognizing many boxes does not delay the searches of the others.
+
+    >>> pool = FairOCRPool(OCRBackend(workers=2))
+    >>> pool.join("vm1")
+    SessionBackend('vm1', queued=0, served=0)
+    """
+
+    def __init__(self, backend):
+        # type: (OCRBackend) -> None
+        self.log = logging.getLogger(__name__)
+        self.backend = backend
+        self.workers = backend.workers
+        self.running = 0
+        self.sessions = {}  # type: Dict[str, SessionBackend]
+        self._turns = deque()  # type: Deque[SessionBackend]
+
+    def join(self, name):
+        # type: (str) -> SessionBackend
+        """Create the backend of a new session."""
+        if name in self.sessions:
+            raise ValueError("Session %r already joined" % (name,))
+        session = self.sessions[name] = SessionBackend(self, name)
+        return session
+
+    def leave(self, session):
+        # type: (SessionBackend) -> None
+        """Remove the session, cancelling its queued requests. Running ones finish."""
+        if self.sessions.get(session.name) is not session:
+            return
+        del self.sessions[session.name]
+        while session.requests:
+            session.requests[0].deferred.cancel()
+
+    def _submit(self, request):
+        # type: (_Request) -> None
+        session = request.session
+        if session.name not in self.sessions:
+            request.deferred.errback(CancelledError("Session %r left the OCR pool" % (session.name,)))
+            return
+        if not session.requests:
+            self._turns.append(session)
+        session.requests.append(request)
+        if self.running >= self.workers:
+            self.log.debug("OCR request of %r queued behind %d others", session.name, len(session.requests) - 1)
+        self._dispatch()
+
+    def _drop(self, request):
+        # type: (_Request) -> None
+        session = request.session
+        session.requests.remove(request)
+        if not session.requests:
+            self._turns.remove(session)
+
+    def _dispatch(self):
+        # type: () -> None
+        while self.running < self.workers and self._turns:
+            session = self._turns.popleft()
+            request = session.requests.popleft()
+            if session.requests:
+                self._turns.append(session)
+            self.running += 1
+            session.served += 1
+            request.running = session._timed(request.img, request.lang, request.queued)
+            request.running.addBoth(self._done).addBoth(request.forward)
+
+    def _done(self, result):
+        # type: (Any) -> Any
+        self.running -= 1
+        self._dispatch()
+        return result
+
+    def close(self):
+        # type: () -> None
+        """Remove all sessions and stop the backend."""
+        for session in list(self.sessions.values()):
+            self.leave(session)
+        self.backend.close()
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(%r, running=%d, sessions=%d)" % (self.__class__.__name__, self.backend, self.running, len(self.sessions))
+
+
+BACKENDS = {
+    "tesseract": TesseractBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+
+def create_backend(config):
+    # type: (OCRConfig) -> OCRBackend
+    try:
+        backend_class = BACKENDS[config.ocr_backend]
+    except KeyError:
+        raise ValueError("Unknown OCR backend %r" % (config.ocr_backend,))
+
+    return backend_class(config.ocr_workers, config.ocr_output, config.ocr_queue_size)
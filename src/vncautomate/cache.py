@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional, Tuple  # noqa: F401
+
+from PIL import Image  # noqa: F401
+
+if TYPE_CHECKING:
+    from .words import WordTable  # noqa: F401
+
+__all__ = [
+    "OCRCache",
+]
+
+
+class OCRCache(object):
+    """
+    Bounded LRU cache for OCR results.
+
+    Entries are addressed by the content of the image region which is passed
+    to tesseract, so unchanged regions of consecutive screens are recognized
+    only once.
+
+    >>> cache = OCRCache(2)
+    >>> cache.get(b"a") is None
+    True
+    >>> cache.put(b"a", [], 1.5)
+    >>> cache.get(b"a")
+    []
+    >>> cache.put(b"b", [], 1.0)
+    >>> cache.put(b"c", [], 1.0)
+    >>> cache.get(b"a") is None
+    True
+    >>> cache
+    OCRCache(size=2/2, hits=1, misses=2, saved=1.5s)
+    """
+
+    def __init__(self, maxsize=256):
+        # type: (int) -> None
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # type: OrderedDict[bytes, Tuple[WordTable, float]]
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0.0  # seconds of tesseract run time saved by cache hits
+
+    @staticmethod
+    def key(img, lang, img_resize):
+        # type: (Image.Image, str, float) -> bytes
+        digest = hashlib.sha1()
+        digest.update(("%s:%dx%d:%s:%r:" % (img.mode, img.width, img.height, lang, img_resize)).encode("utf-8"))
+        digest.update(img.tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        # type: (bytes) -> Optional[WordTable]
+        try:
+            words, duration = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved += duration
+        return words
+
+    def put(self, key, words, duration):
+        # type: (bytes, WordTable, float) -> None
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = (words, duration)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        # type: () -> None
+        self._entries.clear()
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._entries)
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(size=%d/%d, hits=%d, misses=%d, saved=%.1fs)" % (
+            self.__class__.__name__,
+            len(self),
+            self.maxsize,
+            self.hits,
+            self.misses,
+            self.saved,
+        )
+
+    __str__ = __repr__
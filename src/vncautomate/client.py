@@ -5,16 +5,19 @@
 from __future__ import division
 
 import logging
+from operator import eq, itemgetter
 from time import time
-from typing import List, Optional, Sequence, Tuple, Union  # noqa: F401
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union  # noqa: F401
 
+from PIL import Image, ImageChops  # noqa: F401
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred  # noqa: F401
 from twisted.internet.task import deferLater
 from vncdotool.client import VNCDoException, VNCDoToolClient, VNCDoToolFactory
 
 from .config import OCRConfig
-from .ocr import OCRAlgorithm
+from .fingerprint import ScreenFingerprint
+from .ocr import BBox, OCRAlgorithm, ScreenSnapshot  # noqa: F401
 
 __all__ = [
     "VNCAutomateException",
@@ -30,19 +33,28 @@ class VNCAutomateException(VNCDoException):
 class State(object):
     HISTORY = 5
 
-    def __init__(self):
-        # type: () -> None
+    def __init__(self, same=eq, equal=eq):
+        # type: (Callable[[Any, Any], bool], Callable[[Any, Any], bool]) -> None
+        """
+        :param same: Check if two screens differ at most by changes tolerated while the screen settles.
+        :param equal: Check if two screens are exactly the same.
+        """
         self.start_time = time()
-        self.seen = []  # type: List[int]
-        self.last = 0
+        self.same = same
+        self.equal = equal
+        self.seen = []  # type: List[Any]
+        self.last = None  # type: Any
+        self.interval = 0.0
 
     def __str__(self):
         # type: () -> str
-        return "State(%r, last=%d)" % (self.seen, self.last)
+        return "State(%r, last=%r)" % (self.seen, self.last)
 
     def stable(self, key):
-        # type: (int) -> bool
+        # type: (Any) -> bool
         """
+        Check if the screen settled and differs from the screen analyzed last.
+
         >>> s = State()
         >>> s.stable(1)
         False
@@ -58,8 +70,8 @@ class State(object):
         >>> s.stable(1)
         True
         """
-        if key in self.seen:
-            if key != self.last:
+        if any(self.same(key, seen) for seen in self.seen):
+            if not self.analyzed(key):
                 self.last = key
                 return True
         else:
@@ -67,18 +79,97 @@ class State(object):
             del self.seen[: -self.HISTORY]
         return False
 
+    def analyzed(self, key):
+        # type: (Any) -> bool
+        """Check if the screen is unchanged since it was analyzed last."""
+        return self.last is not None and self.equal(key, self.last)
+
     def duration(self):
         return time() - self.start_time
 
+    def backoff(self, changed, minimum, maximum):
+        # type: (bool, float, float) -> float
+        """
+        Poll quickly after changes and back off exponentially while nothing changes.
+
+        >>> s = State()
+        >>> [s.backoff(changed, 0.5, 3.0) for changed in (False, False, False, False, True)]
+        [0.5, 1.0, 2.0, 3.0, 0.5]
+        """
+        self.interval = minimum if changed or not self.interval else min(maximum, 2 * self.interval)
+        return self.interval
+
+
+class _ChangeWaiter(object):
+    """Wait until the screen changed and settled, at most until a timeout."""
+
+    def __init__(self, client, timeout, settle):
+        # type: (VNCAutomateClient, float, float) -> None
+        self.client = client
+        self.settle = settle
+        self.deadline = reactor.seconds() + timeout
+        self.changed = False
+        self.deferred = Deferred(self.cancel)
+        self.timer = reactor.callLater(timeout, self.fire)
+        client._change_callbacks.append(self.on_change)
+        client.framebufferUpdateRequest(incremental=1)
+
+    def on_change(self):
+        # type: () -> None
+        # debounce: wait for the next update or until the screen did not change for some time
+        self.changed = True
+        self.timer.reset(max(0, min(self.settle, self.deadline - reactor.seconds())))
+        self.client.framebufferUpdateRequest(incremental=1)
+
+    def fire(self):
+        # type: () -> None
+        self.client._change_callbacks.remove(self.on_change)
+        self.deferred.callback(self.changed)
+
+    def cancel(self, deferred):
+        # type: (Deferred) -> None
+        self.timer.cancel()
+        self.client._change_callbacks.remove(self.on_change)
+
 
 class VNCAutomateClient(VNCDoToolClient):
-    PERIOD = 2.0  # delay between tries
+    PERIOD = 2.0  # maximum delay between tries unless set by poll_max_interval
 
     def __init__(self):
         # type: () -> None
         VNCDoToolClient.__init__(self)
         self.ocr_algo = OCRAlgorithm()
         self.log = logging.getLogger(__name__)
+        self.dirty = None  # type: Optional[List[BBox]]
+        self.ignore_regions = []  # type: List[BBox]
+        self.screen_changes = []  # type: List[BBox]
+        self._fingerprint = None  # type: Optional[ScreenFingerprint]
+        self._screen_size = None  # type: Optional[Tuple[int, int]]
+        self._analyzed = None  # type: Optional[Image.Image]
+        self._changed = False
+        self._change_callbacks = []  # type: List[Callable[[], None]]
+
+    def _mark_dirty(self, box):
+        # type: (BBox) -> None
+        self._changed = True
+        if self.dirty is not None:
+            self.dirty.append(box)
+
+    def commitUpdate(self, rectangles=None):
+        # type: (Optional[List[Tuple[int, int, int, int]]]) -> None
+        # remember which parts of the screen were updated since the last analysis, the pixels are compared later
+        size = self.screen.size if self.screen else None
+        if size != self._screen_size:
+            self._screen_size = size
+            self.dirty = None
+            self._changed = True
+        for x, y, width, height in rectangles or ():
+            self._mark_dirty((x, y, x + width, y + height))
+        VNCDoToolClient.commitUpdate(self, rectangles)
+        if self._changed:
+            self._changed = False
+            for callback in list(self._change_callbacks):
+                callback()
 
     def updateOCRConfig(self, *args, **kwargs):
         # type: (*OCRConfig, **str) -> VNCAutomateClient
@@ -90,69 +181,190 @@ class VNCAutomateClient(VNCDoToolClient):
             self.ocr_algo.config.update(**kwargs)
         return self
 
-    def _find_text(self, text, timeout=0, wait=True, _state=None):
-        # type: (str, int, bool, Optional[State]) -> Deferred
-        state = _state or State()
+    def ignoreRegions(self, *boxes):
+        # type: (*BBox) -> VNCAutomateClient
+        """Ignore changes in the given screen areas, e.g. a clock or a blinking cursor, when waiting for a stable screen."""
+        self.ignore_regions = list(boxes)
+        return self
+
+    def _same_screen(self, a, b):
+        # type: (ScreenFingerprint, ScreenFingerprint) -> bool
+        return a.similar(b, self.ocr_algo.config.stable_tolerance, self.ignore_regions)
+
+    def _equal_screen(self, a, b):
+        # type: (ScreenFingerprint, ScreenFingerprint) -> bool
+        return a.similar(b, 0.0, self.ignore_regions)
+
+    def _update_fingerprint(self):
+        # type: () -> ScreenFingerprint
+        fingerprint = ScreenFingerprint(self.screen, self.ocr_algo.config.stable_block)
+        if self._fingerprint is not None:
+            self.screen_changes = fingerprint.changes(self._fingerprint, self.ignore_regions)
+            self.log.debug("Changed screen areas: %s", self.screen_changes)
+        self._fingerprint = fingerprint
+        return fingerprint
+
+    def _find_text(self, text, timeout=0, wait=True, region=None):
+        # type: (str, int, bool, Optional[BBox]) -> Deferred
+        return self._find_any_text([text], timeout=timeout, wait=wait, region=region).addCallback(itemgetter(1))
+
+    def _find_any_text(self, texts, timeout=0, wait=True, region=None, _state=None):
+        # type: (Sequence[str], int, bool, Optional[BBox], Optional[State]) -> Deferred
+        state = _state or State(self._same_screen, self._equal_screen)
+        what = texts[0] if len(texts) == 1 else texts
+        tracer = self.ocr_algo.update_tracer()
+        tracer.new_attempt()
+        attempt = tracer.span("find_text", texts=list(texts))
+        refresh = tracer.span("refresh_screen")
 
         def _run_ocr(_):
-            # type: (None) -> Union[Tuple[int, int], Deferred]
+            # type: (None) -> Union[Tuple[str, Tuple[int, int]], Deferred]
+            refresh.end()
             if not self.screen.getbbox():
                 self.keyPress("ctrl")
                 return again()
 
-            key = hash(self.screen.tobytes())
-            if wait and not state.stable(key):
-                self.log.debug("Unchanged screen %s", state)
-                return again()
+            fingerprint = self._update_fingerprint()
+            if wait and not state.stable(fingerprint):
+                if state.analyzed(fingerprint):
+                    self.log.debug("Unchanged screen %s", state)
+                    return again()
+                self.log.debug("Changing screen %s", state)
+                return again(settle=True)
 
-            return self.ocr_algo.find_text_in_image(self.screen, text).addCallback(_check_result)
+            return self._search(texts, region).addCallback(_check_result)
 
-        def _check_result(click_point):
-            # type: (Optional[Tuple[int, int]]) -> Union[Tuple[int, int], Deferred]
-            if click_point is not None:
-                self.log.info("Found %r [%.1f sec]", text, state.duration())
-                return click_point
+        def _check_result(match):
+            # type: (Optional[Tuple[str, Tuple[int, int]]]) -> Union[Tuple[str, Tuple[int, int]], Deferred]
+            if match is not None:
+                self.log.info("Found %r [%.1f sec]", match[0], state.duration())
+                attempt.end(found=match[0])
+                return match
 
             return again()
 
-        def again():
-            # type: () -> Deferred
+        def again(settle=False):
+            # type: (bool) -> Deferred
+            attempt.end()
             duration = state.duration()
-            self.log.debug("Not found %r [%.1f sec]", text, duration)
+            self.log.debug("Not found %r [%.1f sec]", what, duration)
             if 0 < abs(timeout) <= duration:
-                raise VNCAutomateException("Search for string %r in VNC screen timed out after %.1f seconds!" % (text, duration))
-
-            return deferLater(
-                reactor,
-                self.PERIOD,
-                self._find_text,
-                text,
-                timeout=timeout,
-                wait=wait,
-                _state=state,
-            )
-
-        return self.refreshScreen().addCallback(_run_ocr)
-
-    def mouseClickOnText(self, text, timeout=30):
-        # type: (str, int) -> Deferred
+                raise VNCAutomateException("Search for string %r in VNC screen timed out after %.1f seconds!" % (what, duration))
+
+            config = self.ocr_algo.config
+            if settle:
+                # look again as soon as the screen had time to settle
+                waiting = tracer.span("settle")
+                return deferLater(reactor, config.poll_min_interval, waiting.close, True).addCallback(_retry)
+
+            # wake up on the next change of the screen
+            interval = state.interval or state.backoff(True, config.poll_min_interval, config.poll_max_interval or self.PERIOD)
+            if timeout:
+                interval = min(interval, abs(timeout) - duration)
+            waiting = tracer.span("wait_for_change", timeout=interval)
+            return _ChangeWaiter(self, interval, config.poll_min_interval).deferred.addBoth(waiting.close).addCallback(_retry)
+
+        def _retry(changed):
+            # type: (bool) -> Deferred
+            config = self.ocr_algo.config
+            state.backoff(changed, config.poll_min_interval, config.poll_max_interval or self.PERIOD)
+            return self._find_any_text(texts, timeout=timeout, wait=wait, region=region, _state=state)
+
+        deferred = self.refreshScreen().addCallback(_run_ocr).addBoth(attempt.close)
+        if _state is None and tracer.enabled:
+            deferred.addBoth(self._export_trace)
+        return deferred
+
+    def _export_trace(self, result):
+        # type: (Any) -> Any
+        path = self.ocr_algo.config.trace_file
+        if path:
+            self.ocr_algo.tracer.export(path)
+            self.log.debug("Wrote trace to %s", path)
+        return result
+
+    def _search(self, texts, region=None):
+        # type: (Sequence[str], Optional[BBox]) -> Deferred
+        return self._changed_screen().addCallback(lambda changed: self.ocr_algo.search(changed[0], *texts, dirty=changed[1], region=region))
+
+    def _snapshot(self):
+        # type: () -> Deferred
+        return self._changed_screen().addCallback(lambda changed: self.ocr_algo.snapshot(changed[0], dirty=changed[1]))
+
+    def _changed_screen(self):
+        # type: () -> Deferred
+        """
+        Copy the screen for an analysis and find the areas changed since the previous one.
+
+        :returns: Deferred firing with the copy and the changed areas, which
+            are compared in the thread pool of the analysis.
+        """
+        dirty, self.dirty = self.dirty, []
+        previous, screen = self._analyzed, self.screen.copy()
+        self._analyzed = screen
+        return self.ocr_algo._in_pool(self._changed_areas, previous, screen, dirty).addCallback(lambda dirty: (screen, dirty))
+
+    @staticmethod
+    def _changed_areas(previous, screen, dirty):
+        # type: (Optional[Image.Image], Image.Image, Optional[List[BBox]]) -> Optional[List[BBox]]
+        """Narrow the rectangles updated by the server to the pixels differing from the previous screen."""
+        if dirty is None or previous is None or previous.size != screen.size:
+            return None
+        changed = []  # type: List[BBox]
+        for box in dirty:
+            diff = ImageChops.difference(previous.crop(box), screen.crop(box)).getbbox()
+            if diff:
+                changed.append((box[0] + diff[0], box[1] + diff[1], box[0] + diff[2], box[1] + diff[3]))
+        return changed
+
+    def mouseClickOnText(self, text, timeout=30, region=None):
+        # type: (str, int, Optional[BBox]) -> Deferred
         self.log.info('mouseClickOnText("%s", timeout=%.1f)', text, timeout)
-        deferred = self._find_text(text).addTimeout(timeout, reactor)
+        deferred = self._find_text(text, region=region).addTimeout(timeout, reactor)
         deferred.addCallback(lambda pos: self.mouseMove(*pos))
         deferred.addCallback(lambda _client: deferLater(reactor, 0.1, self.mousePress, 1))
         deferred.addCallback(lambda _client: deferLater(reactor, 0.1, self.mouseMove, 0, 0))
         deferred.addBoth(lambda _: self)  # clear VNCAutomateException and prepare next vncdotool.client.deferred
         return deferred
 
-    def waitForText(self, text, timeout=30, wait=True, result=None):
-        # type: (str, int, bool, Optional[List[Tuple[int, int]]]) -> Deferred
+    def waitForText(self, text, timeout=30, wait=True, result=None, region=None):
+        # type: (str, int, bool, Optional[List[Tuple[int, int]]], Optional[BBox]) -> Deferred
         self.log.info('waitForText("%s", timeout=%.1f)', text, timeout)
-        deferred = self._find_text(text, timeout=timeout, wait=wait)
+        deferred = self._find_text(text, timeout=timeout, wait=wait, region=region)
         if result is not None:
             deferred.addCallback(lambda pos: result.append(pos))
         deferred.addBoth(lambda _: self)  # clear VNCAutomateException and prepare next vncdotool.client.deferred
         return deferred
 
+    def waitForAnyText(self, texts, timeout=30, wait=True, result=None, region=None):
+        # type: (Sequence[str], int, bool, Optional[List[Tuple[str, Tuple[int, int]]]], Optional[BBox]) -> Deferred
+        """
+        Wait until one of the texts is shown, e.g. one of several translations.
+
+        All texts are searched in the same recognized screen. The best matching
+        text and its position are appended to `result`. If `region` is given,
+        only this area of the screen is searched.
+        """
+        self.log.info("waitForAnyText(%r, timeout=%.1f)", texts, timeout)
+        deferred = self._find_any_text(texts, timeout=timeout, wait=wait, region=region)
+        if result is not None:
+            deferred.addCallback(lambda match: result.append(match))
+        deferred.addBoth(lambda _: self)  # clear VNCAutomateException and prepare next vncdotool.client.deferred
+        return deferred
+
+    def snapshotScreen(self, result):
+        # type: (List[ScreenSnapshot]) -> Deferred
+        """
+        Recognize the current screen once and append the `ScreenSnapshot` to `result`.
+
+        Several texts can then be searched in the snapshot without running OCR again.
+        """
+        self.log.info("snapshotScreen()")
+        deferred = self.refreshScreen().addCallback(lambda _: self._snapshot())
+        deferred.addCallback(result.append)
+        deferred.addBoth(lambda _: self)  # prepare next vncdotool.client.deferred
+        return deferred
+
     def enterKeys(self, keys, log=True):
         # type: (Sequence[str], bool) -> VNCAutomateClient
         if log:
@@ -22,9 +22,21 @@ class OCRConfig(object):
     dump_dir = ""  # type: str
     _dump_dir = "Dump every analyzed screen into the given directory"
 
+    trace_file = ""  # type: str
+    _trace_file = "Record the stages of each text search and write them as Chrome trace events to this file"
+
     img_resize = 2.0  # type: float
     _img_resize = "Resize factor for image to improve OCR results"
 
+    ocr_resample = "bicubic"  # type: str
+    _ocr_resample = "Resampling filter resizing the screen for OCR: 'nearest', 'box', 'bilinear', 'hamming', 'bicubic' or 'lanczos'"
+
+    ocr_threshold = 0  # type: int
+    _ocr_threshold = "Gray level below which pixels of the resized screen become black, all others white (0 keeps the gray levels)"
+
+    ocr_text_height = 0  # type: int
+    _ocr_text_height = "Resize each box so its lines of text become this many pixels tall, at most by img_resize (0 disables it)"
+
     box_max_height = 200  # type: int
     _box_max_height = "Specifies the maximum height a detect box can have"
 
@@ -49,9 +61,57 @@ class OCRConfig(object):
     line_segment_high_threshold = 20.0  # type: float
     _line_segment_high_threshold = "Minimum absolute gradient value for pixels to initiate a line segmentation"
 
+    line_engine = "flood"  # type: str
+    _line_engine = "Line segmentation: 'flood' fills connected edge pixels, 'runs' joins runs of edge pixels row by row"
+
     min_str_match_score = 0.7  # type: float
     _min_str_match_score = "Specifies the minimum score a words sequence match needs to have"
 
+    poll_min_interval = 0.2  # type: float
+    _poll_min_interval = "Seconds the screen must not change before it is analyzed again"
+
+    poll_max_interval = 0.0  # type: float
+    _poll_max_interval = "Maximum seconds between two analyses while the screen does not change, 0 for VNCAutomateClient.PERIOD"
+
+    stable_block = 16  # type: int
+    _stable_block = "Size of the pixel blocks averaged for comparing consecutive screens"
+
+    stable_tolerance = 0.001  # type: float
+    _stable_tolerance = "Fraction of the screen area which may still change while the screen is considered settled"
+
+    ocr_mode = "separate"  # type: str
+    _ocr_mode = "OCR mode: 'separate' recognizes the screen and each detected box on its own, 'batch' recognizes all of them at once"
+
+    ocr_coverage = "all"  # type: str
+    _ocr_coverage = "OCR coverage: 'all' recognizes every region and box, 'dedup' merges overlapping boxes and blanks them in the regions"
+
+    ocr_schedule = "all"  # type: str
+    _ocr_schedule = "OCR scheduling: 'all' recognizes all areas before searching, 'priority' recognizes small boxes first and stops at a confident match"
+
+    confident_score = 0.95  # type: float
+    _confident_score = "Minimum score of a match which ends the search early when scheduling by priority"
+
+    location_margin = 16  # type: int
+    _location_margin = "Pixels around the last location of a text which are searched first (0 disables the location memory)"
+
+    ocr_backend = "tesseract"  # type: str
+    _ocr_backend = "OCR backend: 'tesseract' runs the tesseract executable, 'tesserocr' keeps warm tesseract instances (requires tesserocr)"
+
+    ocr_output = "hocr"  # type: str
+    _ocr_output = "Output format of tesseract: 'hocr' or 'tsv', which is smaller and parsed faster"
+
+    ocr_workers = 4  # type: int
+    _ocr_workers = "Maximum number of OCR jobs running concurrently, further jobs are queued"
+
+    ocr_queue_size = 256  # type: int
+    _ocr_queue_size = "Maximum number of OCR jobs waiting for a worker, further jobs fail; 0 for no limit"
+
+    analysis_workers = 2  # type: int
+    _analysis_workers = "Number of threads analyzing screens off the reactor thread (0 analyzes on the reactor thread)"
+
+    ocr_cache_size = 256  # type: int
+    _ocr_cache_size = "Maximum number of OCR results of unchanged image regions kept in memory (0 disables the cache)"
+
     def __init__(self, **kwargs):
         # type: (**str) -> None
         for name, value in kwargs.items():
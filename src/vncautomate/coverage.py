@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple  # noqa: F401
+
+if TYPE_CHECKING:
+    from .words import Word  # noqa: F401
+
+__all__ = [
+    "CoveragePlan",
+    "CoverageStats",
+    "intersects",
+    "merge_regions",
+    "plan_coverage",
+]
+
+BBox = Tuple[int, int, int, int]
+Lines = List[List["Word"]]
+Masks = Dict[Optional[BBox], List[BBox]]
+
+
+def intersects(a, b):
+    # type: (BBox, BBox) -> bool
+    """
+    >>> intersects((0, 0, 10, 10), (5, 5, 20, 20))
+    True
+    >>> intersects((0, 0, 10, 10), (10, 0, 20, 10))
+    False
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def merge_regions(rects):
+    # type: (Iterable[BBox]) -> List[BBox]
+    """
+    Merge overlapping rectangles into their bounding rectangles.
+
+    >>> merge_regions([(0, 0, 10, 10), (50, 50, 60, 60), (5, 5, 20, 20)])
+    [(50, 50, 60, 60), (0, 0, 20, 20)]
+    """
+    regions = []  # type: List[BBox]
+    for rect in rects:
+        merged = True
+        while merged:
+            merged = False
+            for other in regions:
+                if intersects(rect, other):
+                    regions.remove(other)
+                    rect = (min(rect[0], other[0]), min(rect[1], other[1]), max(rect[2], other[2]), max(rect[3], other[3]))
+                    merged = True
+                    break
+        regions.append(rect)
+    return regions
+
+
+def _contains(outer, inner):
+    # type: (BBox, BBox) -> bool
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _pixels(box):
+    # type: (BBox) -> int
+    return int(round((box[2] - box[0]) * (box[3] - box[1])))
+
+
+def _within(words, box):
+    # type: (Lines, BBox) -> Lines
+    """The words whose center lies in the box."""
+    left, top, right, bottom = box
+
+    def _inside(bbox):
+        # type: (Sequence[float]) -> bool
+        return left <= (bbox[0] + bbox[2]) / 2.0 < right and top <= (bbox[1] + bbox[3]) / 2.0 < bottom
+
+    lines = ([word for word in line if _inside(word.bbox)] for line in words)
+    return [line for line in lines if line]
+
+
+class CoveragePlan(object):
+    """
+    Areas of the screen to recognize for some regions of the screen and the boxes in them.
+
+    :ivar areas: The areas to recognize, the regions followed by the boxes
+        or the merged boxes. `None` stands for the whole screen.
+    :ivar masks: The boxes to blank out of the areas as they are recognized on their own.
+    :ivar sources: For each box the index of the area it is recognized in.
+    :ivar pixels: Number of pixels of the screen which are recognized.
+    :ivar frame: Number of pixels of the screen.
+    """
+
+    def __init__(self, regions, boxes, areas, masks, sources, size):
+        # type: (Sequence[Optional[BBox]], Sequence[BBox], List[Optional[BBox]], Masks, List[int], Tuple[int, int]) -> None
+        self.regions = list(regions)
+        self.boxes = list(boxes)
+        self.areas = areas
+        self.masks = masks
+        self.sources = sources
+        self.size = size
+        self.frame = size[0] * size[1]
+        self.pixels = sum(size[0] * size[1] if area is None else _pixels(area) for area in areas)
+        self.pixels -= sum(_pixels(mask) for masks in masks.values() for mask in masks)
+
+    def assign(self, all_words):
+        # type: (Sequence[Lines]) -> List[Lines]
+        """
+        Distribute the words recognized in the areas to the regions and boxes.
+
+        Boxes recognized as part of a merged area get the words within them.
+        Regions get back the words of the boxes blanked out of them.
+        """
+        nregions = len(self.regions)
+        result = list(all_words[:nregions])
+        for iregion, region in enumerate(self.regions):
+            if region not in self.masks:
+                continue
+            bounds = (0, 0) + self.size if region is None else region
+            result[iregion] = list(result[iregion])
+            for area, words in zip(self.areas[nregions:], all_words[nregions:]):
+                if intersects(area, bounds):  # type: ignore
+                    result[iregion] += _within(words, bounds)  # type: ignore
+        for box, source in zip(self.boxes, self.sources):
+            words = all_words[source]
+            result.append(words if self.areas[source] == box else _within(words, box))
+        return result
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(areas=%d, boxes=%d, masks=%d, pixels=%d/%d)" % (
+            self.__class__.__name__,
+            len(self.areas),
+            len(self.boxes),
+            sum(len(masks) for masks in self.masks.values()),
+            self.pixels,
+            self.frame,
+        )
+
+
+def plan_coverage(regions, boxes, size, dedup=False):
+    # type: (Sequence[Optional[BBox]], Sequence[BBox], Tuple[int, int], bool) -> CoveragePlan
+    """
+    Plan which areas of the screen to recognize.
+
+    Without `dedup` the regions and every box are recognized, so each pixel
+    within a box is recognized at least twice. With `dedup` overlapping and
+    nested boxes are merged and recognized once, and they are blanked out of
+    the regions containing them.
+
+    >>> boxes = [(10, 10, 60, 30), (20, 15, 40, 25), (100, 100, 150, 120)]
+    >>> plan = plan_coverage([None], boxes, (200, 200))
+    >>> plan.pixels, plan.frame
+    (42200, 40000)
+    >>> plan = plan_coverage([None], boxes, (200, 200), dedup=True)
+    >>> plan.areas, plan.sources, plan.pixels
+    ([None, (10, 10, 60, 30), (100, 100, 150, 120)], [1, 1, 2], 40000)
+    """
+    if not dedup:
+        return CoveragePlan(regions, boxes, list(regions) + list(boxes), {}, list(range(len(regions), len(regions) + len(boxes))), size)
+
+    merged = merge_regions(boxes)
+    areas = list(regions) + merged  # type: List[Optional[BBox]]
+    sources = [len(regions) + next(imerged for imerged, rect in enumerate(merged) if _contains(rect, box)) for box in boxes]
+    masks = {}  # type: Masks
+    for region in regions:
+        left, top, right, bottom = (0, 0) + size if region is None else region  # type: ignore
+        clipped = [(max(left, l), max(top, t), min(right, r), min(bottom, b)) for l, t, r, b in merged]  # noqa: E741
+        clipped = [rect for rect in clipped if rect[0] < rect[2] and rect[1] < rect[3]]
+        if clipped:
+            masks[region] = clipped
+    return CoveragePlan(regions, boxes, areas, masks, sources, size)
+
+
+class CoverageStats(object):
+    """
+    Pixels recognized compared to the pixels of the analyzed screens.
+
+    >>> stats = CoverageStats()
+    >>> stats.add(plan_coverage([None], [(10, 10, 60, 30)], (200, 200)))
+    >>> stats
+    CoverageStats(frames=1, pixels=41000, frame_pixels=40000, ratio=1.02)
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.frames = 0
+        self.pixels = 0
+        self.frame_pixels = 0
+
+    def add(self, plan):
+        # type: (CoveragePlan) -> None
+        self.frames += 1
+        self.pixels += plan.pixels
+        self.frame_pixels += plan.frame
+
+    @property
+    def ratio(self):
+        # type: () -> float
+        """Pixels recognized per pixel of the screens."""
+        return self.pixels / self.frame_pixels if self.frame_pixels else 0.0
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(frames=%d, pixels=%d, frame_pixels=%d, ratio=%.2f)" % (
+            self.__class__.__name__,
+            self.frames,
+            self.pixels,
+            self.frame_pixels,
+            self.ratio,
+        )
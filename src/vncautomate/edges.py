@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import threading
+from collections import OrderedDict
+from typing import Tuple  # noqa: F401
+
+import numpy as np
+
+__all__ = [
+    "EdgeDetector",
+]
+
+SMOOTHING = 7  # number of pixels averaged across the gradient direction
+
+
+class _Buffers(object):
+    def __init__(self, shape):
+        # type: (Tuple[int, int]) -> None
+        height, width = shape
+        # mirrored rows plus a leading row of zeros for the cumulative sum
+        self.padded = np.zeros((height + SMOOTHING, width), dtype=np.int32)
+        half = SMOOTHING // 2
+        self.reflect = np.pad(np.arange(height), half, mode="symmetric") + half + 1
+        self.box = np.empty(shape, dtype=np.int32)
+        self.grad = np.empty(shape, dtype=np.int32)
+        self.edges = np.empty(shape, dtype=np.float32)
+
+
+class EdgeDetector(object):
+    """
+    Detect horizontal and vertical edges in gray scale images.
+
+    Box filters are computed with integer arithmetic from cumulative sums.
+    Intermediate and result arrays are allocated once per image size and
+    thread and reused for the following images of the same size.
+    """
+
+    def __init__(self, maxsize=4):
+        # type: (int) -> None
+        self.maxsize = maxsize
+        self._local = threading.local()
+
+    @property
+    def _buffers(self):
+        # type: () -> OrderedDict[Tuple[Tuple[int, int], int], _Buffers]
+        try:
+            return self._local.buffers
+        except AttributeError:
+            buffers = self._local.buffers = OrderedDict()
+            return buffers
+
+    def detect(self, mat):
+        # type: (np.ndarray) -> Tuple[np.ndarray, np.ndarray]
+        """
+        Compute the horizontal and vertical edges of the image.
+
+        The returned arrays are overwritten by the next call in the same thread for an image of the same size.
+        """
+        if min(mat.shape) < 3:
+            return np.zeros(mat.shape, dtype=np.float32), np.zeros(mat.shape, dtype=np.float32)
+
+        horizontal_edges = self._filter(mat.T, 0).T
+        vertical_edges = self._filter(mat, 1)
+        return horizontal_edges, vertical_edges
+
+    def _get_buffers(self, shape, axis):
+        # type: (Tuple[int, int], int) -> _Buffers
+        key = (shape, axis)
+        try:
+            self._buffers.move_to_end(key)
+            return self._buffers[key]
+        except KeyError:
+            buf = self._buffers[key] = _Buffers(shape)
+            while len(self._buffers) > self.maxsize:
+                self._buffers.popitem(last=False)
+            return buf
+
+    def _filter(self, mat, axis):
+        # type: (np.ndarray, int) -> np.ndarray
+        # gradient along the rows smoothed along the columns
+        height = mat.shape[0]
+        half = SMOOTHING // 2
+        buf = self._get_buffers(mat.shape, axis)
+
+        # mirror rows at the top and bottom border including the border row, as sepfir2d does
+        padded = buf.padded
+        np.copyto(padded[half + 1 : half + 1 + height], mat, casting="unsafe")
+        padded[1 : half + 1] = padded[buf.reflect[:half]]
+        padded[half + 1 + height :] = padded[buf.reflect[half + height :]]
+
+        # sum of SMOOTHING rows
+        np.cumsum(padded, axis=0, out=padded)
+        box = buf.box
+        np.subtract(padded[SMOOTHING:], padded[:-SMOOTHING], out=box)
+
+        # central difference along the rows with mirrored border columns
+        grad = buf.grad
+        np.subtract(box[:, 2:], box[:, :-2], out=grad[:, 1:-1])
+        np.subtract(box[:, 1], box[:, 0], out=grad[:, 0])
+        np.subtract(box[:, -1], box[:, -2], out=grad[:, -1])
+
+        # move positive gradients one pixel left and negative gradients one pixel right, wrapping around like np.roll
+        pos = buf.box
+        np.maximum(grad, 0, out=pos)
+        np.minimum(grad, 0, out=grad)
+        edges = buf.edges
+        np.subtract(pos[:, 2:], grad[:, :-2], out=edges[:, 1:-1])
+        np.subtract(pos[:, 1], grad[:, -1], out=edges[:, 0])
+        np.subtract(pos[:, 0], grad[:, -2], out=edges[:, -1])
+        edges *= 1.0 / (2 * SMOOTHING)
+        return edges
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+from math import ceil
+from typing import Iterable, List, Tuple  # noqa: F401
+
+import numpy as np
+from PIL import Image
+
+__all__ = [
+    "ScreenFingerprint",
+]
+
+BBox = Tuple[int, int, int, int]
+_Resampling = getattr(Image, "Resampling", Image)
+
+
+class ScreenFingerprint(object):
+    """
+    Blockwise summary of a screen for cheap and tolerant comparisons.
+
+    The screen is scaled down by averaging blocks of pixels, so the full frame
+    is neither copied nor hashed.
+
+    >>> img = Image.new("RGB", (64, 32), "white")
+    >>> a = ScreenFingerprint(img, 16)
+    >>> img.putpixel((40, 20), (0, 0, 0))
+    >>> b = ScreenFingerprint(img, 16)
+    >>> b.change_ratio(a)
+    0.125
+    >>> b.change_count(a)
+    1
+    >>> b.changes(a)
+    [(32, 16, 48, 32)]
+    >>> b.similar(a, 0.125)
+    True
+    >>> b.similar(a, ignore=[(40, 20, 41, 21)])
+    True
+    """
+
+    def __init__(self, img, block=16):
+        # type: (Image.Image, int) -> None
+        self.size = img.size
+        self.block = block
+        width, height = img.size
+        shape = (max(1, int(ceil(width / block))), max(1, int(ceil(height / block))))
+        self.scale = (width / shape[0], height / shape[1])
+        self.blocks = np.asarray(img.resize(shape, _Resampling.BOX), dtype=np.int16)
+
+    def mask(self, ignore):
+        # type: (Iterable[BBox]) -> np.ndarray
+        """Mask of all blocks overlapping the given rectangles."""
+        mask = np.zeros(self.blocks.shape[:2], dtype=bool)
+        sx, sy = self.scale
+        for left, top, right, bottom in ignore:
+            mask[int(top // sy) : int(ceil(bottom / sy)), int(left // sx) : int(ceil(right / sx))] = True
+        return mask
+
+    def changed(self, other, ignore=()):
+        # type: (ScreenFingerprint, Iterable[BBox]) -> np.ndarray
+        """Mask of the blocks differing from the other screen, except the ignored rectangles."""
+        if other.size != self.size or other.block != self.block:
+            return np.ones(self.blocks.shape[:2], dtype=bool)
+
+        changed = self.blocks != other.blocks
+        if changed.ndim == 3:
+            changed = changed.any(2)
+        changed &= ~self.mask(ignore)
+        return changed
+
+    def change_count(self, other, ignore=()):
+        # type: (ScreenFingerprint, Iterable[BBox]) -> int
+        """Number of the blocks which changed."""
+        return int(self.changed(other, ignore).sum())
+
+    def change_ratio(self, other, ignore=()):
+        # type: (ScreenFingerprint, Iterable[BBox]) -> float
+        """Fraction of the compared blocks which changed."""
+        ignore = list(ignore)
+        compared = int((~self.mask(ignore)).sum())
+        return float(self.changed(other, ignore).sum()) / compared if compared else 0.0
+
+    def similar(self, other, tolerance=0.0, ignore=()):
+        # type: (ScreenFingerprint, float, Iterable[BBox]) -> bool
+        """Check if at most the fraction `tolerance` of the compared screen area changed."""
+        return self.change_ratio(other, ignore) <= tolerance
+
+    def changes(self, other, ignore=()):
+        # type: (ScreenFingerprint, Iterable[BBox]) -> List[BBox]
+        """Rectangles in screen coordinates covering the changed blocks, joined per row of blocks."""
+        width, height = self.size
+        sx, sy = self.scale
+        rects = []  # type: List[BBox]
+        for y, row in enumerate(self.changed(other, ignore)):
+            xs = np.flatnonzero(row)
+            if not len(xs):
+                continue
+            breaks = np.flatnonzero(np.diff(xs) > 1)
+            for start, end in zip(np.r_[xs[0], xs[breaks + 1]], np.r_[xs[breaks], xs[-1]] + 1):
+                rects.append((int(start * sx), int(y * sy), min(width, int(ceil(end * sx))), min(height, int(ceil((y + 1) * sy)))))
+        return rects
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(%dx%d/%d)" % (self.__class__.__name__, self.size[0], self.size[1], self.block)
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple  # noqa: F401
+
+__all__ = [
+    "LocationMemory",
+]
+
+BBox = Tuple[int, int, int, int]
+
+
+class LocationMemory(object):
+    """
+    Remember where texts have been found last.
+
+    Installers show the same buttons at the same places on many screens, so
+    the remembered areas are searched first before analyzing the whole screen.
+    For each text the area around the matched words and the smallest box
+    enclosing them are kept.
+
+    >>> memory = LocationMemory()
+    >>> memory.put("OK", (20, 20, 40, 30), [(0, 0, 100, 100), (10, 10, 50, 40)], (100, 100), 5)
+    >>> memory.regions(["OK", "Cancel"])
+    [(15, 15, 45, 35), (10, 10, 50, 40)]
+    >>> memory.boxes(["OK"])
+    [(10, 10, 50, 40)]
+    >>> memory.hits += 1
+    >>> memory
+    LocationMemory(size=1, hits=1, misses=0, hit_rate=100%)
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._regions = {}  # type: Dict[str, List[BBox]]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._regions)
+
+    @property
+    def hit_rate(self):
+        # type: () -> float
+        """Fraction of searches answered from the remembered areas."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def regions(self, texts):
+        # type: (Iterable[str]) -> List[BBox]
+        """Distinct remembered areas of all texts."""
+        regions = []  # type: List[BBox]
+        for text in texts:
+            for region in self._regions.get(text, ()):
+                if region not in regions:
+                    regions.append(region)
+        return regions
+
+    def boxes(self, texts):
+        # type: (Iterable[str]) -> List[BBox]
+        """Distinct remembered boxes enclosing any of the texts."""
+        boxes = []  # type: List[BBox]
+        for text in texts:
+            for box in self._regions.get(text, ())[1:]:
+                if box not in boxes:
+                    boxes.append(box)
+        return boxes
+
+    def put(self, text, bbox, boxes, size, margin):
+        # type: (str, BBox, Sequence[BBox], Tuple[int, int], int) -> None
+        """Remember the text found at `bbox` extended by `margin` and the smallest of `boxes` enclosing it."""
+        width, height = size
+        left, top, right, bottom = bbox
+        regions = [(max(0, left - margin), max(0, top - margin), min(width, right + margin), min(height, bottom + margin))]
+        enclosing = [box for box in boxes if box[0] <= left and box[1] <= top and right <= box[2] and bottom <= box[3]]
+        if enclosing:
+            regions.append(min(enclosing, key=lambda box: (box[2] - box[0]) * (box[3] - box[1])))
+        self._regions[text] = regions
+
+    def forget(self, text=None):
+        # type: (Optional[str]) -> None
+        """Forget the location of the text or of all texts."""
+        if text is None:
+            self._regions.clear()
+        else:
+            self._regions.pop(text, None)
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(size=%d, hits=%d, misses=%d, hit_rate=%.0f%%)" % (
+            self.__class__.__name__,
+            len(self),
+            self.hits,
+            self.misses,
+            100 * self.hit_rate,
+        )
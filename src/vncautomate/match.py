@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import difflib
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple  # noqa: F401
+
+if TYPE_CHECKING:
+    from .words import Word  # noqa: F401
+
+try:
+    from .similarity import ratio as fast_ratio  # type: ignore
+except ImportError:  # extension not built
+    fast_ratio = None
+
+__all__ = [
+    "WordMatcher",
+]
+
+
+class WordMatcher(object):
+    """
+    Fuzzy matching of a search pattern against lines of OCR words.
+
+    Words are scored by `difflib.SequenceMatcher.ratio`, computed by the C
+    extension `similarity` with identical results. Without the extension the
+    matchers keep the pattern words as the second sequence of difflib, which
+    analyzes them only once. The ratio of each word is remembered. Windows are
+    skipped as soon as an upper bound of their score shows they cannot win.
+
+    >>> matcher = WordMatcher("Next")
+    >>> matcher.ratio(0, "next")
+    1.0
+    >>> matcher.upper_bound(0, "nex")
+    0.8571428571428571
+    """
+
+    def __init__(self, pattern):
+        # type: (str) -> None
+        self.log = logging.getLogger(__name__)
+        self.pattern = pattern
+        self.tokens = pattern.lower().split()
+        self._lengths = [len(token) for token in self.tokens]
+        self._matchers = [difflib.SequenceMatcher(None, "", token) for token in self.tokens]
+        self._ratios = [{} for _ in self.tokens]  # type: List[Dict[str, float]]
+
+    def ratio(self, itoken, word):
+        # type: (int, str) -> float
+        """Similarity of the lower case word and the pattern word at index `itoken`."""
+        ratios = self._ratios[itoken]
+        try:
+            return ratios[word]
+        except KeyError:
+            if fast_ratio is None:
+                matcher = self._matchers[itoken]
+                matcher.set_seq1(word)
+                ratio = ratios[word] = matcher.ratio()
+            else:
+                ratio = ratios[word] = fast_ratio(word, self.tokens[itoken])
+            return ratio
+
+    def upper_bound(self, itoken, word):
+        # type: (int, str) -> float
+        """Upper bound of `ratio()` only depending on the lengths, same as `SequenceMatcher.real_quick_ratio`."""
+        length = len(word) + self._lengths[itoken]
+        return 2.0 * min(len(word), self._lengths[itoken]) / length if length else 1.0
+
+    def best_match(self, line, min_score=0.0, best_score=-1.0):
+        # type: (Sequence[Word], float, float) -> Optional[Tuple[float, Sequence[Word]]]
+        """
+        Find the sequence of words in the line matching the pattern best.
+
+        The score is the mean similarity of the words, penalized slightly by the
+        coverage of the whole line. Windows which cannot score higher than
+        `best_score` or reach `min_score` are skipped.
+
+        :returns: the score and the words of the best match or `None`.
+        """
+        npattern = len(self.tokens)
+        if not line or not npattern:
+            return None
+
+        debug = self.log.isEnabledFor(logging.DEBUG)
+        # compute overall matching score and penalize slightly by coverage of whole line
+        penalty = (1.0 * npattern) / len(line)
+        factor = 0.9 + penalty * 0.1
+        best = None  # type: Optional[Tuple[float, Sequence[Word]]]
+        for iword in range(len(line)):
+            words = line[iword : iword + npattern]
+            bounds = [self.upper_bound(itoken, word.lower) for itoken, word in enumerate(words)]
+            bound = sum(bounds) / npattern * factor
+            if bound < min_score or bound <= best_score:
+                continue
+
+            total = 0.0
+            for itoken, word in enumerate(words):
+                total += self.ratio(itoken, word.lower)
+                if (total + sum(bounds[itoken + 1 :])) / npattern * factor <= best_score:
+                    break
+            else:
+                score = total / npattern
+                final_score = score * factor
+                if debug:
+                    self.log.debug(
+                        "  Words %s scored %.3f*(.9+%.3f*.1)=%.3f", ".".join(word.word for word in words), score, penalty, final_score
+                    )
+                if final_score > best_score and final_score >= min_score:
+                    best = (final_score, words)
+                    best_score = final_score
+
+        return best
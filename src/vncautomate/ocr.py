@@ -4,14 +4,12 @@
 
 from __future__ import absolute_import, division
 
-import difflib
 import logging
 import os
 import re
 from datetime import datetime
 from operator import itemgetter
-from tempfile import gettempdir
-from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple, cast  # noqa: F401
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union, cast  # noqa: F401
 
 try:
     import lxml.etree as ET
@@ -20,17 +18,27 @@ except ImportError:
 
 import numpy as np
 from PIL import Image, ImageDraw, ImageOps
-from scipy.signal import sepfir2d
-from twisted.internet import utils
-from twisted.internet.defer import Deferred, gatherResults
+from scipy.spatial import cKDTree
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, gatherResults, maybeDeferred, succeed
+from twisted.python.failure import Failure  # noqa: F401
 
 from . import segment_line  # type: ignore
+from .backend import DaemonThreadPool, OCRBackend, create_backend, run_in_pool  # noqa: F401
+from .cache import OCRCache
 from .config import OCRConfig
+from .coverage import CoveragePlan, CoverageStats, intersects, merge_regions, plan_coverage  # noqa: F401
+from .edges import EdgeDetector
+from .locations import LocationMemory
+from .match import WordMatcher
+from .preprocess import PreparedScreen, estimate_text_height
+from .trace import Tracer
+from .words import Word, WordTable, parse_words  # noqa: F401
 
 P2D = Tuple[int, int]
 BBox = Tuple[int, int, int, int]
-
-KEEP_TMP = os.getenv("VNCAUTOMATE_TMP", "")
+Lines = List[List[Word]]
+Analysis = Tuple["PreparedScreen", Tuple, Optional["ScreenSnapshot"], "CoveragePlan", List[BBox], List[Lines]]
 
 
 def img_from_np(ar):
@@ -43,36 +51,198 @@ def np_from_img(im):
     return np.asarray(im, dtype=np.float32)
 
 
-class _OCRWord(object):
-    def __init__(self, word, bbox):
-        # type: (str, np.array) -> None
-        self.word = word or ""
-        self.bbox = bbox
+class EndpointIndex(object):
+    """
+    Spatial index of the end points of lines for matching box corners.
+
+    Rejected segments are kept as placeholder lines (0, 0, 0, 0) to match the
+    segmentation labels. As all of them end at the origin, they are left out
+    of the tree and only paired with the points close to the origin.
+    """
+
+    RADIUS = 4  # size of the neighborhood scanned for line pixels
+
+    def __init__(self, lines, line_segments):
+        # type: (Sequence[BBox], np.array) -> None
+        self.lines = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+        placeholder = ~self.lines.any(1)
+        self.placeholders = np.flatnonzero(placeholder)
+        self.indices = np.flatnonzero(~placeholder)
+        self.endpoints = self.lines[self.indices].reshape(-1, 2)  # end points 2*i and 2*i+1 belong to line indices[i]
+        self.line_segments = line_segments
+        self.tree = cKDTree(self.endpoints) if len(self.endpoints) else None
+        dy, dx = np.mgrid[-self.RADIUS : self.RADIUS + 1, -self.RADIUS : self.RADIUS + 1]
+        neighborhood = (dx != 0) | (dy != 0)
+        self.dx = dx[neighborhood]
+        self.dy = dy[neighborhood]
+
+    def match(self, points, labels, max_distance):
+        # type: (np.array, np.array, float) -> np.array
+        """
+        Find the closest line for each point.
+
+        Lines must have pixels in the neighborhood of the point, must not be
+        labeled like the point and one of their end points must be closer than
+        `max_distance`.
+
+        :returns: the index of the best matching line for each point or -1.
+        """
+        points = np.round(np.asarray(points, dtype=np.float64).reshape(-1, 2)).astype(int)
+        labels = np.asarray(labels).reshape(-1)
+        result = -np.ones(len(points), dtype=int)
+        if not len(points) or not len(self.lines):
+            return result
+
+        if self.tree is None:
+            query = line = dist_square = np.zeros(0, dtype=int)
+        else:
+            pairs = cKDTree(points).sparse_distance_matrix(self.tree, max_distance, output_type="ndarray")
+            query = pairs["i"]
+            line = self.indices[pairs["j"] // 2]
+            dist_square = ((self.endpoints[pairs["j"]] - points[query]) ** 2).sum(1)
+        if len(self.placeholders):
+            near = np.flatnonzero((points**2).sum(1) < max_distance**2)
+            query = np.concatenate([query, np.repeat(near, len(self.placeholders))])
+            line = np.concatenate([line, np.tile(self.placeholders, len(near))])
+            dist_square = np.concatenate([dist_square, np.repeat((points[near] ** 2).sum(1), len(self.placeholders))])
+        candidate = (dist_square < max_distance**2) & (line != labels[query])
+        query, line, dist_square = query[candidate], line[candidate], dist_square[candidate]
+
+        # the line must have pixels in the neighborhood of the point
+        height, width = self.line_segments.shape
+        xs = points[query, 0][:, np.newaxis] + self.dx
+        ys = points[query, 1][:, np.newaxis] + self.dy
+        inside = (0 <= xs) & (xs < width) & (0 <= ys) & (ys < height)
+        neighbors = np.where(inside, self.line_segments[ys.clip(0, height - 1), xs.clip(0, width - 1)], -1)
+        candidate = (neighbors == line[:, np.newaxis]).any(1)
+        query, line, dist_square = query[candidate], line[candidate], dist_square[candidate]
+
+        # closest line per point
+        order = np.lexsort((line, dist_square, query))
+        query, line = query[order], line[order]
+        first = np.ones(len(query), dtype=bool)
+        first[1:] = query[1:] != query[:-1]
+        result[query[first]] = line[first]
+        return result
+
+
+def _word_rows(words):
+    # type: (Sequence[Word]) -> Tuple[WordTable, Union[slice, List[int]]]
+    """The table and its rows holding the words, collecting them into a new table if they are not views of one table."""
+    table = getattr(words[0], "table", None)
+    if table is None or any(getattr(word, "table", None) is not table for word in words):
+        return WordTable.from_lines([words]), slice(None)
+    indices = [word.index for word in words]
+    if indices == list(range(indices[0], indices[-1] + 1)):
+        # matches are consecutive words of a line
+        return table, slice(indices[0], indices[-1] + 1)
+    return table, indices
+
+
+def center(words):
+    # type: (Sequence[Word]) -> P2D
+    """Center of the bounding boxes of the words."""
+    table, rows = _word_rows(words)
+    return cast(P2D, tuple(table.centroid(rows).astype(int)))
+
+
+def bounding_box(words):
+    # type: (Sequence[Word]) -> BBox
+    """Bounding box of the words."""
+    table, rows = _word_rows(words)
+    left, top, right, bottom = table.bounding_box(rows)
+    return (int(left), int(top), int(np.ceil(right)), int(np.ceil(bottom)))
+
+
+class ScreenSnapshot(object):
+    """
+    Words and boxes recognized in one screen.
+
+    Texts are searched in the recognized words without running OCR again.
+    """
+
+    def __init__(self, algo, key, boxes, areas):
+        # type: (OCRAlgorithm, Tuple, List[BBox], List[List[List[Word]]]) -> None
+        self.log = algo.log
+        self.config = algo.config
+        self.key = key
+        self.boxes = boxes
+        self.areas = areas  # lines of words in the whole screen and in each box
+        self._algo = algo
+        self._matchers = {}  # type: Dict[str, WordMatcher]
+
+    @property
+    def words(self):
+        # type: () -> List[List[Word]]
+        """Lines of words recognized in the whole screen."""
+        return self.areas[0]
+
+    def match(self, text):
+        # type: (str) -> Tuple[float, Sequence[Word]]
+        """Find the words matching the text best in the whole screen or any box."""
+        try:
+            matcher = self._matchers[text]
+        except KeyError:
+            matcher = self._matchers[text] = WordMatcher(text)
+
+        matches = [self._algo.find_best_matching_words(words, matcher, min_score=self.config.min_str_match_score) for words in self.areas]
+        return max(matches, key=itemgetter(0))
+
+    def best(self, *texts):
+        # type: (*str) -> Optional[Tuple[str, Sequence[Word]]]
+        """
+        Search the texts in the screen.
+
+        :returns: the best matching text and its words or `None`.
+        """
+        self.log.debug("Search pattern: %r", texts)
+        best = None  # type: Optional[Tuple[str, Sequence[Word]]]
+        best_score = self.config.min_str_match_score
+        for text in texts:
+            score, matched_words = self.match(text)
+            if score > best_score:
+                best = (text, matched_words)
+                best_score = score
+
+        if best is None:
+            self.log.debug("No matches found")
+            return None
 
-    def resize(self, resize):
-        # type: (float) -> None
-        self.bbox = self.bbox * resize
+        text, matched_words = best
+        self.log.debug("Matched words: %s (score=%s)", " ".join(iword.word for iword in matched_words), best_score)
+        self.log.debug("Matched word objects: %s", matched_words)
+        return best
 
-    def offset(self, offset):
-        # type: (Tuple[int, int]) -> None
-        self.bbox = np.concatenate([offset, offset]) + self.bbox
+    def find_any(self, *texts):
+        # type: (*str) -> Optional[Tuple[str, P2D]]
+        """
+        Search the texts in the screen.
 
-    def fuzzy_match(self, another_string):
-        # type: (str) -> float
-        assert type(self.word) is type(another_string), (type(self.word), repr(self.word), type(another_string), repr(another_string))
-        return difflib.SequenceMatcher(None, self.word.lower(), another_string.lower()).ratio()
+        :returns: the best matching text and the center of its words or `None`.
+        """
+        best = self.best(*texts)
+        return (best[0], center(best[1])) if best else None
 
-    def __str__(self):
-        # type: () -> str
-        return "%r@%s" % (self.word, self.bbox)
+    def find(self, *texts):
+        # type: (*str) -> Optional[P2D]
+        """
+        Search the texts in the screen.
 
-    def __repr__(self):
-        # type: () -> str
-        return "%s(%r, %r)" % (self.__class__.__name__, self.word, self.bbox)
+        :returns: the center of the best matching words or `None`.
+        """
+        match = self.find_any(*texts)
+        return match[1] if match else None
 
 
 class OCRAlgorithm(object):
     RE_BBOX = re.compile(r"\bbbox ([0-9]+) ([0-9]+) ([0-9]+) ([0-9]+)\b")
+    BATCH_GAP = 10  # blank pixels between areas of batched OCR before resizing
+    DIRTY_MARGIN = 16  # pixels around changed areas affecting edge and box detection
+    DIRTY_MAX_AREA = 0.5  # fraction of the screen above which it is analyzed completely
+    LINE_ENGINES = {
+        "flood": segment_line.find_lines,
+        "runs": segment_line.find_line_runs,
+    }
 
     def __init__(self, *args, **kwargs):
         # type: (*OCRConfig, **str) -> None
@@ -86,23 +256,92 @@ class OCRAlgorithm(object):
         else:
             # nothing has been passed ... use all default values
             self.config = OCRConfig()
+        self.cache = OCRCache(self.config.ocr_cache_size)
+        self._backend = None  # type: Optional[OCRBackend]
+        self._frame = None  # type: Optional[ScreenSnapshot]
+        self._pool = None  # type: Optional[DaemonThreadPool]
+        self._shared_pool = None  # type: Optional[DaemonThreadPool]
+        self.edges = EdgeDetector()
+        self.locations = LocationMemory()
+        self.coverage = CoverageStats()
+        self.tracer = Tracer()
+
+    @property
+    def backend(self):
+        # type: () -> OCRBackend
+        if self._backend is None:
+            self._backend = create_backend(self.config)
+            self._backend.tracer = self.tracer
+            self.log.debug("Using OCR backend %r", self._backend)
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        # type: (OCRBackend) -> None
+        self._backend = backend
+        backend.tracer = self.tracer
+
+    @property
+    def pool(self):
+        # type: () -> DaemonThreadPool
+        """Threads analyzing screens, started on first use and stopped on reactor shutdown."""
+        if self._shared_pool is not None:
+            return self._shared_pool
+        if self._pool is None:
+            self._pool = DaemonThreadPool(self.config.analysis_workers, self.config.analysis_workers, "vncautomate-analysis")
+            self._pool.start()
+            self._trigger = reactor.addSystemEventTrigger("during", "shutdown", self._pool.stop)
+        else:
+            self._pool.adjustPoolsize(self.config.analysis_workers, self.config.analysis_workers)
+        return self._pool
+
+    @pool.setter
+    def pool(self, pool):
+        # type: (Optional[DaemonThreadPool]) -> None
+        """Analyze screens in a pool shared with other algorithms, which is neither resized nor stopped by this one."""
+        self._shared_pool = pool
+
+    def close(self):
+        # type: () -> None
+        """Stop the analysis threads and the OCR backend."""
+        if self._pool is not None:
+            reactor.removeSystemEventTrigger(self._trigger)
+            self._pool.stop()
+            self._pool = None
+        if self._backend is not None:
+            self._backend.close()
+
+    def _in_pool(self, func, *args):
+        # type: (Callable[..., Any], *Any) -> Deferred
+        """
+        Run CPU bound analysis in the thread pool, so the reactor keeps serving the VNC connection.
+
+        Results of the pool are delivered by the reactor, so without a running
+        reactor the function is called right away like with `analysis_workers` 0.
+
+        :returns: Deferred firing in the reactor thread.
+        """
+        if self.config.analysis_workers <= 0 or not reactor.running:
+            return maybeDeferred(func, *args)
+        return run_in_pool(self.pool, func, *args)
+
+    def update_tracer(self):
+        # type: () -> Tracer
+        """Enable tracing if a trace file is configured."""
+        self.tracer.enabled = bool(self.config.trace_file)
+        return self.tracer
 
     def detect_edges(self, img):
         # type: (Image) -> Tuple[np.array, np.array]
-        self.log.debug("Detecting horizontal and vertical edges in screen")
-        mat = np_from_img(img)
-        gradient_kernel = np.array((0, 1, 0, -1, 0), dtype="float32")
-        smoothing_kernel = np.ones(7, dtype="float32")
-
-        vertical_edges = sepfir2d(mat, gradient_kernel, smoothing_kernel) / 7
-        vertical_edges_positive = vertical_edges * (vertical_edges > 0)
-        vertical_edges_negative = vertical_edges * (vertical_edges < 0)
-        vertical_edges = (np.roll(vertical_edges_positive, -1, axis=1) - np.roll(vertical_edges_negative, 1, axis=1)) / 2
+        """
+        Compute the horizontal and vertical edges of the image.
 
-        horizontal_edges = sepfir2d(mat, smoothing_kernel, gradient_kernel) / 7
-        horizontal_edges_positive = horizontal_edges * (horizontal_edges > 0)
-        horizontal_edges_negative = horizontal_edges * (horizontal_edges < 0)
-        horizontal_edges = (np.roll(horizontal_edges_positive, -1, axis=0) - np.roll(horizontal_edges_negative, 1, axis=0)) / 2
+        The returned arrays are buffers of the `EdgeDetector`, which are
+        overwritten by the next call in the same thread for an image of the
+        same size. Copy them to keep them longer.
+        """
+        self.log.debug("Detecting horizontal and vertical edges in screen")
+        horizontal_edges, vertical_edges = self.edges.detect(np.asarray(img))
 
         if self.config.dump_x_gradients:
             img_from_np(vertical_edges).save(self.config.dump_x_gradients)
@@ -188,83 +427,30 @@ class OCRAlgorithm(object):
         self.log.debug("%s lines have been segmented in total", len(lines))
         return lines
 
-    def match_line_in_neighborhood(self, _x, _y, _label, lines, line_segments):
-        # type: (float, float, int, Sequence[BBox], np.array) -> Tuple[Optional[BBox], int]
-        _x = int(round(_x))
-        _y = int(round(_y))
-        matches = set()  # type: Set[int]
-        self.log.debug("Find neighboring lines at (%s, %s)", _x, _y)
-
-        def _test_label(x, y):
-            # type: (int, int) -> None
-            if 0 <= y < line_segments.shape[0] and 0 <= x < line_segments.shape[1]:
-                label = line_segments[y, x]
-                if 0 <= label != _label:
-                    matches.add(label)
-
-        def _dist_square(line):
-            # type: (BBox) -> float
-            return min(
-                (line[0] - _x) ** 2 + (line[1] - _y) ** 2,
-                (line[2] - _x) ** 2 + (line[3] - _y) ** 2,
-            )
-
-        # ......... ......... ......... 1----->27
-        # ......... ......... .1--->27. 5       |
-        # ......... ..1->27.. .5     |. |       |
-        # ...127... ..5   |.. .|     |. |       |
-        # ...508... ..| 0 V.. .|  0  |. |   0   |
-        # ...634... ..V   8.. .|     V. |       |
-        # ......... ..63->4.. .V     8. |       V
-        # ......... ......... .63--->4. V       8
-        # ......... ......... ......... 63----->4
-        for dist in range(1, 5):
-            for x in range(_x - dist, _x + dist):
-                # scan above the origin
-                _test_label(x, _y - dist)
-                # scan below the origin
-                _test_label(x + 1, _y + dist)
-            for y in range(_y - dist, _y + dist):
-                # scan left of the origin
-                _test_label(_x - dist, y + 1)
-                # scan right of the origin
-                _test_label(_x + dist, y)
-
-        # find closest match
-        best_match = -1
-        best_distance_square = self.config.box_corner_points_max_distance**2  # 10 pixel max distance
-        for ilabel in matches:
-            line = lines[ilabel]
-            dist_square = _dist_square(line)
-            self.log.debug("  Line %s matches (squared distance: %s)", ilabel, dist_square)
-            if dist_square < best_distance_square:
-                best_match = ilabel
-                best_distance_square = dist_square
-
-        if best_match >= 0:
-            self.log.debug("Best match: line %s, squared distance: %s", best_match, best_distance_square)
-            return lines[best_match], best_match
-        return None, best_match
-
     def detect_boxes(self, horizontal_lines, vertical_lines, horizontal_line_segments, vertical_line_segments):
         # type: (Sequence[BBox], Sequence[BBox], np.array, np.array) -> Iterator[BBox]
-        # iterate over all horizontal lines and try to create
-        # a rectangle starting from the top left corner
-        for itop, top in enumerate(horizontal_lines):
-            left, ileft = self.match_line_in_neighborhood(top[0], top[1], itop, vertical_lines, vertical_line_segments)
-            if left is None:
-                continue
-            bottom, ibottom = self.match_line_in_neighborhood(left[2], left[3], ileft, horizontal_lines, horizontal_line_segments)
-            if bottom is None:
-                continue
-            right, iright = self.match_line_in_neighborhood(top[2], top[3], itop, vertical_lines, vertical_line_segments)
-            if right is None:
-                continue
-            l, t, r, b = new_box = (left[0], top[1], right[2], bottom[3])  # noqa: E741
-            if not self.config.box_min_width < r - l:
-                continue
-            if not self.config.box_min_height < b - t < self.config.box_max_height:
-                continue
+        # match the corners of all horizontal lines at once using the end points of the other lines
+        horizontal_index = EndpointIndex(horizontal_lines, horizontal_line_segments)
+        vertical_index = EndpointIndex(vertical_lines, vertical_line_segments)
+        horizontal_lines = horizontal_index.lines
+        vertical_lines = vertical_index.lines
+        max_distance = self.config.box_corner_points_max_distance
+
+        # try to create a rectangle starting from the top left corner, placeholder lines never form one
+        itops = horizontal_index.indices
+        ilefts = vertical_index.match(horizontal_lines[itops, 0:2], itops, max_distance)
+        irights = vertical_index.match(horizontal_lines[itops, 2:4], itops, max_distance)
+        ibottoms = -np.ones(len(itops), dtype=int)
+        found = ilefts >= 0
+        ibottoms[found] = horizontal_index.match(vertical_lines[ilefts[found], 2:4], ilefts[found], max_distance)
+        found &= (ibottoms >= 0) & (irights >= 0)
+
+        l = vertical_lines[ilefts[found], 0]  # noqa: E741
+        t = horizontal_lines[itops[found], 1]
+        r = vertical_lines[irights[found], 2]
+        b = horizontal_lines[ibottoms[found], 3]
+        valid = (self.config.box_min_width < r - l) & (self.config.box_min_height < b - t) & (b - t < self.config.box_max_height)
+        for new_box in zip(l[valid], t[valid], r[valid], b[valid]):
             self.log.debug("  Detected new box %s", new_box)
             yield new_box
 
@@ -281,133 +467,257 @@ class OCRAlgorithm(object):
             draw.rectangle(box, outline="#0000ff")
         return img_result
 
-    def get_words_from_hocr(self, xml_data):
-        # type: (bytes) -> List[List[_OCRWord]]
-        self.log.debug("Parsing words from XML OCR data")
+    def get_word_table(self, data):
+        # type: (bytes) -> WordTable
+        """Parse the words from the hOCR or TSV output of tesseract."""
+        self.log.debug("Parsing words from OCR data")
         try:
-            xml = ET.fromstring(xml_data, parser=ET.XMLParser())
-        except ET.ParseError as err:
-            # return an empty list of words to enable continuation
-            self.log.warning("XML output from tesseract is malformed: %s", err)
-            return []
-
-        words = []  # type: List[List[_OCRWord]]
-        for para in xml.findall(".//{http://www.w3.org/1999/xhtml}p[@class='ocr_par']"):
-            words_in_para = []
-            for word in para.findall(".//{http://www.w3.org/1999/xhtml}span[@class='ocrx_word']"):
-                # get the bounding box for the word
-                title = word.attrib.get("title", "")
-                match = self.RE_BBOX.search(title)
-                if match:
-                    bbox = np.array([int(i) for i in match.groups()])
-                else:
-                    bbox = np.zeros(4)
+            columns = parse_words(data)
+        except (ET.ParseError, ValueError) as err:
+            # return an empty table of words to enable continuation
+            self.log.warning("Output from tesseract is malformed: %s", err)
+            return WordTable([], [], [], 0)
+
+        self.log.debug("Found %s words altogether", len(columns))
+        return WordTable.from_columns(columns)
+
+    def get_words_from_hocr(self, data):
+        # type: (bytes) -> List[List[Word]]
+        """Parse the paragraphs of words from the hOCR or TSV output of tesseract."""
+        return self.get_word_table(data).lines()
+
+    def _recognize(self, img):
+        # type: (Image) -> Deferred
+        """
+        Recognize words in the prepared image using the cache or the OCR backend.
+
+        The returned table of words is in coordinates of the given image and must not be modified.
+        """
+        self.cache.maxsize = self.config.ocr_cache_size
+
+        def _lookup(key):
+            # type: (bytes) -> Deferred
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.log.debug("Using cached OCR result for image of size %s", img.size)
+                self.tracer.instant("ocr_cache_hit", size=img.size)
+                return succeed(cached)
+
+            return self.backend.recognize(img, self.config.lang).addCallback(_process_output, key)
+
+        def _parse(hocr_data):
+            # type: (bytes) -> WordTable
+            with self.tracer.span("parse_hocr", size=len(hocr_data)):
+                return self.get_word_table(hocr_data)
+
+        def _process_output(result, key):
+            # type: (Tuple[bytes, float], bytes) -> Deferred
+            hocr_data, duration = result
 
-                while len(word):
-                    # the word might be packed into an HTML tag such as <strong>
-                    word = word[0]
-
-                try:
-                    _word = _OCRWord(word.text, bbox)
-                    words_in_para.append(_word)
-                except UnicodeDecodeError as err:
-                    self.log.warning("Ignoring wrongly encoded word: %s", err)
-            words.append(words_in_para)
-
-        self.log.debug("Found %s words altogether", len(words))
+            # get the recognized words
+            return self._in_pool(_parse, hocr_data).addCallback(_cache, key, duration)
+
+        def _cache(table, key, duration):
+            # type: (WordTable, bytes, float) -> WordTable
+            self.cache.put(key, table, duration)
+            return table
+
+        # hashing the image is CPU bound like the analysis
+        return self._in_pool(self.cache.key, img, self.config.lang, self.config.img_resize).addCallback(_lookup)
+
+    def _prepare(self, img, areas, masks=None):
+        # type: (Union[Image, PreparedScreen], Sequence[Optional[BBox]], Optional[Dict[Optional[BBox], List[BBox]]]) -> PreparedScreen
+        """Prepare the screen for recognizing the areas, unless it already is."""
+        if isinstance(img, PreparedScreen):
+            return img
+        regions = None if None in areas else merge_regions(cast(Sequence[BBox], areas))
+        return PreparedScreen(img, self.config.img_resize, self.config.ocr_resample, self.config.ocr_threshold, regions, masks)
+
+    def _plan(self, size, regions, boxes):
+        # type: (Tuple[int, int], Sequence[Optional[BBox]], Sequence[BBox]) -> CoveragePlan
+        """Plan the areas to recognize for the regions and the boxes according to `ocr_coverage`."""
+        if self.config.ocr_coverage not in ("all", "dedup"):
+            raise ValueError("Unknown OCR coverage %r" % (self.config.ocr_coverage,))
+        plan = plan_coverage(regions, boxes, size, self.config.ocr_coverage == "dedup")
+        self.coverage.add(plan)
+        self.tracer.instant("coverage", areas=len(plan.areas), pixels=plan.pixels, frame=plan.frame)
+        self.log.debug("Coverage: %s, altogether %s", plan, self.coverage)
+        return plan
+
+    def resize_factor(self, img, box):
+        # type: (Image, Optional[BBox]) -> float
+        """
+        Factor for resizing an area of the prepared screen before recognizing it.
+
+        If `ocr_text_height` is set, boxes are resized so that their lines of
+        text become that tall, but at most by `img_resize`. The factor is
+        rounded up to a multiple of 0.25, so the recognized image and its cache
+        entry stay the same while the estimate varies slightly.
+        """
+        resize = self.config.img_resize
+        if box is None or self.config.ocr_text_height <= 0:
+            return resize
+        height = estimate_text_height(img.crop(box))
+        if height is None:
+            return resize
+        factor = np.ceil(4.0 * self.config.ocr_text_height / height) / 4.0
+        return float(min(resize, max(1.0, factor)))
+
+    def _crop(self, screen, box):
+        # type: (PreparedScreen, Optional[BBox]) -> Tuple[Image, Tuple[float, float], float]
+        resize = self.resize_factor(screen.img, box)
+        if resize != self.config.img_resize:
+            self.log.debug("Resizing area %s by %s", box, resize)
+        img, origin = screen.crop(box, resize)
+        return img, origin, resize
+
+    def _transform(self, table, origin, resize):
+        # type: (WordTable, Tuple[float, float], float) -> List[List[Word]]
+        """Map the words recognized in an image with its origin in the screen resized by `resize` to the screen."""
+        # the transformations return new tables as the cache keeps them in coordinates of the resized image
+        table = table.offset(origin[0], origin[1]).scale(1.0 / resize)
+
+        words = table.lines()
+        self.log.info("Detected words: %s", "\n".join(" ".join(iword.word if iword else "" for iword in line) for line in words))
         return words
 
     def ocr_img(self, _img, box):
-        # type: (Image, Optional[BBox]) -> Deferred
+        # type: (Union[Image, PreparedScreen], Optional[BBox]) -> Deferred
         if box:
             self.log.debug("Performing OCR on VNC screen in area %s and with resizing %s", box, self.config.img_resize)
         else:
             self.log.debug("Performing OCR on VNC screen with resizing %s", self.config.img_resize)
 
-        # temporary file for tesseract
-        out_file_path = os.path.join(gettempdir(), "vnc_automate_%s" % datetime.now().isoformat())
-        hocr_file_path = out_file_path + ".hocr"
-        img_file_path = out_file_path + ".tiff"
-
-        img = _img.crop(box) if box else _img
-        new_width = int(round(img.width * self.config.img_resize))
-        new_height = int(round(img.height * self.config.img_resize))
-        img = img.resize((new_width, new_height))
-        img.save(img_file_path)
-
-        deferred = Deferred()
-
-        def _process_output(val):
-            # type: (int) -> None
-
-            # read OCR output from temp file
-            with open(hocr_file_path, "rb") as hocr_file:
-                hocr_data = hocr_file.read()
-
-            self.log.debug("Read %d bytes from tesseract exited with %d", len(hocr_data), val)
-
-            self.log.debug("Removing %r and %r ...", hocr_file_path, img_file_path)
-            if not KEEP_TMP:
-                os.unlink(hocr_file_path)
-                os.unlink(img_file_path)
+        span = self.tracer.span("ocr_img", lanes="ocr", box=box)
+
+        def _recognize(cropped):
+            # type: (Tuple[Image, Tuple[float, float], float]) -> Deferred
+            img, origin, resize = cropped
+            return self._recognize(img).addCallback(self._transform, origin, resize)
+
+        deferred = self._in_pool(self._crop, self._prepare(_img, [box]), box)
+        return deferred.addCallback(_recognize).addBoth(span.close)
+
+    def ocr_batch(self, _img, boxes):
+        # type: (Union[Image, PreparedScreen], Sequence[Optional[BBox]]) -> Deferred
+        """
+        Perform OCR on all areas with a single recognition.
+
+        The resized areas are stacked vertically into one composite image.
+        Recognized words are mapped back to the area containing their center.
+
+        :returns: Deferred firing with the list of lines of words for each area.
+        """
+        self.log.debug("Performing batched OCR on %d areas with resizing %s", len(boxes), self.config.img_resize)
+        span = self.tracer.span("ocr_batch", lanes="ocr", areas=len(boxes))
+
+        def _recognize(composed):
+            # type: (Tuple[Image, List[P2D], List[Tuple[float, float]], List[float]]) -> Deferred
+            composite, positions, origins, factors = composed
+            return self._recognize(composite).addCallback(_split, positions, origins, factors)
+
+        def _split(table, positions, origins, factors):
+            # type: (WordTable, List[P2D], List[Tuple[float, float]], List[float]) -> List[List[List[Word]]]
+            tops = np.array([position[1] for position in positions])
+            iareas = np.maximum(0, np.searchsorted(tops, table.centers()[:, 1], side="right") - 1)
+            return [
+                self._transform(table.select(iareas == iarea), (origin[0] - position[0], origin[1] - position[1]), resize)
+                for iarea, (position, origin, resize) in enumerate(zip(positions, origins, factors))
+            ]
 
-            # get the recognized words
-            words = self.get_words_from_hocr(hocr_data)
-            for line in words:
-                for word in line:
-                    word.resize(1.0 / self.config.img_resize)
-                    if box:
-                        word.offset(box[0:2])
-
-            self.log.info("Detected words: %s", "\n".join(" ".join(iword.word if iword else "" for iword in line) for line in words))
-            deferred.callback(words)
-
-        cmd = ["/usr/bin/tesseract", img_file_path, out_file_path, "-l", self.config.lang, "hocr"]
-        self.log.debug("Running command: %s", " ".join(cmd))
-        output = utils.getProcessValue(cmd[0], cmd[1:], os.environ)
-        output.addCallbacks(_process_output, deferred.errback)
-
-        return deferred
-
-    def boxes_from_image(self, img):
-        # type: (Image) -> List[BBox]
-        horizontal_edges, vertical_edges = self.detect_edges(img)
+        return self._in_pool(self._compose, self._prepare(_img, boxes), boxes).addCallback(_recognize).addBoth(span.close)
+
+    def _compose(self, screen, boxes):
+        # type: (PreparedScreen, Sequence[Optional[BBox]]) -> Tuple[Image, List[P2D], List[Tuple[float, float]], List[float]]
+        """
+        Stack the resized areas vertically into one image.
+
+        :returns: the image, the positions of the areas in it, their origins
+            in the resized screen and the factors they are resized by.
+        """
+        imgs, origins, factors = zip(*[self._crop(screen, box) for box in boxes])
+        gap = int(round(self.BATCH_GAP * self.config.img_resize))
+        width = max(img.width for img in imgs) + 2 * gap
+        height = sum(img.height + gap for img in imgs) + gap
+        composite = Image.new(imgs[0].mode, (width, height), "white")
+        positions = []  # type: List[P2D]
+        top = gap
+        for img in imgs:
+            composite.paste(img, (gap, top))
+            positions.append((gap, top))
+            top += img.height + gap
+        return composite, positions, list(origins), list(factors)
+
+    def boxes_from_image(self, img, region=None):
+        # type: (Image, Optional[BBox]) -> List[BBox]
+        if region:
+            self.log.debug("Detecting boxes in area %s", region)
+            img = img.crop(region)
+
+        with self.tracer.span("detect_edges", size=img.size):
+            horizontal_edges, vertical_edges = self.detect_edges(img)
         mat_shape = tuple(reversed(img.size))
-        vertical_line_segments = -np.ones(mat_shape, dtype="int64")
-        vertical_lines = segment_line.find_lines(vertical_edges, vertical_line_segments, self.config)
-        # vertical_lines = self.find_lines(vertical_edges, vertical_line_segments)
-        horizontal_line_segments = -np.ones(mat_shape, dtype="int64")
-        horizontal_lines = segment_line.find_lines(horizontal_edges, horizontal_line_segments, self.config)
-        # horizontal_lines = self.find_lines(horizontal_edges, horizontal_line_segments)
-        boxes = list(self.detect_boxes(horizontal_lines, vertical_lines, horizontal_line_segments, vertical_line_segments))
+        try:
+            find_lines = self.LINE_ENGINES[self.config.line_engine]
+        except KeyError:
+            raise ValueError("Unknown line engine %r" % (self.config.line_engine,))
+        with self.tracer.span("find_lines", size=img.size):
+            vertical_line_segments = -np.ones(mat_shape, dtype="int64")
+            vertical_lines = find_lines(vertical_edges, vertical_line_segments, self.config)
+            # vertical_lines = self.find_lines(vertical_edges, vertical_line_segments)
+            horizontal_line_segments = -np.ones(mat_shape, dtype="int64")
+            horizontal_lines = find_lines(horizontal_edges, horizontal_line_segments, self.config)
+            # horizontal_lines = self.find_lines(horizontal_edges, horizontal_line_segments)
+        with self.tracer.span("detect_boxes", size=img.size) as span:
+            boxes = list(self.detect_boxes(horizontal_lines, vertical_lines, horizontal_line_segments, vertical_line_segments))
+            span.end(boxes=len(boxes))
 
         if self.config.dump_boxes:
             dump_image = self.draw_lines_and_boxes(horizontal_lines, vertical_lines, boxes, img.size)
             dump_image.save(self.config.dump_boxes)
 
+        if region:
+            boxes = [(l + region[0], t + region[1], r + region[0], b + region[1]) for l, t, r, b in boxes]  # noqa: E741
+
         return boxes
 
-    def find_best_matching_words(self, all_words, *patterns):
-        # type: (Iterable[Sequence[_OCRWord]], *str) -> Tuple[float, Sequence[_OCRWord]]
-        scores = (
-            m for pattern in patterns for line in all_words for m in self._find_best_matching_words(line, pattern.lower().split())
+    def dirty_regions(self, dirty, boxes, size):
+        # type: (Iterable[BBox], Sequence[BBox], Tuple[int, int]) -> List[BBox]
+        """
+        Compute the areas of the screen which need to be analyzed again.
+
+        The changed rectangles are extended by a margin and merged with all boxes they touch.
+        """
+        width, height = size
+        margin = self.DIRTY_MARGIN
+        regions = merge_regions(
+            (max(0, l - margin), max(0, t - margin), min(width, r + margin), min(height, b + margin)) for l, t, r, b in dirty  # noqa: E741
         )
-        return max(scores, key=itemgetter(0)) if all_words else (0.0, [])
-
-    def _find_best_matching_words(self, line, pattern):
-        # type: (Sequence[_OCRWord], Sequence[str]) -> Iterator[Tuple[float, Sequence[_OCRWord]]]
-        for iword, _ in enumerate(line):
-            words = line[iword : iword + len(pattern)]
-            scores = np.array([word.fuzzy_match(pat) for word, pat in zip(words, pattern)])
-            scores.resize(len(pattern), refcheck=False)
-            score = scores.mean()
-            # compute overall matching score and penalize slightly by coverage of whole line
-            penalty = (1.0 * len(pattern)) / len(line)
-            final_score = score * (0.9 + penalty * 0.1)
-            self.log.debug(
-                "  Words %s scored %.3f*(.9+%.3f*.1)=%.3f", ".".join(word.word for word in words), score, penalty, final_score
-            )
-            yield (final_score, words)
+        while True:
+            touched = [box for box in boxes if any(intersects(box, region) for region in regions)]
+            merged = merge_regions(regions + touched)
+            if sorted(merged) == sorted(regions):
+                break
+            regions = merged
+
+        return [(int(l), int(t), int(np.ceil(r)), int(np.ceil(b))) for l, t, r, b in regions]  # noqa: E741
+
+    def find_best_matching_words(self, all_words, *patterns, min_score=0.0):
+        # type: (Iterable[Sequence[Word]], *Union[str, WordMatcher], float) -> Tuple[float, Sequence[Word]]
+        """
+        Find the sequence of words matching one of the patterns best.
+
+        :param min_score: Skip matches scoring less.
+        """
+        best = (0.0, [])  # type: Tuple[float, Sequence[Word]]
+        best_score = -1.0
+        for pattern in patterns:
+            matcher = pattern if isinstance(pattern, WordMatcher) else WordMatcher(pattern)
+            for line in all_words:
+                match = matcher.best_match(line, min_score, best_score)
+                if match:
+                    best_score, _ = best = match
+        return best
 
     def _dump_screen(self, img):
         # type: (Image) -> None
@@ -418,8 +728,163 @@ class OCRAlgorithm(object):
         if self.config.dump_screen:
             img.save(self.config.dump_screen)
 
-    def find_text_in_image(self, img, *patterns):
-        # type: (Image, *str) -> Deferred
+    def find_text_in_image(self, img, *patterns, dirty=None, region=None):
+        # type: (Image, *str, Optional[Sequence[BBox]], Optional[BBox]) -> Deferred
+        """
+        Search the patterns in the screen.
+
+        :param dirty: Rectangles changed since the previous call, see `snapshot()`.
+        :param region: Search only in this area of the screen.
+        :returns: Deferred firing with the center of the best matching words or `None`.
+        """
+        return self.search(img, *patterns, dirty=dirty, region=region).addCallback(lambda match: match[1] if match else None)
+
+    def search(self, img, *texts, dirty=None, region=None):
+        # type: (Image, *str, Optional[Sequence[BBox]], Optional[BBox]) -> Deferred
+        """
+        Search the texts in the screen.
+
+        The areas where one of the texts has been found before are searched
+        first. Only if none of them contains a text with at least
+        `confident_score`, the whole screen is analyzed.
+
+        With `ocr_schedule` set to 'priority' the areas are recognized one
+        after the other, smallest first, and the search stops as soon as a
+        text matches with at least `confident_score`. Recognitions still queued
+        or running are cancelled then, and the next search analyzes the whole
+        screen again as no complete snapshot is left.
+
+        :param dirty: Rectangles changed since the previous call, see `snapshot()`.
+        :param region: Search only in this area of the screen.
+        :returns: Deferred firing with the best matching text and the center of its words or `None`.
+        """
+        min_score = max(self.config.confident_score, self.config.min_str_match_score)
+        if region is not None:
+            deferred = self._search_regions(img, texts, [region], dirty, self.config.min_str_match_score, detect=True)
+        elif dirty == [] and self._frame is not None:
+            # nothing changed, the previous snapshot answers without OCR
+            deferred = self._search_screen(img, texts, dirty)
+        elif self.config.location_margin > 0 and self.locations.regions(texts):
+            deferred = self._search_regions(img, texts, self.locations.regions(texts), dirty, min_score, self.locations.boxes(texts))
+
+            def _remembered(match):
+                # type: (Optional[Tuple[str, Sequence[Word], List[BBox]]]) -> Union[Tuple, Deferred]
+                if match is not None:
+                    self.locations.hits += 1
+                    return match
+                self.locations.misses += 1
+                return self._search_screen(img, texts, dirty)
+
+            deferred.addCallback(_remembered)
+        else:
+            deferred = self._search_screen(img, texts, dirty)
+
+        def _found(match):
+            # type: (Optional[Tuple[str, Sequence[Word], List[BBox]]]) -> Optional[Tuple[str, P2D]]
+            if match is None:
+                return None
+            text, words, boxes = match
+            if self.config.location_margin > 0:
+                self.locations.put(text, bounding_box(words), boxes, img.size, self.config.location_margin)
+                self.log.debug("Location memory: %s", self.locations)
+            return text, center(words)
+
+        return deferred.addCallback(_found)
+
+    def _search_screen(self, img, texts, dirty):
+        # type: (Image, Sequence[str], Optional[Sequence[BBox]]) -> Deferred
+        if self.config.ocr_schedule == "priority" and self.config.ocr_mode != "batch":
+            return self._search_by_priority(img, texts, dirty)
+
+        def _best(snapshot):
+            # type: (ScreenSnapshot) -> Optional[Tuple[str, Sequence[Word], List[BBox]]]
+            with self.tracer.span("match", areas=len(snapshot.areas)):
+                best = snapshot.best(*texts)
+            return (best[0], best[1], snapshot.boxes) if best else None
+
+        return self.snapshot(img, dirty=dirty).addCallback(lambda snapshot: self._in_pool(_best, snapshot))
+
+    def _search_regions(self, img, texts, regions, dirty, min_score, boxes=(), detect=False):
+        # type: (Image, Sequence[str], List[BBox], Optional[Sequence[BBox]], float, Sequence[BBox], bool) -> Deferred
+        """
+        Search the texts only in some areas of the screen.
+
+        :param boxes: The areas which are boxes detected before.
+        :param detect: Also recognize the boxes detected in the areas.
+        """
+        if dirty != []:
+            # the previous snapshot is outdated as the changed areas are not analyzed now
+            self._frame = None
+
+        def _recognize(detected):
+            # type: (Tuple[PreparedScreen, CoveragePlan, List[BBox]]) -> Deferred
+            img, plan, boxes = detected
+            areas = plan.areas
+            self.log.debug("Searching %r in areas %s", texts, areas)
+            if self.config.ocr_mode == "batch":
+                deferred = self.ocr_batch(img, areas)
+            else:
+                deferred = gatherResults([self.ocr_img(img, area) for area in areas])
+            return deferred.addCallback(lambda all_words: self._in_pool(_best, plan.assign(all_words), boxes))
+
+        def _best(all_words, boxes):
+            # type: (List[List[List[Word]]], List[BBox]) -> Optional[Tuple[str, Sequence[Word], List[BBox]]]
+            best = None  # type: Optional[Tuple[str, Sequence[Word], List[BBox]]]
+            best_score = min_score
+            with self.tracer.span("match", areas=len(all_words)):
+                for text in texts:
+                    matcher = WordMatcher(text)
+                    for words in all_words:
+                        score, matched_words = self.find_best_matching_words(words, matcher, min_score=min_score)
+                        if score > best_score:
+                            best = (text, matched_words, boxes)
+                            best_score = score
+            return best
+
+        return self._in_pool(self._detect_regions, img.copy(), regions, boxes, detect).addCallback(_recognize)
+
+    def _detect_regions(self, img, regions, boxes, detect):
+        # type: (Image, List[BBox], Sequence[BBox], bool) -> Tuple[PreparedScreen, CoveragePlan, List[BBox]]
+        img, _inverted = self._prepare_screen(img)
+        boxes = list(boxes)
+        detected = []  # type: List[BBox]
+        if detect:
+            for region in regions:
+                detected += self.boxes_from_image(img, region)
+            boxes += detected
+        plan = self._plan(img.size, regions, detected)
+        return self._prepare(img, plan.areas, plan.masks), plan, boxes
+
+    def snapshot(self, img, dirty=None):
+        # type: (Image, Optional[Sequence[BBox]]) -> Deferred
+        """
+        Recognize the words in the screen.
+
+        :param dirty: Rectangles changed since the previous call. If given, only
+            these areas of the screen are analyzed again and the results of the
+            previous screen are reused for the rest.
+        :returns: Deferred firing with a `ScreenSnapshot`.
+        """
+
+        def _recognize(analysis):
+            # type: (Analysis) -> Deferred
+            img, key, frame, plan, boxes, known = analysis
+            areas = plan.areas
+            if not areas:
+                deferred = succeed([])  # type: Deferred
+            elif self.config.ocr_mode == "batch":
+                deferred = self.ocr_batch(img, areas)
+            else:
+                deferred = gatherResults([self.ocr_img(img, area) for area in areas])
+
+            return deferred.addCallback(
+                lambda all_words: self._make_snapshot(key, frame, plan.regions, boxes, known, plan.assign(all_words))
+            )
+
+        return self._analyze(img, dirty).addCallback(_recognize)
+
+    def _prepare_screen(self, img):
+        # type: (Image) -> Tuple[Image, bool]
         self._dump_screen(img)
 
         # convert image to gray scale
@@ -427,28 +892,161 @@ class OCRAlgorithm(object):
 
         # invert image if predominantly dark
         avrg_value = np.asarray(img).mean(axis=0).mean() / 255
-        if avrg_value < 0.5:
+        inverted = avrg_value < 0.5
+        if inverted:
             img = ImageOps.invert(img)
 
-        boxes = self.boxes_from_image(img)
-
-        deferreds = [
-            self.ocr_img(img, box).addCallback(self.find_best_matching_words, *patterns) for box in [None] + boxes  # type: ignore
-        ]  # type: List[Deferred]
-
-        def _process_matches(matches):
-            # type: (Sequence[Tuple[float, Sequence[_OCRWord]]]) -> Optional[P2D]
-            self.log.debug("Search pattern: %r", patterns)
-            score, matched_words = max(matches, key=itemgetter(0)) if matches else (self.config.min_str_match_score, [])
-            if score > self.config.min_str_match_score:
-                self.log.debug("Matched words: %s (score=%s)", " ".join(iword.word for iword in matched_words), score)
-                self.log.debug("Matched word objects: %s", matched_words)
-                boxes = np.array([iword.bbox for iword in matched_words])
-                return cast(P2D, tuple(boxes.reshape(boxes.shape[0] * 2, 2).mean(0).astype(int)))
-
-            self.log.debug("No matches found")
-            return None
-
-        deferred = gatherResults(deferreds)
-        deferred.addCallback(_process_matches)
-        return deferred
+        return img, inverted
+
+    def _analyze(self, img, dirty):
+        # type: (Image, Optional[Sequence[BBox]]) -> Deferred
+        """
+        Prepare the screen and detect the boxes which need to be recognized.
+
+        The detection runs in the thread pool on a copy of the screen, as the
+        client keeps drawing framebuffer updates into it.
+
+        :returns: Deferred firing with the prepared image, its key, the reused
+            previous snapshot, the regions to recognize for the whole screen,
+            the boxes and the words of the leading boxes which are unchanged
+            since the previous snapshot and need no recognition.
+        """
+        frame, self._frame = self._frame, None
+        return self._in_pool(self._detect, img.copy(), dirty, frame)
+
+    def _detect(self, img, dirty, frame):
+        # type: (Image, Optional[Sequence[BBox]], Optional[ScreenSnapshot]) -> Analysis
+        img, inverted = self._prepare_screen(img)
+        key = (
+            img.size,
+            inverted,
+            self.config.lang,
+            self.config.img_resize,
+            self.config.ocr_resample,
+            self.config.ocr_threshold,
+            self.config.ocr_text_height,
+            self.config.ocr_coverage,
+        )
+        regions = [None]  # type: List[Optional[BBox]]
+        known = []  # type: List[Lines]
+        if dirty is not None and frame is not None and frame.key == key:
+            dirty_regions = self.dirty_regions(dirty, frame.boxes, img.size)
+            dirty_area = sum((r - l) * (b - t) for l, t, r, b in dirty_regions)  # noqa: E741
+            if dirty_area <= self.DIRTY_MAX_AREA * img.width * img.height:
+                self.log.debug("Analyzing changed areas %s", dirty_regions)
+                regions = dirty_regions  # type: ignore
+                boxes = []
+                for box, words in zip(frame.boxes, frame.areas[1:]):
+                    if not any(intersects(box, region) for region in dirty_regions):
+                        boxes.append(box)
+                        known.append(words)
+                for region in dirty_regions:
+                    boxes += self.boxes_from_image(img, region)
+        if regions == [None]:
+            frame = None
+            boxes = self.boxes_from_image(img)
+
+        plan = self._plan(img.size, regions, boxes[len(known) :])
+        # the areas to recognize are cropped from the screen resized only once
+        return self._prepare(img, plan.areas, plan.masks), key, frame, plan, boxes, known
+
+    def _make_snapshot(self, key, frame, regions, boxes, known, all_words):
+        # type: (Tuple, Optional[ScreenSnapshot], List[Optional[BBox]], List[BBox], List[Lines], List[Lines]) -> ScreenSnapshot
+        if frame is None:
+            screen_words = all_words[0]
+        else:
+            # keep the words of the previous screen outside of the changed areas
+            screen_words = [
+                [word for word in line if not any(intersects(word.bbox, region) for region in regions)]  # type: ignore
+                for line in frame.words
+            ]
+            screen_words = [line for line in screen_words if line]
+            for region_words in all_words[: len(regions)]:
+                screen_words += region_words
+
+        self.log.debug("OCR cache: %s", self.cache)
+        self._frame = ScreenSnapshot(self, key, boxes, [screen_words] + known + all_words[len(regions) :])
+        return self._frame
+
+    def _search_by_priority(self, img, texts, dirty):
+        # type: (Image, Sequence[str], Optional[Sequence[BBox]]) -> Deferred
+        matchers = [WordMatcher(text) for text in texts]
+        min_score = max(self.config.confident_score, self.config.min_str_match_score)
+        jobs = []  # type: List[Deferred]
+
+        def _cancel(_):
+            # type: (Deferred) -> None
+            for job in jobs:
+                job.cancel()
+
+        found = Deferred(_cancel)
+
+        def _failed(failure):
+            # type: (Failure) -> None
+            if not found.called:
+                _cancel(found)
+                found.errback(failure)
+
+        def _schedule(analysis):
+            # type: (Analysis) -> None
+            img, key, frame, plan, boxes, known = analysis
+            areas = plan.areas
+            # small boxes like buttons first, the whole screen last
+            order = sorted(range(len(areas)), key=lambda iarea: self._area_size(areas[iarea], img.size))
+            results = [None] * len(areas)  # type: List[Optional[List[List[Word]]]]
+
+            def _confident(words, area):
+                # type: (Lines, Optional[BBox]) -> bool
+                best = None  # type: Optional[Tuple[float, str, Sequence[Word]]]
+                with self.tracer.span("match", area=area):
+                    for text, matcher in zip(texts, matchers):
+                        score, matched_words = self.find_best_matching_words(words, matcher, min_score=min_score)
+                        if score > (min_score if best is None else best[0]):
+                            best = (score, text, matched_words)
+
+                if best is None:
+                    return False
+                score, text, matched_words = best
+                self.log.debug("Confident match %r (score=%.3f) in area %s", text, score, area)
+                self.log.debug("Skipping %d of %d areas", sum(result is None for result in results), len(areas))
+                found.callback((text, matched_words, boxes))
+                _cancel(found)
+                return True
+
+            def _recognized(words, iarea):
+                # type: (List[List[Word]], int) -> None
+                results[iarea] = words
+                if found.called or _confident(words, areas[iarea]):
+                    return
+                if all(result is not None for result in results):
+                    snapshot = self._make_snapshot(key, frame, plan.regions, boxes, known, plan.assign(cast(List[Lines], results)))
+                    match = snapshot.best(*texts)
+                    found.callback((match[0], match[1], boxes) if match else None)
+
+            # boxes unchanged since the previous snapshot need no recognition
+            for box, words in zip(boxes, known):
+                if _confident(words, box):
+                    return
+
+            for iarea in order:
+                if found.called:
+                    break
+                job = self.ocr_img(img, areas[iarea])
+                jobs.append(job)
+                job.addCallback(_recognized, iarea).addErrback(_failed)
+
+            if not areas:
+                found.callback(None)
+
+        analysis = self._analyze(img, dirty)
+        jobs.append(analysis)
+        analysis.addCallback(_schedule).addErrback(_failed)
+        return found
+
+    @staticmethod
+    def _area_size(box, size):
+        # type: (Optional[BBox], Tuple[int, int]) -> int
+        if box is None:
+            return size[0] * size[1]
+        left, top, right, bottom = box
+        return (right - left) * (bottom - top)
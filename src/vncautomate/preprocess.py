@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple  # noqa: F401
+
+import numpy as np
+from PIL import Image
+
+__all__ = [
+    "PreparedScreen",
+    "RESAMPLERS",
+    "estimate_text_height",
+]
+
+_Resampling = getattr(Image, "Resampling", Image)
+RESAMPLERS = {
+    "nearest": _Resampling.NEAREST,
+    "box": _Resampling.BOX,
+    "bilinear": _Resampling.BILINEAR,
+    "hamming": _Resampling.HAMMING,
+    "bicubic": _Resampling.BICUBIC,
+    "lanczos": _Resampling.LANCZOS,
+}
+
+BBox = Tuple[int, int, int, int]
+
+
+def estimate_text_height(img, contrast=64):
+    # type: (Image.Image, int) -> Optional[int]
+    """
+    Estimate the height of the lines of text in an area of the screen.
+
+    Pixels differing from the background, the median gray level, by more
+    than `contrast` are ink. Rows and columns which are mostly ink, like the
+    frame of a box, are ignored. The remaining runs of rows with ink are the
+    lines of text.
+
+    :returns: the median height of the lines or `None` if there is no text.
+
+    >>> img = Image.new("L", (60, 30), 255)
+    >>> img.paste(0, (10, 5, 50, 17))
+    >>> estimate_text_height(img)
+    12
+    """
+    pixels = np.asarray(img.convert("L"), dtype=np.int16)
+    if not pixels.size:
+        return None
+    ink = np.abs(pixels - np.median(pixels)) > contrast
+    ink[:, ink.mean(0) > 0.8] = False
+    rows = ink.mean(1)
+    rows = (rows > 0) & (rows <= 0.8)
+    changes = np.diff(np.concatenate([[0], rows.astype(np.int8), [0]]))
+    heights = np.flatnonzero(changes == -1) - np.flatnonzero(changes == 1)
+    # skip lines and dots
+    heights = heights[heights >= 3]
+    return int(np.median(heights)) if len(heights) else None
+
+
+class PreparedScreen(object):
+    """
+    The screen resized and binarized once for OCR.
+
+    Each region of the screen is resized by the first crop within it. All
+    areas in the region are then cropped from this image, so overlapping
+    areas, such as boxes within a changed region or the whole screen, are
+    not resized again. Areas outside of all regions or resized by another
+    factor are resized on their own.
+
+    >>> screen = PreparedScreen(Image.new("L", (100, 50), 255), 2.0, regions=[(10, 10, 60, 40)])
+    >>> img, origin = screen.crop((20, 20, 30, 25))
+    >>> img.size, origin
+    ((20, 10), (40.0, 40.0))
+    """
+
+    def __init__(self, img, resize, resample="bicubic", threshold=0, regions=None, masks=None):
+        # type: (Image.Image, float, str, int, Optional[Sequence[BBox]], Optional[Dict[Optional[BBox], List[BBox]]]) -> None
+        """
+        :param regions: The disjoint regions of the screen which are resized
+            as a whole, `None` for the whole screen.
+        :param masks: For some areas the rectangles to blank out of their crops.
+        """
+        try:
+            self.resample = RESAMPLERS[resample]
+        except KeyError:
+            raise ValueError("Unknown resampling filter %r" % (resample,))
+        self.img = img
+        self.size = img.size
+        self.resize = resize
+        self.threshold = threshold
+        self.regions = [(0, 0, img.width, img.height)] if regions is None else list(regions)  # type: List[BBox]
+        self.masks = masks or {}
+        self._resized = {}  # type: Dict[Tuple[BBox, float], Image.Image]
+        self._lock = threading.Lock()
+
+    def resized(self, region, resize=None):
+        # type: (BBox, Optional[float]) -> Image.Image
+        """The image of the region resized by `resize`, by default by the factor of the screen, and binarized."""
+        resize = self.resize if resize is None else resize
+        with self._lock:
+            try:
+                return self._resized[(region, resize)]
+            except KeyError:
+                pass
+
+        left, top, right, bottom = region
+        img = self.img if region == (0, 0) + self.size else self.img.crop(region)
+        img = img.resize((int(round((right - left) * resize)), int(round((bottom - top) * resize))), self.resample)
+        if self.threshold > 0:
+            img = img.point([0] * self.threshold + [255] * (256 - self.threshold))
+        with self._lock:
+            # keep the first one if the region has been resized concurrently
+            return self._resized.setdefault((region, resize), img)
+
+    def crop(self, box, resize=None):
+        # type: (Optional[BBox], Optional[float]) -> Tuple[Image.Image, Tuple[float, float]]
+        """
+        Crop the area from the resized region containing it.
+
+        :param resize: Resize the area by this factor instead of the factor of the screen.
+        :returns: the image of the area and its origin in the screen resized by the factor.
+        """
+        masks = self.masks.get(box, ())
+        if box is None:
+            box = (0, 0) + self.size  # type: ignore
+        resize = self.resize if resize is None else resize
+        for region in self.regions:
+            if resize == self.resize and region[0] <= box[0] and region[1] <= box[1] and box[2] <= region[2] and box[3] <= region[3]:
+                break
+        else:
+            region = box
+
+        resized = self.resized(region, resize)
+        left, top = region[:2]
+        x0, y0, x1, y1 = (int(round((value - offset) * resize)) for value, offset in zip(box, (left, top, left, top)))  # type: ignore
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(resized.width, x1), min(resized.height, y1)
+        img = resized if (x0, y0, x1, y1) == (0, 0) + resized.size else resized.crop((x0, y0, x1, y1))
+        origin = (x0 + left * resize, y0 + top * resize)
+        if masks:
+            img = img.copy() if img is resized else img
+            for mask in masks:
+                img.paste("white", tuple(int(round(value * resize - offset)) for value, offset in zip(mask, origin + origin)))
+        return img, origin
@@ -8,17 +8,34 @@ import logging
 import numpy as np
 
 cimport numpy as np
+from libcpp.algorithm cimport sort
+from libcpp.pair cimport pair
 from libcpp.vector cimport vector
 
 FLOAT = np.float32
 ctypedef np.float32_t FLOAT_t
 INT = np.int64
 ctypedef np.int64_t INT_t
+ctypedef pair[long long, Py_ssize_t] Seed  # raster index of the seed pixel and root run of a segment
 
 
-cdef void segment_line(int _x, int _y, int label, np.ndarray[FLOAT_t, ndim=2] edges, np.ndarray[INT_t, ndim=2] line_segments, FLOAT_t line_segment_low_threshold, vector[int] &stack, vector[FLOAT_t] &line_pixels):
-    assert edges.dtype == FLOAT and line_segments.dtype == INT
-    line_pixels.clear()
+cdef struct Segment:
+    # statistics of the pixels of a segment accumulated by the flood fill
+    double count, sum_x, sum_y, sum_xx, sum_yy
+    int min_x, min_y, max_x, max_y
+
+
+cdef enum:
+    LINE = 0
+    NO_LINE = 1
+    TOO_SHORT = 2
+
+
+cdef void segment_line(int _x, int _y, int label, FLOAT_t[:, :] edges, INT_t[:, :] line_segments, FLOAT_t line_segment_low_threshold, vector[int] &stack, Segment &segment) nogil:
+    segment.count = segment.sum_x = segment.sum_y = segment.sum_xx = segment.sum_yy = 0
+    segment.min_x = edges.shape[1]
+    segment.min_y = edges.shape[0]
+    segment.max_x = segment.max_y = -1
     stack.clear()
     stack.push_back(_x)
     stack.push_back(_y)
@@ -34,8 +51,15 @@ cdef void segment_line(int _x, int _y, int label, np.ndarray[FLOAT_t, ndim=2] ed
 
         if edges[y, x] > line_segment_low_threshold and line_segments[y, x] < 0:
             # unlabeld edge pixel...
-            line_pixels.push_back(x)
-            line_pixels.push_back(y)
+            segment.count += 1
+            segment.sum_x += x
+            segment.sum_y += y
+            segment.sum_xx += <double>x * x
+            segment.sum_yy += <double>y * y
+            segment.min_x = min(segment.min_x, x)
+            segment.min_y = min(segment.min_y, y)
+            segment.max_x = max(segment.max_x, x)
+            segment.max_y = max(segment.max_y, y)
             line_segments[y, x] = label
 
             # add direct neighbor pixels to stack
@@ -49,68 +73,239 @@ cdef void segment_line(int _x, int _y, int label, np.ndarray[FLOAT_t, ndim=2] ed
             stack.push_back(y + 1)
 
 
-cdef void line_from_pixels(vector[FLOAT_t] &_line_pixels, FLOAT_t line_segment_min_covariance, FLOAT_t line_min_length, vector[FLOAT_t] &line):
-    log = logging.getLogger(__name__)
+cdef int line_from_segment(Segment &segment, FLOAT_t line_segment_min_covariance, FLOAT_t line_min_length, FLOAT_t *line) nogil:
     cdef int i
-    if _line_pixels.size() == 0:
-        for i in range(4): line[i] = 0
-        return
-
-    line_pixels = np.array(_line_pixels, dtype=FLOAT)
-    line_pixels = line_pixels.reshape((_line_pixels.size() // 2, 2))
-    cdef np.ndarray[FLOAT_t, ndim=1] mean = line_pixels.mean(0)
-    cdef np.ndarray[FLOAT_t, ndim=1] line_min = line_pixels.min(0)
-    cdef np.ndarray[FLOAT_t, ndim=1] line_max = line_pixels.max(0)
-    cdef np.ndarray[FLOAT_t, ndim=1] variance = line_pixels.var(0)
-    cdef FLOAT_t covariance = variance[0] / (variance[1] + 0.0000001)  # avoid division by zero
+    for i in range(4): line[i] = 0
+    if segment.count == 0:
+        return LINE
+
+    cdef FLOAT_t mean_x = segment.sum_x / segment.count
+    cdef FLOAT_t mean_y = segment.sum_y / segment.count
+    cdef FLOAT_t var_x = max(0.0, (segment.sum_xx - segment.sum_x * segment.sum_x / segment.count) / segment.count)
+    cdef FLOAT_t var_y = max(0.0, (segment.sum_yy - segment.sum_y * segment.sum_y / segment.count) / segment.count)
+    cdef FLOAT_t covariance = var_x / (var_y + 0.0000001)  # avoid division by zero
     if 1.0 / line_segment_min_covariance < covariance < line_segment_min_covariance:
         # segment is not narrow enough and more blob-like
-        log.debug('  Ignoring line segment: Segment is no line!')
-        for i in range(4): line[i] = 0
-        return
+        return NO_LINE
 
     cdef FLOAT_t length
-    if variance[0] > variance[1]:
+    if var_x > var_y:
         # horizontal line
-        line[0] = line_min[0]
-        line[1] = mean[1]
-        line[2] = line_max[0]
-        line[3] = mean[1]
+        line[0] = segment.min_x
+        line[1] = mean_y
+        line[2] = segment.max_x
+        line[3] = mean_y
         length = line[2] - line[0]
     else:
         # vertical line
-        line[0] = mean[0]
-        line[1] = line_min[1]
-        line[2] = mean[0]
-        line[3] = line_max[1]
+        line[0] = mean_x
+        line[1] = segment.min_y
+        line[2] = mean_x
+        line[3] = segment.max_y
         length = line[3] - line[1]
 
     if length < line_min_length:
-        log.debug('  Ignoring line segment: Line is too short')
         for i in range(4): line[i] = 0
+        return TOO_SHORT
+    return LINE
 
 
-def find_lines(np.ndarray[FLOAT_t, ndim=2] edges not None, np.ndarray[INT_t, ndim=2] line_segments not None, config):
+def find_lines(FLOAT_t[:, :] edges not None, INT_t[:, :] line_segments not None, config):
+    """
+    Segment lines by flood filling connected edge pixels.
+
+    The statistics of each segment are accumulated while filling it, so the
+    image is segmented without the GIL and without allocations per segment.
+    Several images can be segmented in parallel threads.
+    """
     log = logging.getLogger(__name__)
     log.debug('Detecting line segments in image...')
+    cdef double high = config.line_segment_high_threshold
+    cdef FLOAT_t low = config.line_segment_low_threshold
+    cdef FLOAT_t min_covariance = config.line_segment_min_covariance
+    cdef FLOAT_t min_length = config.line_min_length
     cdef vector[FLOAT_t] _lines  # [line1_min_x, line1_min_y, line1_max_x, line1_max_y, line2_min_x, ...]
-    cdef vector[FLOAT_t] line_pixels  # [x1, y1, x2, y2, x3, ...]
     cdef vector[int] pixel_stack  # [x1, y1, x2, y2, x3, ...]
-    cdef vector[FLOAT_t] line = (0, 0, 0, 0)  # [min_x, min_y, max_x, max_y]
-    cdef int x, y, i
-    for y in range(edges.shape[0]):
-        for x in range(edges.shape[1]):
-            if edges[y, x] > config.line_segment_high_threshold and line_segments[y, x] < 0:
-                segment_line(x, y, _lines.size() // 4, edges, line_segments, config.line_segment_low_threshold, pixel_stack, line_pixels)
-                line_from_pixels(line_pixels, config.line_segment_min_covariance, config.line_min_length, line)
-
-                for i in range(4):
-                    _lines.push_back(line[i])
+    cdef Segment segment
+    cdef int x, y, k
+    cdef Py_ssize_t i, nlines = 0, no_lines = 0, too_short = 0
+    with nogil:
+        for y in range(edges.shape[0]):
+            for x in range(edges.shape[1]):
+                if edges[y, x] > high and line_segments[y, x] < 0:
+                    segment_line(x, y, nlines, edges, line_segments, low, pixel_stack, segment)
+                    _lines.resize(_lines.size() + 4)
+                    k = line_from_segment(segment, min_covariance, min_length, &_lines[4 * nlines])
+                    if k == NO_LINE:
+                        no_lines += 1
+                    elif k == TOO_SHORT:
+                        too_short += 1
+                    nlines += 1
 
-    log.debug('%s lines have been segmented in total', len(_lines) // 4)
+    log.debug('%s lines have been segmented in total, ignored %d segments being no line and %d too short lines', nlines, no_lines, too_short)
 
     # convert lines to 2d structure
-    lines = np.array(_lines)
-    lines = lines.reshape((_lines.size() // 4, 4))
+    lines = np.zeros((nlines, 4), dtype=np.float64)
+    cdef double[:, :] _view = lines
+    for i in range(nlines):
+        for k in range(4):
+            _view[i, k] = _lines[4 * i + k]
+
+    return lines
+
+
+cdef Py_ssize_t find_root(vector[Py_ssize_t] &parent, Py_ssize_t i) nogil:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+cdef double sum_squares(double n) nogil:
+    # sum of i**2 for i in 0..n
+    return n * (n + 1) * (2 * n + 1) / 6
+
+
+def find_line_runs(FLOAT_t[:, :] edges not None, INT_t[:, :] line_segments not None, config):
+    """
+    Segment lines from runs of edge pixels within the rows of the image.
+
+    Overlapping runs of consecutive rows are joined, which yields the same
+    4-connected segments, labels and lines as the flood fill of `find_lines`
+    while reading every pixel only once. The GIL is released while scanning
+    the image, so several images can be segmented in parallel threads.
+    """
+    log = logging.getLogger(__name__)
+    log.debug('Detecting line segments in image from runs...')
+    cdef FLOAT_t low = config.line_segment_low_threshold
+    cdef FLOAT_t high = config.line_segment_high_threshold
+    cdef FLOAT_t line_segment_min_covariance = config.line_segment_min_covariance
+    cdef FLOAT_t line_min_length = config.line_min_length
+    cdef Py_ssize_t height = edges.shape[0]
+    cdef Py_ssize_t width = edges.shape[1]
+    cdef vector[Py_ssize_t] run_y, run_x0, run_x1, parent
+    cdef vector[long long] run_seed  # raster index of the first pixel above the high threshold, -1 if none
+    cdef Py_ssize_t x, y, start, i, j, k, root, other
+    cdef Py_ssize_t prev_begin = 0, prev_end = 0, cur_begin
+    cdef long long seed
+    cdef Py_ssize_t nruns
+    cdef vector[double] count, sum_x, sum_y, sum_xx, sum_yy
+    cdef vector[Py_ssize_t] min_x, max_x, min_y, max_y, label
+    cdef vector[long long] segment_seed
+    cdef double n
+    cdef vector[Seed] seeds
+
+    with nogil:
+        # collect runs and join them with overlapping runs of the previous row
+        for y in range(height):
+            cur_begin = run_y.size()
+            j = prev_begin
+            x = 0
+            while x < width:
+                if not (edges[y, x] > low and line_segments[y, x] < 0):
+                    x += 1
+                    continue
+
+                start = x
+                seed = -1
+                while x < width and edges[y, x] > low and line_segments[y, x] < 0:
+                    if seed < 0 and edges[y, x] > high:
+                        seed = y * width + x
+                    x += 1
+
+                i = run_y.size()
+                run_y.push_back(y)
+                run_x0.push_back(start)
+                run_x1.push_back(x - 1)
+                run_seed.push_back(seed)
+                parent.push_back(i)
+
+                while j < prev_end and run_x1[j] < start:
+                    j += 1
+                k = j
+                while k < prev_end and run_x0[k] < x:
+                    root = find_root(parent, i)
+                    other = find_root(parent, k)
+                    if root != other:
+                        parent[max(root, other)] = min(root, other)
+                    k += 1
+
+            prev_begin = cur_begin
+            prev_end = run_y.size()
+
+        # accumulate statistics of all runs per segment
+        nruns = run_y.size()
+        count.resize(nruns, 0)
+        sum_x.resize(nruns, 0)
+        sum_y.resize(nruns, 0)
+        sum_xx.resize(nruns, 0)
+        sum_yy.resize(nruns, 0)
+        min_x.resize(nruns, width)
+        max_x.resize(nruns, -1)
+        min_y.resize(nruns, height)
+        max_y.resize(nruns, -1)
+        label.resize(nruns, -1)
+        segment_seed.resize(nruns, -1)
+        for i in range(nruns):
+            root = find_root(parent, i)
+            n = run_x1[i] - run_x0[i] + 1
+            count[root] += n
+            sum_x[root] += n * (run_x0[i] + run_x1[i]) / 2
+            sum_xx[root] += sum_squares(run_x1[i]) - sum_squares(run_x0[i] - 1)
+            sum_y[root] += n * run_y[i]
+            sum_yy[root] += n * run_y[i] * run_y[i]
+            min_x[root] = min(min_x[root], run_x0[i])
+            max_x[root] = max(max_x[root], run_x1[i])
+            min_y[root] = min(min_y[root], run_y[i])
+            max_y[root] = max(max_y[root], run_y[i])
+            if run_seed[i] >= 0 and (segment_seed[root] < 0 or run_seed[i] < segment_seed[root]):
+                segment_seed[root] = run_seed[i]
+
+        # label segments in the order in which the flood fill would seed them
+        for i in range(nruns):
+            if segment_seed[i] >= 0:
+                seeds.push_back(Seed(segment_seed[i], i))
+    sort(seeds.begin(), seeds.end())
+
+    lines = np.zeros((seeds.size(), 4), dtype=np.float64)
+    cdef double[:, :] _lines = lines
+    cdef double mean_x, mean_y, var_x, var_y, covariance, length
+    with nogil:
+        for k in range(seeds.size()):
+            root = seeds[k].second
+            label[root] = k
+
+            mean_x = sum_x[root] / count[root]
+            mean_y = sum_y[root] / count[root]
+            var_x = max(0.0, sum_xx[root] / count[root] - mean_x * mean_x)
+            var_y = max(0.0, sum_yy[root] / count[root] - mean_y * mean_y)
+            covariance = var_x / (var_y + 0.0000001)  # avoid division by zero
+            if 1.0 / line_segment_min_covariance < covariance < line_segment_min_covariance:
+                # segment is not narrow enough and more blob-like
+                continue
+
+            if var_x > var_y:
+                # horizontal line
+                length = max_x[root] - min_x[root]
+                if length >= line_min_length:
+                    _lines[k, 0] = min_x[root]
+                    _lines[k, 1] = mean_y
+                    _lines[k, 2] = max_x[root]
+                    _lines[k, 3] = mean_y
+            else:
+                # vertical line
+                length = max_y[root] - min_y[root]
+                if length >= line_min_length:
+                    _lines[k, 0] = mean_x
+                    _lines[k, 1] = min_y[root]
+                    _lines[k, 2] = mean_x
+                    _lines[k, 3] = max_y[root]
+
+        for i in range(nruns):
+            k = label[find_root(parent, i)]
+            if k >= 0:
+                for x in range(run_x0[i], run_x1[i] + 1):
+                    line_segments[run_y[i], x] = k
 
+    log.debug('%s lines have been segmented in total', seeds.size())
     return lines
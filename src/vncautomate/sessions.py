@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional  # noqa: F401
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, gatherResults, succeed
+from twisted.python.failure import Failure  # noqa: F401
+from vncdotool.client import factory_connect
+from vncdotool.command import parse_server
+
+from .backend import DaemonThreadPool, FairOCRPool, OCRBackend, SessionBackend, create_backend  # noqa: F401
+from .client import VNCAutomateClient, VNCAutomateFactory  # noqa: F401
+from .config import OCRConfig
+from .ocr import OCRAlgorithm
+
+__all__ = [
+    "SessionManager",
+    "VNCSession",
+]
+
+
+class _SessionFactory(VNCAutomateFactory):
+    """Connect the client of a session to the OCR algorithm of the session."""
+
+    def __init__(self, session):
+        # type: (VNCSession) -> None
+        VNCAutomateFactory.__init__(self)
+        self.session = session
+
+    def buildProtocol(self, addr):
+        # type: (Any) -> VNCAutomateClient
+        client = VNCAutomateFactory.buildProtocol(self, addr)
+        client.ocr_algo = self.session.algo
+        return client
+
+
+class VNCSession(object):
+    """
+    One VNC connection of a `SessionManager`.
+
+    :ivar client: The connected client, `None` until the connection is made.
+    :ivar algo: The OCR algorithm of the session using the shared workers.
+    """
+
+    def __init__(self, manager, name, server, config):
+        # type: (SessionManager, str, str, OCRConfig) -> None
+        self.name = name
+        self.server = server
+        self.algo = OCRAlgorithm(config)
+        self.algo.backend = manager.ocr_pool.join(name)
+        self.algo.pool = manager.analysis_pool
+        self.factory = _SessionFactory(self)
+        self.client = None  # type: Optional[VNCAutomateClient]
+
+    @property
+    def backend(self):
+        # type: () -> SessionBackend
+        return self.algo.backend  # type: ignore
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(%r, %r, connected=%s, backend=%r)" % (
+            self.__class__.__name__,
+            self.name,
+            self.server,
+            self.client is not None,
+            self.backend,
+        )
+
+
+class SessionManager(object):
+    """
+    Drive many VNC connections in the reactor of the calling thread.
+
+    Unlike `connect_vnc`, no reactor thread is started and disconnecting one
+    session does not affect the others. All sessions share one OCR backend,
+    whose workers serve the sessions in turn, and one pool of analysis
+    threads. Each session has its own OCR cache and configuration.
+
+    >>> manager = SessionManager(OCRConfig(ocr_workers=8))
+    >>> manager.ocr_pool.workers
+    8
+    """
+
+    def __init__(self, config=None, backend=None):
+        # type: (Optional[OCRConfig], Optional[OCRBackend]) -> None
+        """
+        :param config: Defaults of the configuration of the sessions.
+            `ocr_workers` and `analysis_workers` size the shared pools.
+        :param backend: The OCR backend to share, by default created from `config`.
+        """
+        self.log = logging.getLogger(__name__)
+        self.config = config or OCRConfig()
+        self.ocr_pool = FairOCRPool(backend or create_backend(self.config))
+        self.sessions = OrderedDict()  # type: Dict[str, VNCSession]
+        self._analysis_pool = None  # type: Optional[DaemonThreadPool]
+
+    @property
+    def analysis_pool(self):
+        # type: () -> Optional[DaemonThreadPool]
+        """Threads analyzing the screens of all sessions, `None` to analyze them on the reactor thread."""
+        workers = self.config.analysis_workers
+        if workers > 0 and self._analysis_pool is None:
+            self._analysis_pool = DaemonThreadPool(workers, workers, "vncautomate-analysis")
+            self._analysis_pool.start()
+            self._trigger = reactor.addSystemEventTrigger("during", "shutdown", self._analysis_pool.stop)
+        return self._analysis_pool
+
+    def add(self, name, server, **options):
+        # type: (str, str, **Any) -> VNCSession
+        """
+        Add a session without connecting it.
+
+        :param options: Options of `OCRConfig` overriding the defaults of the manager.
+        """
+        if name in self.sessions:
+            raise ValueError("Session %r already exists" % (name,))
+        config = OCRConfig(**vars(self.config))
+        config.update(**options)
+        session = self.sessions[name] = VNCSession(self, name, server, config)
+        return session
+
+    def connect(self, name, server, password=None, **options):
+        # type: (str, str, Optional[str], **Any) -> Deferred
+        """
+        Connect a new session to the VNC server, e.g. "host:display" or "host::port".
+
+        :returns: Deferred firing with the connected `VNCAutomateClient`.
+            If the connection fails, the session is removed again.
+        """
+        session = self.add(name, server, **options)
+        if password is not None:
+            session.factory.password = password
+        family, host, port = parse_server(server)
+        self.log.info("Connecting session %r to VNC host %s", name, server)
+
+        def _connected(client):
+            # type: (VNCAutomateClient) -> VNCAutomateClient
+            session.client = client
+            session.factory._disconnect_callbacks.append(_lost)
+            client.mouseMove(1, 1)
+            client.mouseMove(0, 0)
+            return client
+
+        def _failed(failure):
+            # type: (Failure) -> Failure
+            self.log.warning("Connecting session %r failed: %s", name, failure.getErrorMessage())
+            self._remove(session)
+            return failure
+
+        def _lost(reason):
+            # type: (Failure) -> None
+            if self.sessions.get(name) is session:
+                self.log.warning("Session %r lost its connection: %s", name, reason.getErrorMessage())
+            self._remove(session)
+
+        deferred = session.factory.deferred.addCallbacks(_connected, _failed)
+        factory_connect(session.factory, host, port, family)
+        return deferred
+
+    def disconnect(self, name):
+        # type: (str) -> Deferred
+        """
+        Disconnect the session and cancel its queued OCR requests.
+
+        :returns: Deferred firing when the connection is closed.
+        """
+        session = self.sessions[name]
+        self._remove(session)
+        client = session.client
+        if client is None or client.transport is None:
+            return succeed(None)
+
+        self.log.info("Disconnecting session %r", name)
+        deferred = Deferred()
+        session.factory._disconnect_callbacks.append(lambda reason: deferred.callback(None))
+        client.transport.loseConnection()
+        return deferred
+
+    def _remove(self, session):
+        # type: (VNCSession) -> None
+        if self.sessions.get(session.name) is session:
+            del self.sessions[session.name]
+        session.algo.close()
+
+    def close(self):
+        # type: () -> Deferred
+        """Disconnect all sessions and stop the shared pools."""
+
+        def _stop(result):
+            # type: (Any) -> Any
+            self.ocr_pool.close()
+            if self._analysis_pool is not None:
+                reactor.removeSystemEventTrigger(self._trigger)
+                self._analysis_pool.stop()
+                self._analysis_pool = None
+            return result
+
+        return gatherResults([self.disconnect(name) for name in list(self.sessions)]).addBoth(_stop)
+
+    def __getitem__(self, name):
+        # type: (str) -> VNCAutomateClient
+        """The connected client of the session."""
+        client = self.sessions[name].client
+        if client is None:
+            raise KeyError("Session %r is not connected" % (name,))
+        return client
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(sessions=%d, %r)" % (self.__class__.__name__, len(self.sessions), self.ocr_pool)
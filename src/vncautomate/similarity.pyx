@@ -0,0 +1,75 @@
+# distutils: language = c++
+#cython: language_level=3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import difflib
+
+cimport cython
+from libcpp.vector cimport vector
+
+AUTOJUNK_LENGTH = 200  # difflib treats popular characters of longer second sequences as junk
+
+
+cdef struct Block:
+    Py_ssize_t alo, ahi, blo, bhi
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t matching_characters(vector[Py_UCS4] &a, vector[Py_UCS4] &b) nogil:
+    # total size of the blocks found by difflib.SequenceMatcher.get_matching_blocks without junk:
+    # the longest common substring of a block, earliest in a and then in b, splits it recursively
+    cdef vector[Py_ssize_t] previous, current  # length of the match ending before index j+1 of b in the previous and current row
+    cdef vector[Block] stack
+    cdef Block block
+    cdef Py_ssize_t i, j, k, besti, bestj, bestsize, matches = 0
+    previous.resize(b.size() + 1)
+    current.resize(b.size() + 1)
+    stack.push_back(Block(0, a.size(), 0, b.size()))
+    while not stack.empty():
+        block = stack.back()
+        stack.pop_back()
+        besti, bestj, bestsize = block.alo, block.blo, 0
+        for j in range(block.blo, block.bhi + 1):
+            previous[j] = current[j] = 0
+        for i in range(block.alo, block.ahi):
+            for j in range(block.blo, block.bhi):
+                if a[i] == b[j]:
+                    k = previous[j] + 1
+                    current[j + 1] = k
+                    if k > bestsize:
+                        besti, bestj, bestsize = i - k + 1, j - k + 1, k
+                else:
+                    current[j + 1] = 0
+            previous.swap(current)
+        if bestsize:
+            matches += bestsize
+            if block.alo < besti and block.blo < bestj:
+                stack.push_back(Block(block.alo, besti, block.blo, bestj))
+            if besti + bestsize < block.ahi and bestj + bestsize < block.bhi:
+                stack.push_back(Block(besti + bestsize, block.ahi, bestj + bestsize, block.bhi))
+    return matches
+
+
+def ratio(str a not None, str b not None):
+    """
+    Similarity of two strings, equal to `difflib.SequenceMatcher(None, a, b).ratio()`.
+
+    >>> ratio("nex", "next")
+    0.8571428571428571
+    """
+    cdef Py_ssize_t length = len(a) + len(b)
+    cdef vector[Py_UCS4] _a, _b
+    cdef Py_UCS4 char
+    if not length:
+        return 1.0
+    if len(b) >= AUTOJUNK_LENGTH:
+        return difflib.SequenceMatcher(None, a, b).ratio()
+    _a.reserve(len(a))
+    for char in a:
+        _a.push_back(char)
+    _b.reserve(len(b))
+    for char in b:
+        _b.push_back(char)
+    return 2.0 * matching_characters(_a, _b) / length
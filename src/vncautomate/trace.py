@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import json
+import os
+import threading
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple  # noqa: F401
+
+__all__ = [
+    "Span",
+    "Tracer",
+]
+
+
+class _NullSpan(object):
+    """Span of a disabled tracer doing nothing."""
+
+    __slots__ = ()
+
+    def end(self, **args):
+        # type: (**Any) -> None
+        pass
+
+    def close(self, result):
+        # type: (Any) -> Any
+        return result
+
+    def __enter__(self):
+        # type: () -> _NullSpan
+        return self
+
+    def __exit__(self, *exc_info):
+        # type: (*Any) -> None
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span(_NullSpan):
+    """Time span of one stage, recorded when it ends."""
+
+    __slots__ = ("tracer", "name", "args", "lane", "start")
+
+    def __init__(self, tracer, name, args, lane):
+        # type: (Tracer, str, Dict[str, Any], Optional[Tuple[str, int]]) -> None
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.lane = lane
+        self.start = time()  # type: Optional[float]
+
+    def end(self, **args):
+        # type: (**Any) -> None
+        """Record the span, further calls are ignored."""
+        if self.start is None:
+            return
+        self.args.update(args)
+        self.tracer._record(self, time())
+        self.start = None
+
+    def close(self, result):
+        # type: (Any) -> Any
+        """End the span as callback or errback of a Deferred."""
+        self.end()
+        return result
+
+    def __exit__(self, *exc_info):
+        # type: (*Any) -> None
+        self.end()
+
+
+class Tracer(object):
+    """
+    Record the stages of text searches for viewing them in a trace viewer.
+
+    Spans are tagged with the number of the search attempt which caused them.
+    Spans of concurrent jobs like tesseract processes are spread over the
+    lanes of their group, so queueing and concurrency become visible. Other
+    spans started in threads besides the main thread get a lane per thread.
+    A disabled tracer hands out a shared span object which records nothing.
+
+    The trace is exported in the Chrome trace event format, which can be
+    opened by chrome://tracing or https://ui.perfetto.dev/.
+
+    >>> tracer = Tracer()
+    >>> with tracer.span("disabled"):
+    ...     pass
+    >>> tracer.enabled = True
+    >>> attempt = tracer.new_attempt()
+    >>> with tracer.span("stage", size=3):
+    ...     pass
+    >>> [(event["name"], event["tid"], event["args"]) for event in tracer.events]
+    [('stage', 0, {'size': 3, 'attempt': 1})]
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.enabled = False
+        self.attempt = 0
+        self.events = []  # type: List[Dict[str, Any]]
+        self.pid = os.getpid()
+        self._busy = set()  # type: Set[Tuple[str, int]]
+        self._tids = {}  # type: Dict[Tuple[str, int], int]
+        self._exported = ("", 0)  # type: Tuple[str, int]
+        self._lock = threading.Lock()
+
+    def new_attempt(self):
+        # type: () -> int
+        """Start a new search attempt, following spans are tagged with its number."""
+        self.attempt += 1
+        return self.attempt
+
+    def span(self, name, lanes=None, **args):
+        # type: (str, Optional[str], **Any) -> _NullSpan
+        """
+        Start a span, which must be ended by `end()`, as context manager or by `close()` in a callback chain.
+
+        :param lanes: Group of lanes for spans overlapping each other. The span
+            is put in the first lane of the group which is not busy.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        lane = None
+        with self._lock:
+            if lanes:
+                index = 1
+                while (lanes, index) in self._busy:
+                    index += 1
+                lane = (lanes, index)
+                self._busy.add(lane)
+            elif threading.current_thread() is not threading.main_thread():
+                lane = (threading.current_thread().name, 0)
+            if lane:
+                self._tids.setdefault(lane, len(self._tids) + 1)
+        args["attempt"] = self.attempt
+        return Span(self, name, args, lane)
+
+    def instant(self, name, **args):
+        # type: (str, **Any) -> None
+        """Record a point in time."""
+        if not self.enabled:
+            return
+        args["attempt"] = self.attempt
+        with self._lock:
+            self.events.append({"name": name, "ph": "i", "s": "t", "ts": time() * 1e6, "pid": self.pid, "tid": 0, "args": args})
+
+    def _record(self, span, end):
+        # type: (Span, float) -> None
+        with self._lock:
+            self._busy.discard(span.lane)  # type: ignore
+            self.events.append(
+                {
+                    "name": span.name,
+                    "ph": "X",
+                    "ts": span.start * 1e6,  # type: ignore
+                    "dur": (end - span.start) * 1e6,  # type: ignore
+                    "pid": self.pid,
+                    "tid": self._tids[span.lane] if span.lane else 0,
+                    "args": span.args,
+                }
+            )
+
+    def clear(self):
+        # type: () -> None
+        del self.events[:]
+
+    def export(self, path):
+        # type: (str) -> None
+        """
+        Write the recorded events in the Chrome trace event format and clear them.
+
+        Exporting to the same file again appends the events recorded since, so
+        the file covers all searches without writing their events again.
+        """
+        with self._lock:
+            recorded, self.events = self.events, []
+            lanes = sorted(self._tids.items(), key=lambda item: item[1])
+        exported_path, exported_lanes = self._exported
+        append = path == exported_path and os.path.exists(path)
+        if not append:
+            exported_lanes = 0
+        names = [] if append else [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "main"}}]
+        names += [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": "%s %d" % lane if lane[1] else lane[0]}}
+            for lane, tid in lanes
+            if tid > exported_lanes
+        ]
+        events = names + recorded
+        if not append:
+            with open(path, "w") as fd:
+                json.dump({"displayTimeUnit": "ms", "traceEvents": events}, fd)
+        elif events:
+            with open(path, "rb+") as fd:
+                # replace the closing "]}" of the trace events
+                fd.seek(-2, os.SEEK_END)
+                fd.write("".join(", " + json.dumps(event) for event in events).encode("utf-8") + b"]}")
+        self._exported = (path, len(lanes))
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(enabled=%s, events=%d)" % (self.__class__.__name__, self.enabled, len(self.events))
@@ -0,0 +1,316 @@
+#!/usr/bin/python3
+# SPDX-FileCopyrightText: 2016-2023 Univention GmbH
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from __future__ import absolute_import, division
+
+import difflib
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple, Union  # noqa: F401
+
+try:
+    import lxml.etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET  # type: ignore
+
+import numpy as np
+
+__all__ = [
+    "Word",
+    "WordColumns",
+    "WordTable",
+    "parse_hocr",
+    "parse_tsv",
+    "parse_words",
+]
+
+XHTML = "{http://www.w3.org/1999/xhtml}"
+RE_BBOX = re.compile(r"\bbbox ([0-9]+) ([0-9]+) ([0-9]+) ([0-9]+)\b")
+RE_WCONF = re.compile(r"\bx_wconf ([0-9.]+)")
+LINE_CLASSES = frozenset(["ocr_line", "ocr_caption", "ocr_header", "ocr_textfloat"])
+
+
+class WordColumns(object):
+    """
+    Words of one OCR result stored column by column.
+
+    The columns are allocated once for the expected number of words and
+    filled in a single pass over the OCR output. Words are kept in reading
+    order, so the words of each paragraph follow each other.
+
+    >>> columns = parse_tsv(b"5\\t1\\t1\\t1\\t1\\t1\\t10\\t20\\t30\\t8\\t96.5\\tNext\\n")
+    >>> len(columns), columns.texts, columns.bboxes.tolist(), columns.confidences.tolist()
+    (1, ['Next'], [[10, 20, 40, 28]], [96.5])
+    """
+
+    __slots__ = ("bboxes", "paragraphs", "lines", "confidences", "texts", "nparagraphs")
+
+    def __init__(self, capacity):
+        # type: (int) -> None
+        self.bboxes = np.zeros((capacity, 4), dtype=np.int64)
+        self.paragraphs = np.zeros(capacity, dtype=np.int32)
+        self.lines = np.zeros(capacity, dtype=np.int32)
+        self.confidences = np.full(capacity, -1.0, dtype=np.float32)  # -1 if unknown
+        self.texts = []  # type: List[str]
+        self.nparagraphs = 0
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.texts)
+
+    def trim(self):
+        # type: () -> WordColumns
+        """Drop the capacity not filled by words."""
+        count = len(self.texts)
+        self.bboxes = self.bboxes[:count]
+        self.paragraphs = self.paragraphs[:count]
+        self.lines = self.lines[:count]
+        self.confidences = self.confidences[:count]
+        return self
+
+    def paragraph_bounds(self):
+        # type: () -> np.ndarray
+        """Index of the first word of each paragraph, followed by the number of words."""
+        return np.searchsorted(self.paragraphs[: len(self.texts)], np.arange(self.nparagraphs + 1))
+
+
+class Word(object):
+    """
+    View of one row of a `WordTable`.
+
+    The bounding box is read from the table on access.
+    """
+
+    __slots__ = ("table", "index", "word", "lower")
+
+    def __init__(self, table, index):
+        # type: (WordTable, int) -> None
+        self.table = table
+        self.index = index
+        self.word = table.texts[index]
+        self.lower = table.lowers[index]
+
+    @property
+    def bbox(self):
+        # type: () -> np.ndarray
+        return self.table.bboxes[self.index]
+
+    def fuzzy_match(self, another_string):
+        # type: (str) -> float
+        return difflib.SequenceMatcher(None, self.lower, another_string.lower()).ratio()
+
+    def __str__(self):
+        # type: () -> str
+        return "%r@%s" % (self.word, self.bbox)
+
+    def __repr__(self):
+        # type: () -> str
+        return "%s(%r, %r)" % (self.__class__.__name__, self.word, self.bbox)
+
+
+class WordTable(object):
+    """
+    Words of one OCR result with their bounding boxes in a single N×4 array.
+
+    Coordinates are transformed for all words at once. Each transformation
+    returns a new table sharing the texts, so cached tables are never
+    modified. `lines()` provides the paragraphs as lists of `Word` views.
+
+    >>> table = WordTable(["Next", "Back", "Cancel"], [[20, 10, 60, 20], [80, 10, 120, 20], [20, 50, 80, 60]], [0, 0, 1], 2)
+    >>> table.scale(0.5).offset(100, 200).bboxes.tolist()[0]
+    [110.0, 205.0, 130.0, 210.0]
+    >>> table.centroid([0, 1]).tolist()
+    [70.0, 15.0]
+    >>> [[word.word for word in line] for line in table.within((0, 0, 100, 40)).lines()]
+    [['Next']]
+    """
+
+    __slots__ = ("texts", "lowers", "bboxes", "paragraphs", "nparagraphs")
+
+    def __init__(self, texts, bboxes, paragraphs, nparagraphs, lowers=None):
+        # type: (List[str], Union[np.ndarray, Sequence], Union[np.ndarray, Sequence[int]], int, Optional[List[str]]) -> None
+        self.texts = texts
+        self.lowers = [text.lower() for text in texts] if lowers is None else lowers
+        self.bboxes = np.array(bboxes, dtype=np.float64).reshape(len(texts), 4)
+        self.paragraphs = np.array(paragraphs, dtype=np.int32).reshape(len(texts))
+        self.nparagraphs = nparagraphs
+
+    @classmethod
+    def from_columns(cls, columns):
+        # type: (WordColumns) -> WordTable
+        return cls(columns.texts, columns.bboxes, columns.paragraphs, columns.nparagraphs)
+
+    @classmethod
+    def from_lines(cls, lines):
+        # type: (Iterable[Sequence[Word]]) -> WordTable
+        """Collect lines of word objects with `word` and `bbox` attributes, such as `Word` views of other tables, into a table."""
+        texts = []  # type: List[str]
+        bboxes = []  # type: List[np.ndarray]
+        paragraphs = []  # type: List[int]
+        nparagraphs = 0
+        for line in lines:
+            for word in line:
+                texts.append(word.word)
+                bboxes.append(np.zeros(4) if word.bbox is None else word.bbox)
+                paragraphs.append(nparagraphs)
+            nparagraphs += 1
+        return cls(texts, bboxes, paragraphs, nparagraphs)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        # type: (int) -> Word
+        return Word(self, index)
+
+    def _derive(self, bboxes):
+        # type: (np.ndarray) -> WordTable
+        table = WordTable.__new__(WordTable)
+        table.texts, table.lowers, table.bboxes = self.texts, self.lowers, bboxes
+        table.paragraphs, table.nparagraphs = self.paragraphs, self.nparagraphs
+        return table
+
+    def scale(self, factor):
+        # type: (float) -> WordTable
+        return self._derive(self.bboxes * factor)
+
+    def offset(self, x, y):
+        # type: (float, float) -> WordTable
+        return self._derive(self.bboxes + (x, y, x, y))
+
+    def centers(self):
+        # type: () -> np.ndarray
+        """Center of the bounding box of each word."""
+        return (self.bboxes[:, :2] + self.bboxes[:, 2:]) / 2.0
+
+    def centroid(self, indices=slice(None)):
+        # type: (Union[slice, Sequence[int]]) -> np.ndarray
+        """Mean of the corners of the bounding boxes of the words."""
+        return self.bboxes[indices].reshape(-1, 2).mean(0)
+
+    def bounding_box(self, indices=slice(None)):
+        # type: (Union[slice, Sequence[int]]) -> np.ndarray
+        """Bounding box of the words."""
+        bboxes = self.bboxes[indices]
+        return np.concatenate([bboxes[:, :2].min(0), bboxes[:, 2:].max(0)])
+
+    def select(self, mask):
+        # type: (np.ndarray) -> WordTable
+        """Keep the words selected by the boolean mask, dropping paragraphs without words."""
+        indices = np.flatnonzero(mask)
+        paragraphs, renumbered = np.unique(self.paragraphs[indices], return_inverse=True)
+        return WordTable(
+            [self.texts[i] for i in indices],
+            self.bboxes[indices],
+            renumbered,
+            len(paragraphs),
+            [self.lowers[i] for i in indices],
+        )
+
+    def within(self, region):
+        # type: (Tuple[float, float, float, float]) -> WordTable
+        """Keep the words whose center lies in the region."""
+        centers = self.centers()
+        left, top, right, bottom = region
+        return self.select((centers[:, 0] >= left) & (centers[:, 0] < right) & (centers[:, 1] >= top) & (centers[:, 1] < bottom))
+
+    def lines(self):
+        # type: () -> List[List[Word]]
+        """The paragraphs of words as lists of views, including empty paragraphs."""
+        words = [Word(self, index) for index in range(len(self.texts))]
+        bounds = np.searchsorted(self.paragraphs, np.arange(self.nparagraphs + 1)).tolist()
+        return [words[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def parse_hocr(data):
+    # type: (bytes) -> WordColumns
+    """
+    Parse the words of the paragraphs of an hOCR document.
+
+    The titles of all words are converted to numbers at once. Only if some
+    title does not consist of the bounding box and the confidence, each title
+    is searched for them separately.
+
+    :raises ET.ParseError: if the document is malformed.
+    """
+    xml = ET.fromstring(data, parser=ET.XMLParser())
+    columns = WordColumns(data.count(b"ocrx_word"))
+    titles = []  # type: List[str]
+    paragraphs = []  # type: List[int]
+    lines = []  # type: List[int]
+    texts = columns.texts
+    line = -1
+    for para in xml.iter(XHTML + "p"):
+        if para.get("class") != "ocr_par":
+            continue
+        for span in para.iter(XHTML + "span"):
+            cls = span.get("class")
+            if cls in LINE_CLASSES:
+                line += 1
+            elif cls == "ocrx_word":
+                titles.append(span.get("title", ""))
+                while len(span):
+                    # the word might be packed into an HTML tag such as <strong>
+                    span = span[0]
+                texts.append(span.text or "")
+                paragraphs.append(columns.nparagraphs)
+                lines.append(line)
+        columns.nparagraphs += 1
+
+    columns.trim()
+    columns.paragraphs[:] = paragraphs
+    columns.lines[:] = lines
+    try:
+        values = " ".join(titles).replace("bbox", "").replace("; x_wconf", "").split()
+        numbers = np.array(values, dtype=np.float64).reshape(len(titles), 5)
+    except ValueError:
+        for iword, title in enumerate(titles):
+            match = RE_BBOX.search(title)
+            if match:
+                columns.bboxes[iword] = [int(value) for value in match.groups()]
+            match = RE_WCONF.search(title)
+            if match:
+                columns.confidences[iword] = float(match.group(1))
+    else:
+        columns.bboxes[:] = numbers[:, :4]
+        columns.confidences[:] = numbers[:, 4]
+    return columns
+
+
+def parse_tsv(data):
+    # type: (bytes) -> WordColumns
+    """
+    Parse the words of the TSV output of tesseract.
+
+    Rows of level 5 are words. Their paragraphs and lines are numbered within
+    their blocks and paragraphs, so a paragraph or line starts whenever these
+    numbers change.
+
+    :raises ValueError: if a word row is malformed.
+    """
+    rows = [row.rsplit("\t", 1) for row in data.decode("utf-8").split("\n") if row.startswith("5\t")]
+    columns = WordColumns(len(rows))
+    if not rows:
+        return columns
+
+    columns.texts[:] = [row[1] if len(row) > 1 else "" for row in rows]
+    numbers = np.array("\t".join([row[0] for row in rows]).split("\t"), dtype=np.float64).reshape(len(rows), 11)
+    columns.bboxes[:, :2] = numbers[:, 6:8]
+    columns.bboxes[:, 2:] = numbers[:, 6:8] + numbers[:, 8:10]
+    columns.confidences[:] = numbers[:, 10]
+    # block, paragraph and line numbers
+    changed = np.ones((len(rows), 3), dtype=bool)
+    changed[1:] = numbers[1:, 2:5] != numbers[:-1, 2:5]
+    columns.paragraphs[:] = np.cumsum(changed[:, :2].any(1)) - 1
+    columns.lines[:] = np.cumsum(changed.any(1)) - 1
+    columns.nparagraphs = int(columns.paragraphs[-1]) + 1
+    return columns
+
+
+def parse_words(data):
+    # type: (bytes) -> WordColumns
+    """Parse the words of hOCR or TSV output, depending on the document."""
+    if data.lstrip()[:1] == b"<":
+        return parse_hocr(data)
+    return parse_tsv(data)
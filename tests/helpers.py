@@ -0,0 +1,136 @@
+# coding: utf-8
+"""OCR backends, hOCR data and a VNC server shared by the tests."""
+from __future__ import absolute_import
+
+import struct
+
+import numpy as np
+from twisted.internet import protocol
+from twisted.internet.defer import Deferred, succeed
+
+from vncautomate.backend import OCRBackend
+from vncautomate.words import WordTable
+
+HOCR = b"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><body>
+<p class='ocr_par'>
+<span class='ocrx_word' title='bbox 30 30 60 40'>Screen</span>
+<span class='ocrx_word' title='bbox 24 144 44 156'>OK</span>
+</p>
+</body></html>"""
+
+
+def word_lines(lines):
+    """Word views of the texts, one paragraph per line and without bounding boxes."""
+    texts = [text for line in lines for text in line]
+    paragraphs = [iline for iline, line in enumerate(lines) for _ in line]
+    return WordTable(texts, np.zeros((len(texts), 4)), paragraphs, len(lines)).lines()
+
+
+class StaticBackend(OCRBackend):
+    """Recognize the same hOCR in every image at once."""
+
+    def __init__(self, hocr):
+        super(StaticBackend, self).__init__()
+        self.hocr = hocr
+        self.images = []
+
+    def _recognize(self, img, lang):
+        self.images.append(img)
+        return succeed(self.hocr)
+
+
+class ManualBackend(OCRBackend):
+    """Keep the recognitions running until the test fires their Deferreds."""
+
+    def __init__(self, workers):
+        super(ManualBackend, self).__init__(workers)
+        self.images = []
+        self.running = []
+
+    def _recognize(self, img, lang):
+        self.images.append(img)
+        deferred = Deferred(self.running.remove)
+        self.running.append(deferred)
+        return deferred
+
+
+class FakeVNCServer(protocol.Protocol):
+    """Minimal RFB 3.8 server without authentication sending the whole screen as raw 32 bit BGRX pixels."""
+
+    MESSAGE_SIZES = {0: 20, 3: 10, 4: 8, 5: 6}
+
+    def connectionMade(self):
+        self.buffer = b""
+        self.state = "version"
+        self.factory.clients.append(self)
+        self.transport.write(b"RFB 003.008\n")
+
+    def connectionLost(self, reason):
+        self.factory.clients.remove(self)
+
+    def dataReceived(self, data):
+        self.buffer += data
+        while self.buffer and self._handle():
+            pass
+
+    def _consume(self, size):
+        if len(self.buffer) < size:
+            return None
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _handle(self):
+        if self.state == "version":
+            if self._consume(12) is None:
+                return False
+            self.transport.write(b"\x01\x01")  # security type None
+            self.state = "security"
+        elif self.state == "security":
+            if self._consume(1) is None:
+                return False
+            self.transport.write(struct.pack("!I", 0))
+            self.state = "init"
+        elif self.state == "init":
+            if self._consume(1) is None:
+                return False
+            width, height = self.factory.screen.size
+            pixel_format = struct.pack("!BBBBHHHBBBxxx", 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+            self.transport.write(struct.pack("!HH", width, height) + pixel_format + struct.pack("!I", 4) + b"fake")
+            self.state = "normal"
+        else:
+            return self._handle_message()
+        return True
+
+    def _handle_message(self):
+        msg_type = ord(self.buffer[0:1])
+        if msg_type == 2:  # SetEncodings
+            if len(self.buffer) < 4:
+                return False
+            (count,) = struct.unpack("!H", self.buffer[2:4])
+            return self._consume(4 + 4 * count) is not None
+        if msg_type == 6:  # ClientCutText
+            if len(self.buffer) < 8:
+                return False
+            (length,) = struct.unpack("!I", self.buffer[4:8])
+            return self._consume(8 + length) is not None
+
+        data = self._consume(self.MESSAGE_SIZES[msg_type])
+        if data is None:
+            return False
+        if msg_type == 3 and not data[1]:  # non-incremental FramebufferUpdateRequest
+            width, height = self.factory.screen.size
+            header = struct.pack("!BxHHHHHi", 0, 1, 0, 0, width, height, 0)
+            self.transport.write(header + self.factory.screen.convert("RGBX").tobytes("raw", "BGRX"))
+        elif msg_type == 4:  # KeyEvent
+            self.factory.keys.append(struct.unpack("!BBxxI", data[:8])[1:])
+        return True
+
+
+class FakeVNCFactory(protocol.Factory):
+    protocol = FakeVNCServer
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.clients = []
+        self.keys = []
@@ -0,0 +1,100 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import asyncio
+import subprocess
+import sys
+import textwrap
+from os.path import dirname, join
+
+import pytest
+from PIL import Image
+from twisted.internet.defer import succeed
+
+from vncautomate.aio import AsyncClient, AsyncSessionManager
+from vncautomate.client import VNCAutomateClient
+from vncautomate.config import OCRConfig
+
+from .helpers import HOCR, ManualBackend, StaticBackend
+
+ROOT = dirname(dirname(__file__))
+
+
+def client(backend):
+    vnc = VNCAutomateClient()
+    vnc.updateOCRConfig(ocr_cache_size=0, analysis_workers=0, location_margin=0)
+    vnc.ocr_algo.backend = backend
+    vnc.screen = Image.new("RGB", (200, 200), "white")
+    vnc.refreshScreen = lambda incremental=0: succeed(vnc)
+    return vnc
+
+
+def test_wait_for_text():
+    vnc = AsyncClient(client(StaticBackend(HOCR)))
+    assert asyncio.run(vnc.wait_for_text("Screen", wait=False)) == (22, 17)
+    assert asyncio.run(vnc.wait_for_any_text(["Login", "OK"], wait=False)) == ("OK", (17, 75))
+    snapshot = asyncio.run(vnc.snapshot())
+    assert snapshot.find("Screen") == (22, 17)
+
+
+def test_cancel():
+    backend = ManualBackend(1)
+    vnc = AsyncClient(client(backend))
+
+    async def main():
+        task = asyncio.ensure_future(vnc.wait_for_text("Screen", wait=False))
+        await asyncio.sleep(0)
+        assert len(backend.running) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # cancelling the task stopped the OCR job of the search
+    assert backend.running == []
+    assert len(backend.images) == 1
+
+
+def test_reactor():
+    with pytest.raises(RuntimeError):
+        AsyncSessionManager(OCRConfig())
+
+
+SCRIPT = """
+from twisted.internet import asyncioreactor
+asyncioreactor.install()
+
+from PIL import Image
+from twisted.internet import reactor
+
+from tests.helpers import HOCR, FakeVNCFactory, StaticBackend
+from vncautomate.aio import AsyncSessionManager, run
+from vncautomate.config import OCRConfig
+
+
+async def main():
+    server = FakeVNCFactory(Image.new("RGB", (200, 200), "white"))
+    port = reactor.listenTCP(0, server, interface="127.0.0.1")
+    address = "127.0.0.1::%d" % (port.getHost().port,)
+    config = OCRConfig(ocr_cache_size=0, location_margin=0, poll_min_interval=0.05)
+    async with AsyncSessionManager(config, StaticBackend(HOCR)) as manager:
+        vm1 = await manager.connect("vm1", address)
+        vm2 = await manager.connect("vm2", address)
+        assert await vm1.wait_for_text("Screen", timeout=10) == (22, 17)
+        assert await vm2.click_on_text("OK", timeout=10) == (17, 75)
+        await vm1.enter_text("ab")
+        await manager.disconnect("vm2")
+        assert list(manager.manager.sessions) == ["vm1"]
+    assert [key for key in server.keys if key[0]] == [(1, ord("a")), (1, ord("b"))]
+    port.stopListening()
+    print("done")
+
+
+run(main)
+"""
+
+
+def test_asyncio_reactor():
+    env = {"PYTHONPATH": join(ROOT, "src") + ":" + ROOT}
+    output = subprocess.check_output([sys.executable, "-c", textwrap.dedent(SCRIPT)], cwd=ROOT, env=env, timeout=60)
+    assert output.splitlines()[-1] == b"done"
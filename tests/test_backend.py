@@ -0,0 +1,227 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import os
+import stat
+import sys
+import tempfile
+import threading
+import types
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from twisted.internet import reactor
+from twisted.internet.defer import CancelledError, Deferred
+from twisted.internet.error import ProcessTerminated
+from twisted.internet.task import deferLater
+from twisted.trial import unittest
+
+from vncautomate.backend import HOCR_HEADER, OCRQueueFull, TesseractBackend, TesserocrBackend, _TesseractProtocol, create_backend
+from vncautomate.config import OCRConfig
+
+from .helpers import ManualBackend
+
+
+def test_bounded_concurrency():
+    backend = ManualBackend(2)
+    img = Image.new("L", (1, 1))
+    results = []
+    for _ in range(5):
+        backend.recognize(img, "eng").addCallback(results.append)
+
+    assert len(backend.running) == 2
+    assert backend.queued == 3
+
+    backend.running.pop(0).callback(b"<html/>")
+    assert len(backend.running) == 2
+    assert backend.queued == 2
+    assert results[0][0] == b"<html/>"
+
+
+def test_bounded_queue():
+    backend = ManualBackend(1)
+    backend.max_queued = 2
+    img = Image.new("L", (1, 1))
+    results = []
+    for _ in range(4):
+        backend.recognize(img, "eng").addBoth(results.append)
+
+    # the request exceeding the queue fails at once
+    assert (len(backend.running), backend.queued) == (1, 2)
+    assert len(results) == 1
+    assert results[0].check(OCRQueueFull)
+    backend.running.pop(0).callback(b"")
+    backend.recognize(img, "eng").addBoth(results.append)
+    assert backend.queued == 2
+    assert len(results) == 2
+
+
+def test_create_backend():
+    backend = create_backend(OCRConfig(ocr_workers=3))
+    assert isinstance(backend, TesseractBackend)
+    assert backend.workers == 3
+    assert backend.max_queued == OCRConfig.ocr_queue_size
+
+    with pytest.raises(ValueError):
+        create_backend(OCRConfig(ocr_backend="unknown"))
+
+    assert create_backend(OCRConfig(ocr_output="tsv")).output == "tsv"
+    with pytest.raises(ValueError):
+        create_backend(OCRConfig(ocr_output="unknown"))
+
+
+class TestTesseractBackend(unittest.TestCase):
+    def _backend(self, script):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as f:
+            f.write("#!/bin/sh\n" + script)
+        os.chmod(path, stat.S_IRWXU)
+        self.addCleanup(os.unlink, path)
+        backend = TesseractBackend()
+        backend.TESSERACT = path
+        return backend
+
+    def test_stream(self):
+        backend = self._backend('[ "$*" = "stdin stdout -l eng hocr" ] && cat')
+        img = Image.new("L", (2, 2))
+        deferred = backend.recognize(img, "eng")
+        deferred.addCallback(lambda result: self.assertTrue(result[0].startswith(b"\x89PNG")))
+        # encoded in a thread once the reactor runs
+        deferred.addCallback(lambda _: deferLater(reactor, 0, backend.recognize, img, "eng"))
+        deferred.addCallback(lambda result: self.assertTrue(result[0].startswith(b"\x89PNG")))
+        return deferred
+
+    def test_stream_tsv(self):
+        backend = self._backend('[ "$*" = "stdin stdout -l deu tsv" ] && echo TSV')
+        backend.output = "tsv"
+        deferred = backend.recognize(Image.new("L", (2, 2)), "deu")
+        deferred.addCallback(lambda result: self.assertEqual(result[0], b"TSV\n"))
+        return deferred
+
+    def test_failure(self):
+        backend = self._backend("exit 1")
+        deferred = backend.recognize(Image.new("L", (2, 2)), "eng")
+        return self.assertFailure(deferred, ProcessTerminated)
+
+    def test_cancel(self):
+        # cancel once tesseract runs and wait for the killed process to be reaped to leave a clean reactor
+        started, ended = Deferred(), Deferred()
+        connection_made = _TesseractProtocol.connectionMade
+        process_ended = _TesseractProtocol.processEnded
+
+        def _connection_made(protocol):
+            connection_made(protocol)
+            started.callback(None)
+
+        def _process_ended(protocol, reason):
+            process_ended(protocol, reason)
+            ended.callback(None)
+
+        self.patch(_TesseractProtocol, "connectionMade", _connection_made)
+        self.patch(_TesseractProtocol, "processEnded", _process_ended)
+        backend = self._backend("sleep 60")
+        deferred = backend.recognize(Image.new("L", (2, 2)), "eng")
+        self.assertFailure(deferred, CancelledError)
+
+        def _cancel(_):
+            deferred.cancel()
+            self.assertEqual(backend.semaphore.tokens, backend.workers)
+            return deferred.addCallback(lambda _: ended)
+
+        return started.addCallback(_cancel)
+
+    def test_cancel_encoding(self):
+        backend = self._backend("sleep 60")
+        runs = []
+        self.patch(backend, "_run", lambda img_data, lang: runs.append(img_data))
+
+        def _start():
+            # the image is encoded in a thread once the reactor runs
+            deferred = backend.recognize(Image.new("L", (2, 2)), "eng")
+            deferred.cancel()
+            self.assertEqual(backend.semaphore.tokens, backend.workers)
+            return self.assertFailure(deferred, CancelledError)
+
+        def _cancelled(_):
+            self.assertEqual(runs, [])
+
+        return deferLater(reactor, 0, _start).addCallback(_cancelled)
+
+
+class FakeTessBaseAPI(object):
+    """Record the images set like tesserocr.PyTessBaseAPI and recognize their size."""
+
+    instances = []
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.thread = threading.current_thread()
+        self.img = None
+        self.instances.append(self)
+
+    def SetImage(self, img):
+        self.img = img
+
+    def GetHOCRText(self, page):
+        return "<div class='ocr_page'>%dx%d</div>" % self.img.size
+
+    def GetTSVText(self, page):
+        return "5\t1\t1\t1\t1\t1\t0\t0\t%d\t%d\t90\tä" % self.img.size
+
+    def Clear(self):
+        self.img = None
+
+
+class TestTesserocrBackend(unittest.TestCase):
+    def setUp(self):
+        FakeTessBaseAPI.instances = []
+        module = types.ModuleType("tesserocr")
+        module.PyTessBaseAPI = FakeTessBaseAPI
+        self.addCleanup(sys.modules.pop, "tesserocr", None)
+        sys.modules["tesserocr"] = module
+        self.backend = TesserocrBackend(workers=1)
+        self.addCleanup(self.backend.close)
+
+    def test_warm_instances(self):
+        def _recognize(size, lang):
+            return lambda _: self.backend.recognize(Image.new("L", size), lang)
+
+        def _recognized(results):
+            self.assertEqual(results[0][0], HOCR_HEADER + b"<div class='ocr_page'>2x3</div></body></html>")
+            self.assertIn(b"4x5", results[1][0])
+            # each thread loads a model once per language
+            self.assertEqual([api.lang for api in FakeTessBaseAPI.instances], ["eng", "deu"])
+            self.assertIn("vncautomate-ocr", FakeTessBaseAPI.instances[0].thread.name)
+
+        results = []
+        deferred = deferLater(reactor, 0, lambda: None)
+        for size, lang in [((2, 3), "eng"), ((4, 5), "eng"), ((6, 7), "deu")]:
+            deferred.addCallback(_recognize(size, lang)).addCallback(results.append)
+        return deferred.addCallback(lambda _: _recognized(results))
+
+    def test_tsv(self):
+        self.backend.output = "tsv"
+        deferred = deferLater(reactor, 0, self.backend.recognize, Image.new("L", (2, 3)), "eng")
+        deferred.addCallback(lambda result: self.assertEqual(result[0], "5\t1\t1\t1\t1\t1\t0\t0\t2\t3\t90\tä".encode("utf-8")))
+        return deferred
+
+    def test_create_backend(self):
+        backend = create_backend(OCRConfig(ocr_backend="tesserocr", ocr_workers=2, ocr_queue_size=8))
+        self.addCleanup(backend.close)
+        self.assertIsInstance(backend, TesserocrBackend)
+        self.assertEqual((backend.workers, backend.max_queued), (2, 8))
+
+
+class TestTesserocr(unittest.TestCase):
+    """Recognize a rendered word with the optional tesserocr module installed with the extra `tesserocr`."""
+
+    def test_recognize(self):
+        pytest.importorskip("tesserocr")
+        backend = TesserocrBackend(workers=1)
+        self.addCleanup(backend.close)
+        img = Image.new("L", (200, 60), 255)
+        ImageDraw.Draw(img).text((20, 20), "Next", fill=0, font=ImageFont.load_default())
+        img = img.resize((800, 240))
+        deferred = deferLater(reactor, 0, backend.recognize, img, "eng")
+        deferred.addCallback(lambda result: self.assertIn(b"Next", result[0]))
+        return deferred
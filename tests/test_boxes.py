@@ -0,0 +1,46 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from vncautomate import segment_line  # type: ignore
+from vncautomate.ocr import EndpointIndex, OCRAlgorithm
+
+
+@pytest.fixture
+def algo():
+    return OCRAlgorithm()
+
+
+def test_detect_boxes(algo):
+    img = Image.new("L", (320, 240), 236)
+    draw = ImageDraw.Draw(img)
+    drawn = [(20, 20, 140, 50), (180, 20, 300, 50), (40, 120, 280, 160)]
+    for box in drawn:
+        draw.rectangle(box, fill=255, outline=64)
+
+    horizontal_edges, vertical_edges = algo.detect_edges(img)
+    mat_shape = tuple(reversed(img.size))
+    vertical_line_segments = -np.ones(mat_shape, dtype="int64")
+    vertical_lines = segment_line.find_lines(vertical_edges, vertical_line_segments, algo.config)
+    horizontal_line_segments = -np.ones(mat_shape, dtype="int64")
+    horizontal_lines = segment_line.find_lines(horizontal_edges, horizontal_line_segments, algo.config)
+    args = (horizontal_lines, vertical_lines, horizontal_line_segments, vertical_line_segments)
+
+    boxes = list(algo.detect_boxes(*args))
+    assert boxes
+    assert set(boxes) <= set(drawn)
+
+
+def test_match(algo):
+    line_segments = -np.ones((50, 50), dtype="int64")
+    lines = [(10, 10, 10, 40), (20, 10, 20, 40), (0, 0, 0, 0)]
+    line_segments[10:41, 10] = 0
+    line_segments[10:41, 20] = 1
+    index = EndpointIndex(lines, line_segments)
+
+    points = [(12, 9), (19, 41), (15, 25), (10, 10)]
+    labels = [-1, -1, -1, 0]
+    assert list(index.match(points, labels, 10.0)) == [0, 1, -1, -1]
@@ -0,0 +1,57 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import pytest
+from PIL import Image
+
+from vncautomate.cache import OCRCache
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.words import WordTable
+
+
+def test_lru_eviction():
+    cache = OCRCache(2)
+    cache.put(b"a", [], 1.0)
+    cache.put(b"b", [], 2.0)
+    assert cache.get(b"a") == []
+    cache.put(b"c", [], 3.0)
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == []
+    assert (cache.hits, cache.misses, cache.saved) == (2, 1, pytest.approx(2.0))
+
+
+def test_disabled():
+    cache = OCRCache(0)
+    cache.put(b"a", [], 1.0)
+    assert len(cache) == 0
+
+
+def test_key():
+    img = Image.new("L", (10, 10), 255)
+    assert OCRCache.key(img, "eng", 2.0) == OCRCache.key(img.copy(), "eng", 2.0)
+    assert OCRCache.key(img, "eng", 2.0) != OCRCache.key(img, "deu", 2.0)
+    assert OCRCache.key(img, "eng", 2.0) != OCRCache.key(img, "eng", 1.0)
+    img2 = img.copy()
+    img2.putpixel((5, 5), 0)
+    assert OCRCache.key(img, "eng", 2.0) != OCRCache.key(img2, "eng", 2.0)
+
+
+def test_ocr_img_hit():
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0))
+    img = Image.new("L", (100, 100), 255)
+    box = (10, 20, 30, 40)
+    key = OCRCache.key(img.crop(box).resize((40, 40)), "eng", 2.0)
+    algo.cache.put(key, WordTable(["OK"], [[2, 4, 10, 8]], [0], 1), 0.5)
+
+    results = []
+    algo.ocr_img(img, box).addCallback(results.append)
+    ((word,),) = results[0]
+    assert word.word == "OK"
+    assert list(word.bbox) == [11, 22, 15, 24]
+    assert algo.cache.hits == 1
+
+    # cached entry must not be modified by the coordinate transformation
+    results = []
+    algo.ocr_img(img, box).addCallback(results.append)
+    assert list(results[0][0][0].bbox) == [11, 22, 15, 24]
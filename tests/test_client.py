@@ -0,0 +1,177 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import warnings
+
+import pytest
+from PIL import Image
+from twisted.internet.defer import succeed
+from twisted.internet.task import Clock
+
+from vncautomate import client as client_module
+from vncautomate.client import State, VNCAutomateClient, _ChangeWaiter
+from vncautomate.fingerprint import ScreenFingerprint
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(client_module, "reactor", clock)
+    return clock
+
+
+class FakeClient(object):
+    def __init__(self):
+        self._change_callbacks = []
+        self.requests = 0
+
+    def framebufferUpdateRequest(self, incremental=0):
+        self.requests += 1
+
+
+@pytest.fixture
+def vnc(clock):
+    vnc = VNCAutomateClient()
+    vnc.screen = Image.new("RGB", (1024, 768), "white")
+    vnc.refreshes = 0
+    vnc.searches = 0
+
+    def refresh_screen(incremental=0):
+        vnc.refreshes += 1
+        return succeed(vnc)
+
+    def search(texts, region=None):
+        vnc.searches += 1
+        return succeed(None)
+
+    vnc.refreshScreen = refresh_screen
+    vnc._search = search
+    vnc.framebufferUpdateRequest = lambda incremental=0: None
+    return vnc
+
+
+def test_backoff():
+    state = State()
+    assert [state.backoff(False, 0.2, 2.0) for _ in range(6)] == [0.2, 0.4, 0.8, 1.6, 2.0, 2.0]
+    assert state.backoff(True, 0.2, 2.0) == 0.2
+    assert state.backoff(False, 0.2, 2.0) == 0.4
+
+
+def test_stable_small_change():
+    img = Image.new("RGB", (1024, 768), "white")
+    state = State(lambda a, b: a.similar(b, 0.001), lambda a, b: a.similar(b, 0.0))
+    assert not state.stable(ScreenFingerprint(img))
+    assert state.stable(ScreenFingerprint(img))
+
+    # a small text within the tolerance is a new screen once it settled
+    img.paste((0, 0, 0), (505, 290, 520, 300))
+    assert state.stable(ScreenFingerprint(img))
+    assert state.analyzed(ScreenFingerprint(img))
+    assert not state.stable(ScreenFingerprint(img))
+    assert not state.stable(ScreenFingerprint(img))
+
+
+def test_change_waiter_timeout(clock):
+    client = FakeClient()
+    results = []
+    _ChangeWaiter(client, 2.0, 0.2).deferred.addCallback(results.append)
+    clock.advance(1.9)
+    assert not results
+    clock.advance(0.1)
+    assert results == [False]
+    assert client._change_callbacks == []
+
+
+def test_change_waiter_settles(clock):
+    client = FakeClient()
+    results = []
+    _ChangeWaiter(client, 2.0, 0.2).deferred.addCallback(results.append)
+    clock.advance(0.5)
+    for _ in range(3):
+        client._change_callbacks[0]()
+        clock.advance(0.1)
+    assert not results
+    clock.advance(0.1)
+    assert results == [True]
+    assert client.requests == 4
+
+
+def test_change_waiter_deadline(clock):
+    client = FakeClient()
+    results = []
+    _ChangeWaiter(client, 1.0, 0.5).deferred.addCallback(results.append)
+    clock.advance(0.9)
+    client._change_callbacks[0]()
+    clock.advance(0.1)
+    assert results == [True]
+
+
+def test_change_waiter_cancel(clock):
+    client = FakeClient()
+    deferred = _ChangeWaiter(client, 1.0, 0.2).deferred
+    deferred.addErrback(lambda failure: None)
+    deferred.cancel()
+    assert client._change_callbacks == []
+    assert not clock.getDelayedCalls()
+
+
+def test_unchanged_screen_backs_off(vnc, clock):
+    vnc.waitForText("Nothing", timeout=6)
+    clock.pump([0.1] * 70)
+
+    # refreshes back off to poll_max_interval while the screen does not change
+    assert vnc.searches == 1
+    assert vnc.refreshes <= 8
+
+
+def test_period(vnc, clock):
+    # the class attribute still bounds the back off unless poll_max_interval is set
+    vnc.PERIOD = 0.4
+    vnc.waitForText("Nothing", timeout=6)
+    clock.pump([0.1] * 70)
+    assert vnc.searches == 1
+    assert vnc.refreshes >= 14
+
+
+def test_poll_max_interval(vnc, clock):
+    vnc.PERIOD = 0.4
+    vnc.updateOCRConfig(poll_max_interval=3.0)
+    vnc.waitForText("Nothing", timeout=6)
+    clock.pump([0.1] * 70)
+    assert vnc.refreshes <= 8
+
+
+def test_updated_rectangles():
+    vnc = VNCAutomateClient()
+    vnc.updateOCRConfig(analysis_workers=0)
+    vnc.screen = Image.new("RGB", (100, 100), "white")
+    vnc.commitUpdate([])
+    assert vnc.dirty is None
+    results = []
+    vnc._changed_screen().addCallback(results.append)
+    assert results.pop()[1] is None
+
+    # the updated rectangles are narrowed to the changed pixels when analyzing the screen
+    vnc.screen.paste((0, 0, 0), (20, 30, 25, 32))
+    vnc.commitUpdate([(0, 0, 50, 50), (60, 60, 10, 10)])
+    assert vnc.dirty == [(0, 0, 50, 50), (60, 60, 70, 70)]
+    results = []
+    vnc._changed_screen().addCallback(results.append)
+    screen, dirty = results[0]
+    assert dirty == [(20, 30, 25, 32)]
+    assert screen is not vnc.screen
+    assert vnc.dirty == []
+
+    # a resized screen is analyzed as a whole
+    vnc.screen = Image.new("RGB", (200, 100), "white")
+    vnc.commitUpdate([(0, 0, 200, 100)])
+    assert vnc.dirty is None
+    vnc._changed_screen().addCallback(results.append)
+    assert results[1][1] is None
+
+
+def test_no_changing_hooks():
+    # vncdotool warns about overriding the drawing of rectangles
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        type("Client", (VNCAutomateClient,), {})
@@ -0,0 +1,109 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from vncautomate.config import OCRConfig
+from vncautomate.coverage import plan_coverage
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.preprocess import PreparedScreen
+from vncautomate.words import WordTable
+
+from .helpers import HOCR, StaticBackend
+
+BOXES = [(20, 30, 120, 60), (40, 35, 100, 55), (300, 200, 340, 220)]
+
+
+def lines(*words):
+    return WordTable([text for text, _bbox in words], [bbox for _text, bbox in words], range(len(words)), len(words)).lines()
+
+
+def texts(words):
+    return [word.word for line in words for word in line]
+
+
+def test_plan_all():
+    plan = plan_coverage([None], BOXES, (400, 300))
+    assert plan.areas == [None] + BOXES
+    assert plan.sources == [1, 2, 3]
+    assert plan.masks == {}
+    assert plan.pixels == 400 * 300 + 3000 + 1200 + 800
+
+    all_words = [lines(("Screen", [0, 0, 10, 10]))] + [lines(("Box%d" % ibox, list(box))) for ibox, box in enumerate(BOXES)]
+    assert plan.assign(all_words) == all_words
+
+
+def test_plan_dedup():
+    regions = [(0, 0, 200, 100), (250, 150, 400, 300)]
+    plan = plan_coverage(regions, BOXES, (400, 300), dedup=True)
+    assert plan.areas == regions + [(20, 30, 120, 60), (300, 200, 340, 220)]
+    assert plan.sources == [2, 2, 3]
+    assert plan.masks == {regions[0]: [(20, 30, 120, 60)], regions[1]: [(300, 200, 340, 220)]}
+    assert plan.pixels == 200 * 100 + 150 * 150
+
+    all_words = [
+        lines(("Top", [0, 0, 10, 10])),
+        lines(("Bottom", [260, 160, 280, 170])),
+        lines(("Install", [25, 32, 35, 38]), ("Next", [50, 40, 90, 50])),
+        lines(("OK", [310, 205, 330, 215])),
+    ]
+    assigned = plan.assign(all_words)
+    assert [texts(words) for words in assigned] == [
+        ["Top", "Install", "Next"],
+        ["Bottom", "OK"],
+        ["Install", "Next"],
+        ["Next"],
+        ["OK"],
+    ]
+    # the words of the merged box are not copied for the box itself
+    assert assigned[2] is all_words[2]
+
+
+def test_masked_crop():
+    img = Image.new("L", (100, 50), 0)
+    prepared = PreparedScreen(img, 2.0, masks={None: [(10, 10, 20, 15)], (0, 0, 50, 50): [(40, 0, 60, 50)]})
+    screen, _origin = prepared.crop(None)
+    pixels = np.asarray(screen)
+    assert (pixels[20:30, 20:40] == 255).all()
+    assert (pixels == 255).sum() == 200
+    # the shared resized screen is not modified
+    assert not np.asarray(prepared.resized((0, 0, 100, 50))).any()
+
+    # masks are clipped to the area
+    left, origin = prepared.crop((0, 0, 50, 50))
+    assert origin == (0, 0)
+    assert (np.asarray(left)[:, 80:] == 255).all()
+    assert not np.asarray(left)[:, :80].any()
+
+
+def test_dedup_snapshot():
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0, ocr_cache_size=0, location_margin=0, ocr_coverage="dedup"))
+    algo.backend = StaticBackend(HOCR)
+    algo.boxes_from_image = lambda img, region=None: BOXES[:2]
+    results = []
+    algo.snapshot(Image.new("L", (400, 300), 255)).addCallback(results.append)
+
+    (snapshot,) = results
+    # the nested box is recognized with the box containing it
+    assert [img.size for img in algo.backend.images] == [(800, 600), (200, 60)]
+    assert snapshot.boxes == BOXES[:2]
+    assert [texts(words) for words in snapshot.areas] == [["Screen", "OK", "Screen", "OK"], ["Screen", "OK"], ["Screen"]]
+    assert [word.bbox.tolist() for line in snapshot.words for word in line][::2] == [[15, 15, 30, 20], [35, 45, 50, 50]]
+    assert (algo.coverage.frames, algo.coverage.pixels, algo.coverage.frame_pixels) == (1, 400 * 300, 400 * 300)
+
+    algo.config.ocr_coverage = "unknown"
+    failures = []
+    algo.snapshot(Image.new("L", (400, 300), 255)).addErrback(failures.append)
+    (failure,) = failures
+    assert failure.check(ValueError)
+
+
+def test_coverage_all():
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0, ocr_cache_size=0))
+    algo.backend = StaticBackend(HOCR)
+    algo.boxes_from_image = lambda img, region=None: BOXES[:2]
+    algo.snapshot(Image.new("L", (400, 300), 255))
+    assert len(algo.backend.images) == 3
+    assert algo.coverage.ratio == pytest.approx(1 + (3000 + 1200) / 120000.0)
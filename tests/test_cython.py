@@ -44,9 +44,33 @@ class TestCython(unittest.TestCase):
         self.assertTrue((labels_old == labels_new).all())
         self.assertEqual(len(lines_old), len(lines_new))
         for i, (iline, jline) in enumerate(zip(lines_old, lines_new)):
-            equal = (jline == jline).all()
+            equal = np.allclose(iline, jline, atol=1e-3)
             self.assertTrue(equal, "[%s]: %s != %s" % (i, iline, jline))
 
+    def test_runs_xgrad(self):
+        self._compare_runs("xgrad.png")
+
+    def test_runs_ygrad(self):
+        self._compare_runs("ygrad.png")
+
+    def _compare_runs(self, img_name):
+        img_path = join(dirname(__file__), img_name)
+        with Image.open(img_path) as img:
+            img = img.convert("L")
+
+        mat_shape = tuple(reversed(img.size))
+        mat = np_from_img(img)
+
+        labels_flood = -np.ones(mat_shape, dtype="int64")
+        lines_flood = segment_line.find_lines(mat, labels_flood, OCRConfig())
+
+        labels_runs = -np.ones(mat_shape, dtype="int64")
+        lines_runs = segment_line.find_line_runs(mat, labels_runs, OCRConfig())
+
+        self.assertTrue((labels_flood == labels_runs).all())
+        self.assertEqual(lines_flood.shape, lines_runs.shape)
+        self.assertTrue(np.allclose(lines_flood, lines_runs, atol=1e-3))
+
 
 if __name__ == "__main__":
     unittest.main()
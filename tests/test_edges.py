@@ -0,0 +1,58 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+from os.path import dirname, join
+
+import numpy as np
+import pytest
+from PIL import Image
+from scipy.signal import sepfir2d
+
+from vncautomate.edges import SMOOTHING, EdgeDetector
+
+
+def sepfir_edges(mat):
+    """The edge detection with scipy.signal.sepfir2d replaced by `EdgeDetector`."""
+    mat = np.asarray(mat, dtype=np.float32)
+    gradient_kernel = np.array((0, 1, 0, -1, 0), dtype="float32")
+    smoothing_kernel = np.ones(SMOOTHING, dtype="float32")
+
+    vertical_edges = sepfir2d(mat, gradient_kernel, smoothing_kernel) / SMOOTHING
+    vertical_edges_positive = vertical_edges * (vertical_edges > 0)
+    vertical_edges_negative = vertical_edges * (vertical_edges < 0)
+    vertical_edges = (np.roll(vertical_edges_positive, -1, axis=1) - np.roll(vertical_edges_negative, 1, axis=1)) / 2
+
+    horizontal_edges = sepfir2d(mat, smoothing_kernel, gradient_kernel) / SMOOTHING
+    horizontal_edges_positive = horizontal_edges * (horizontal_edges > 0)
+    horizontal_edges_negative = horizontal_edges * (horizontal_edges < 0)
+    horizontal_edges = (np.roll(horizontal_edges_positive, -1, axis=0) - np.roll(horizontal_edges_negative, 1, axis=0)) / 2
+
+    return horizontal_edges, vertical_edges
+
+
+@pytest.fixture
+def mat():
+    with Image.open(join(dirname(__file__), "login.png")) as img:
+        return np.asarray(img.convert("L"))
+
+
+def test_compare(mat):
+    expected = sepfir_edges(mat)
+    edges = EdgeDetector().detect(mat)
+    for old, new in zip(expected, edges):
+        assert new.shape == old.shape
+        assert new.dtype == np.float32
+        assert np.allclose(new, old, atol=1e-3)
+
+
+def test_reuse(mat):
+    detector = EdgeDetector()
+    horizontal, vertical = detector.detect(mat)
+    assert detector.detect(mat)[1] is vertical
+    assert detector.detect(mat[:100, :100])[1] is not vertical
+
+
+def test_small():
+    horizontal, vertical = EdgeDetector().detect(np.zeros((2, 10), dtype=np.uint8))
+    assert horizontal.shape == vertical.shape == (2, 10)
+    assert not vertical.any()
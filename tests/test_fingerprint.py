@@ -0,0 +1,45 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import pytest
+from PIL import Image
+
+from vncautomate.client import State
+from vncautomate.fingerprint import ScreenFingerprint
+
+
+@pytest.fixture
+def img():
+    return Image.new("RGB", (640, 480), "white")
+
+
+def test_cursor_tolerated(img):
+    a = ScreenFingerprint(img)
+    img.paste((0, 0, 0), (100, 98, 102, 110))
+    b = ScreenFingerprint(img)
+    assert not b.similar(a)
+    assert b.similar(a, tolerance=0.001)
+    assert b.changes(a) == [(96, 96, 112, 112)]
+
+
+def test_ignore(img):
+    a = ScreenFingerprint(img)
+    img.paste((0, 0, 0), (600, 464, 640, 480))
+    b = ScreenFingerprint(img)
+    assert b.change_ratio(a) == pytest.approx(3 / 1200.0)
+    assert b.similar(a, ignore=[(580, 450, 640, 480)])
+    assert b.changes(a, ignore=[(580, 450, 640, 480)]) == []
+
+
+def test_resized(img):
+    a = ScreenFingerprint(img)
+    b = ScreenFingerprint(img.resize((800, 600)))
+    assert b.change_ratio(a) == 1.0
+
+
+def test_state(img):
+    state = State(lambda a, b: a.similar(b, 0.001), lambda a, b: a.similar(b))
+    assert not state.stable(ScreenFingerprint(img))
+    img.paste((0, 0, 0), (100, 100, 101, 101))
+    assert state.stable(ScreenFingerprint(img))
+    assert not state.stable(ScreenFingerprint(img))
@@ -0,0 +1,47 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import difflib
+import random
+
+import pytest
+
+from vncautomate import match
+from vncautomate.match import WordMatcher
+from vncautomate.similarity import ratio  # type: ignore
+
+
+def sequence_ratio(a, b):
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+@pytest.mark.parametrize("alphabet", ["ab", "abcdefghij", "aäßéü€😀 "])
+def test_ratio(alphabet):
+    rng = random.Random(0)
+    for _ in range(5000):
+        a = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        b = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert ratio(a, b) == sequence_ratio(a, b), (a, b)
+
+
+@pytest.mark.parametrize(
+    "a,b",
+    [
+        ("", ""),
+        ("", "next"),
+        ("nex", "next"),
+        ("abxcd", "abcd"),
+        ("qabxcd", "abycdf"),
+        # difflib treats popular characters of long second sequences as junk
+        ("a" * 150 + "b" * 100, "ab" * 120),
+    ],
+)
+def test_ratio_cases(a, b):
+    assert ratio(a, b) == sequence_ratio(a, b)
+
+
+def test_fallback(monkeypatch):
+    words = ["next", "nxet", "Weiter", "", "festplatte"]
+    expected = [WordMatcher("Festplatte").ratio(0, word) for word in words]
+    monkeypatch.setattr(match, "fast_ratio", None)
+    assert [WordMatcher("Festplatte").ratio(0, word) for word in words] == expected
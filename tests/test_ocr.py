@@ -11,8 +11,8 @@ from vncautomate.ocr import OCRAlgorithm
 
 
 class TestOcr(unittest.TestCase):
-    def _ocr(self, image, text, where):
-        config = OCRConfig()
+    def _ocr(self, image, text, where, **kwargs):
+        config = OCRConfig(**kwargs)
         algo = OCRAlgorithm(config)
         img = Image.open(join(dirname(__file__), image))
         deferred = algo.find_text_in_image(img, text)
@@ -28,6 +28,9 @@ class TestOcr(unittest.TestCase):
     def test_login(self):
         return self._ocr("login.png", "LOGIN", (278, 337))
 
+    def test_login_batch(self):
+        return self._ocr("login.png", "LOGIN", (278, 337), ocr_mode="batch")
+
 
 if __name__ == "__main__":
     unittest.main()
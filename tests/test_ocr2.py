@@ -1,9 +1,17 @@
 # coding: utf-8
 from __future__ import absolute_import
 
+import random
+from operator import itemgetter
+
+import numpy as np
 import pytest
+from PIL import Image
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
 
-from vncautomate.ocr import OCRAlgorithm, _OCRWord
+from .helpers import HOCR, ManualBackend, StaticBackend, word_lines
 
 
 @pytest.fixture
@@ -22,6 +30,167 @@ def algo():
     ],
 )
 def test_find_best_matching_words(algo, all_words, pattern, score, match):
-    _all_words = [[_OCRWord(word, None) for word in line.split()] for line in all_words]
+    _all_words = word_lines([line.split() for line in all_words])
     _score, _match = algo.find_best_matching_words(_all_words, pattern)
     assert (_score, " ".join(word.word for word in _match or [])) == (pytest.approx(score), match)
+
+
+def test_ocr_batch():
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0, ocr_cache_size=0))
+    algo.backend = StaticBackend(HOCR)
+    results = []
+    algo.ocr_batch(Image.new("L", (50, 50), 255), [None, (10, 10, 30, 20)]).addCallback(results.append)
+
+    assert [img.size for img in algo.backend.images] == [(140, 180)]
+    (((screen,),), ((ok,),)) = results[0]
+    assert (screen.word, list(screen.bbox)) == ("Screen", [5, 5, 20, 10])
+    assert (ok.word, list(ok.bbox)) == ("OK", [12, 12, 22, 18])
+
+
+def test_dirty_regions(algo):
+    boxes = [(30, 0, 60, 20), (100, 100, 150, 120)]
+    assert algo.dirty_regions([], boxes, (200, 200)) == []
+    assert algo.dirty_regions([(2, 10, 4, 12)], boxes, (200, 200)) == [(0, 0, 20, 28)]
+    assert algo.dirty_regions([(20, 10, 22, 12)], boxes, (200, 200)) == [(4, 0, 60, 28)]
+    assert sorted(algo.dirty_regions([(20, 10, 22, 12), (190, 190, 200, 200)], boxes, (200, 200))) == [(4, 0, 60, 28), (174, 174, 200, 200)]
+
+
+def test_incremental(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0, location_margin=0)
+    algo.backend = StaticBackend(HOCR)
+    img = Image.new("L", (200, 200), 255)
+    results = []
+
+    algo.find_text_in_image(img, "Screen").addCallback(results.append)
+    assert [img.size for img in algo.backend.images] == [(400, 400)]
+
+    algo.find_text_in_image(img, "Screen", dirty=[]).addCallback(results.append)
+    assert len(algo.backend.images) == 1
+
+    algo.find_text_in_image(img, "Screen", dirty=[(10, 10, 20, 20)]).addCallback(results.append)
+    assert algo.backend.images[-1].size == (72, 72)
+
+    assert results == [(22, 17)] * 3
+
+
+def test_incremental_keeps_boxes(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0, location_margin=0)
+    algo.backend = StaticBackend(HOCR)
+    boxes = [(10, 10, 30, 20), (120, 120, 180, 150)]
+    algo.boxes_from_image = lambda img, region=None: [] if region else list(boxes)
+    img = Image.new("L", (200, 200), 255)
+    results = []
+
+    algo.snapshot(img).addCallback(results.append)
+    assert len(algo.backend.images) == 3
+
+    # boxes outside of the changed area keep their words without OCR
+    algo.snapshot(img, dirty=[(150, 20, 160, 30)]).addCallback(results.append)
+    assert [img.size for img in algo.backend.images[3:]] == [(84, 84)]
+    assert results[1].boxes == boxes
+    assert results[1].areas[1:] == results[0].areas[1:]
+
+
+def scan_line(line, pattern):
+    """The scoring of all windows of the line replaced by `WordMatcher`."""
+    for iword, _ in enumerate(line):
+        words = line[iword : iword + len(pattern)]
+        scores = np.array([word.fuzzy_match(pat) for word, pat in zip(words, pattern)])
+        scores.resize(len(pattern), refcheck=False)
+        penalty = (1.0 * len(pattern)) / len(line)
+        yield (scores.mean() * (0.9 + penalty * 0.1), words)
+
+
+def test_word_matcher(algo):
+    rng = random.Random(0)
+    vocabulary = ["Next", "Weiter", "OK", "Cancel", "Abbrechen", "Username", "Password", "LOGIN", "Install", "disk"]
+    all_words = word_lines([[rng.choice(vocabulary)[: rng.randint(1, 8)] for _ in range(rng.randint(1, 12))] for _ in range(30)])
+    for pattern in ["next", "Cancel", "user name", "install disk now", "xyz"]:
+        expected = max(
+            (m for line in all_words for m in scan_line(line, pattern.lower().split())),
+            key=itemgetter(0),
+        )
+        assert algo.find_best_matching_words(all_words, pattern) == expected
+
+
+def test_snapshot(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0)
+    algo.backend = StaticBackend(HOCR)
+    results = []
+    algo.snapshot(Image.new("L", (200, 200), 255)).addCallback(results.append)
+    (snapshot,) = results
+
+    assert snapshot.find("Screen") == (22, 17)
+    assert snapshot.find_any("Nothing", "OK") == ("OK", (17, 75))
+    assert snapshot.find("Nothing") is None
+    assert len(algo.backend.images) == 1
+
+
+def test_search_by_priority(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0, ocr_schedule="priority", confident_score=0.9)
+    algo.backend = ManualBackend(1)
+    algo.boxes_from_image = lambda img, region=None: [(10, 10, 30, 20)]
+    results = []
+    algo.search(Image.new("L", (200, 200), 255), "Nothing", "OK").addCallback(results.append)
+
+    # the box is recognized first while the whole screen waits
+    assert [img.size for img in algo.backend.images] == [(40, 20)]
+    assert algo.backend.queued == 1
+
+    algo.backend.running.pop().callback(HOCR)
+    assert results == [("OK", (27, 85))]
+    assert algo.backend.queued == 0
+    assert not algo.backend.running
+
+
+def test_location_memory(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0, confident_score=0.9)
+    algo.backend = StaticBackend(HOCR)
+    img = Image.new("L", (200, 200), 255)
+    results = []
+
+    algo.find_text_in_image(img, "Screen").addCallback(results.append)
+    assert [img.size for img in algo.backend.images] == [(400, 400)]
+    assert algo.locations.regions(["Screen"]) == [(0, 0, 46, 36)]
+
+    # only the remembered area is recognized again
+    algo.find_text_in_image(img, "Screen", dirty=[(100, 100, 120, 120)]).addCallback(results.append)
+    assert algo.backend.images[-1].size == (92, 72)
+    assert (algo.locations.hits, algo.locations.misses) == (1, 0)
+
+    # fall back to the whole screen
+    algo.backend.hocr = HOCR.replace(b"Screen", b"Other")
+    algo.find_text_in_image(img, "Screen").addCallback(results.append)
+    assert [img.size for img in algo.backend.images[-2:]] == [(92, 72), (400, 400)]
+    assert (algo.locations.hits, algo.locations.misses) == (1, 1)
+
+    # explicit region
+    algo.find_text_in_image(img, "Other", region=(100, 100, 150, 150)).addCallback(results.append)
+    assert algo.backend.images[-1].size == (100, 100)
+
+    assert results == [(22, 17), (22, 17), None, (122, 117)]
+    # the searched region is no box enclosing the text
+    assert algo.locations.regions(["Other"]) == [(99, 99, 146, 136)]
+
+
+def test_min_score(algo):
+    algo.config.update(img_resize=2.0, ocr_cache_size=0, location_margin=0)
+    algo.backend = StaticBackend(HOCR)
+    img = Image.new("L", (200, 200), 255)
+    snapshots = []
+    algo.snapshot(img).addCallback(snapshots.append)
+    score, _words = snapshots[0].match("Screen")
+
+    # a match must score above the minimum in all kinds of searches
+    algo.config.update(min_str_match_score=score)
+    results = []
+    algo.find_text_in_image(img, "Screen").addCallback(results.append)
+    algo.find_text_in_image(img, "Screen", region=(0, 0, 100, 100)).addCallback(results.append)
+    algo.config.update(ocr_schedule="priority", confident_score=score)
+    algo.find_text_in_image(img, "Screen", dirty=None).addCallback(results.append)
+    assert results == [None, None, None]
+
+    algo.config.update(min_str_match_score=score - 0.01, confident_score=score - 0.01)
+    algo.find_text_in_image(img, "Screen", dirty=None).addCallback(results.append)
+    algo.find_text_in_image(img, "Screen", region=(0, 0, 100, 100)).addCallback(results.append)
+    assert results[3:] == [(22, 17), (22, 17)]
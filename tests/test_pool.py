@@ -0,0 +1,116 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import threading
+from os.path import dirname, join
+
+from PIL import Image
+from twisted.internet import reactor
+from twisted.internet.defer import CancelledError, gatherResults
+from twisted.internet.task import deferLater
+from twisted.trial import unittest
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+
+from .helpers import HOCR, StaticBackend
+
+
+class TestAnalysisPool(unittest.TestCase):
+    def setUp(self):
+        self.algo = OCRAlgorithm(OCRConfig(ocr_cache_size=0, location_margin=0))
+        self.algo.backend = StaticBackend(HOCR)
+        self.addCleanup(self.algo.close)
+        self.threads = []
+        self.release = threading.Event()
+        detect = self.algo._detect
+
+        def _detect(*args):
+            self.threads.append(threading.current_thread())
+            self.release.wait(5)
+            return detect(*args)
+
+        self.algo._detect = _detect
+
+    def _search(self):
+        return self.algo.find_text_in_image(Image.new("L", (200, 200), 255), "Screen")
+
+    def test_search(self):
+        def _start():
+            deferred = self._search()
+            # the reactor keeps running while the screen is analyzed
+            self.assertFalse(deferred.called)
+            reactor.callLater(0, self.release.set)
+            return deferred
+
+        def _found(where):
+            self.assertEqual(where, (22, 17))
+            self.assertEqual(len(self.threads), 1)
+            self.assertIn("vncautomate-analysis", self.threads[0].name)
+            self.assertTrue(self.threads[0].daemon)
+
+        return deferLater(reactor, 0, _start).addCallback(_found)
+
+    def test_cache_key(self):
+        # the images recognized are hashed in the pool as well
+        self.release.set()
+        key = self.algo.cache.key
+        hashed = []
+
+        def _key(*args):
+            hashed.append(threading.current_thread())
+            return key(*args)
+
+        self.algo.cache.key = _key
+
+        def _found(where):
+            self.assertEqual(where, (22, 17))
+            self.assertTrue(hashed)
+            self.assertTrue(all("vncautomate-analysis" in thread.name for thread in hashed))
+
+        return deferLater(reactor, 0, self._search).addCallback(_found)
+
+    def test_search_by_priority(self):
+        self.algo.config.update(ocr_schedule="priority")
+        self.release.set()
+        return deferLater(reactor, 0, self._search).addCallback(self.assertEqual, (22, 17))
+
+    def test_cancel(self):
+        def _start():
+            deferred = self._search()
+            deferred.cancel()
+            self.release.set()
+            return self.assertFailure(deferred, CancelledError)
+
+        def _cancelled(_):
+            self.assertEqual(self.algo.backend.images, [])
+
+        return deferLater(reactor, 0, _start).addCallback(_cancelled)
+
+    def test_without_reactor(self):
+        # results of the pool could not be delivered
+        self.release.set()
+        self.assertEqual(self.successResultOf(self._search()), (22, 17))
+        self.assertEqual(self.threads, [threading.current_thread()])
+        self.assertIsNone(self.algo._pool)
+
+    def test_without_workers(self):
+        self.algo.config.update(analysis_workers=0)
+        self.release.set()
+
+        def _start():
+            self.assertEqual(self.successResultOf(self._search()), (22, 17))
+            self.assertEqual(self.threads, [threading.current_thread()])
+            self.assertIsNone(self.algo._pool)
+
+        return deferLater(reactor, 0, _start)
+
+    def test_parallel_boxes(self):
+        with Image.open(join(dirname(__file__), "login.png")) as img:
+            img = img.convert("L")
+        expected = self.algo.boxes_from_image(img)
+
+        def _start():
+            return gatherResults([self.algo._in_pool(self.algo.boxes_from_image, img.copy()) for _ in range(4)])
+
+        return deferLater(reactor, 0, _start).addCallback(self.assertEqual, [expected] * 4)
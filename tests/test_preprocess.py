@@ -0,0 +1,145 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+from os.path import dirname, join
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.preprocess import PreparedScreen, estimate_text_height
+
+from .helpers import HOCR, StaticBackend
+
+
+@pytest.fixture
+def screen():
+    with Image.open(join(dirname(__file__), "login.png")) as img:
+        return img.convert("L")
+
+
+def test_resize_once(screen, monkeypatch):
+    prepared = PreparedScreen(screen, 2.0)
+    img, origin = prepared.crop(None)
+    # same as resizing the screen with the default filter of Pillow
+    assert img.tobytes() == screen.resize((screen.width * 2, screen.height * 2)).tobytes()
+    assert origin == (0, 0)
+
+    monkeypatch.setattr(Image.Image, "resize", None)
+    img, origin = prepared.crop((100, 50, 200, 80))
+    assert (img.size, origin) == ((200, 60), (200, 100))
+    assert np.array_equal(np.asarray(img), np.asarray(prepared.resized((0, 0) + screen.size))[100:160, 200:400])
+
+
+def test_regions(screen):
+    prepared = PreparedScreen(screen, 2.0, regions=[(100, 50, 300, 150), (0, 200, 50, 250)])
+    img, origin = prepared.crop((100, 50, 200, 80))
+    assert (img.size, origin) == ((200, 60), (200, 100))
+    assert prepared.crop((10, 210, 20, 220))[1] == (20, 420)
+    assert sorted(prepared._resized) == [((0, 200, 50, 250), 2.0), ((100, 50, 300, 150), 2.0)]
+    assert prepared.resized((100, 50, 300, 150)).size == (400, 200)
+
+    # areas outside of the regions are resized on their own
+    img, origin = prepared.crop((250, 100, 320, 200))
+    assert (img.size, origin) == ((140, 200), (500, 200))
+    assert len(prepared._resized) == 3
+
+
+def test_threshold(screen):
+    prepared = PreparedScreen(screen, 1.5, "lanczos", threshold=128)
+    img, _origin = prepared.crop(None)
+    assert img.size == (int(round(screen.width * 1.5)), int(round(screen.height * 1.5)))
+    assert sorted(np.unique(np.asarray(img))) == [0, 255]
+
+    with pytest.raises(ValueError):
+        PreparedScreen(screen, 2.0, "unknown")
+
+
+def test_snapshot(screen):
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0, ocr_cache_size=0, location_margin=0, ocr_resample="nearest"))
+    algo.backend = StaticBackend(HOCR)
+    algo.boxes_from_image = lambda img, region=None: [(20, 30, 120, 60), (40.0, 200.5, 300.0, 240.0)]
+    results = []
+    algo.snapshot(ImageOps.invert(screen)).addCallback(results.append)
+
+    # the dark screen is inverted and the boxes are cropped from the same resized screen
+    (snapshot,) = results
+    resized = algo.backend.images[0]
+    assert resized.tobytes() == screen.resize((screen.width * 2, screen.height * 2), Image.NEAREST).tobytes()
+    assert len(algo.backend.images) == 3
+    for box, img in zip(snapshot.boxes, algo.backend.images[1:]):
+        assert img.tobytes() == resized.crop(tuple(int(round(value * 2)) for value in box)).tobytes()
+    assert snapshot.find("Screen") == (22, 17)
+    assert snapshot.areas[1][0][0].bbox.tolist() == [35, 45, 50, 50]
+
+
+def button(size, label="Cancel"):
+    font = ImageFont.load_default(size=size)
+    img = Image.new("L", (8 * size, 3 * size), 236)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, img.width - 1, img.height - 1), fill=255, outline=64)
+    draw.text((size // 2, size), label, fill=0, font=font)
+    return img, draw.textbbox((size // 2, size), label, font=font)
+
+
+@pytest.mark.parametrize("size", [10, 16, 24, 48])
+def test_estimate_text_height(size):
+    img, bbox = button(size)
+    assert estimate_text_height(img) == bbox[3] - bbox[1]
+
+
+def test_estimate_without_text():
+    img, _bbox = button(16, "")
+    assert estimate_text_height(img) is None
+    assert estimate_text_height(Image.new("L", (0, 0))) is None
+
+
+def test_adaptive_resize():
+    algo = OCRAlgorithm(OCRConfig(img_resize=3.0, ocr_cache_size=0, ocr_text_height=24))
+    screen = Image.new("L", (600, 400), 236)
+    small, _bbox = button(10)
+    large, _bbox = button(32)
+    screen.paste(small, (10, 10))
+    screen.paste(large, (10, 100))
+    small_box = (10, 10, 10 + small.width, 10 + small.height)
+    large_box = (10, 100, 10 + large.width, 100 + large.height)
+    assert algo.resize_factor(screen, None) == 3.0
+    assert algo.resize_factor(screen, small_box) == 3.0
+    assert algo.resize_factor(screen, large_box) == 1.0
+    assert algo.resize_factor(screen, (300, 300, 400, 350)) == 3.0
+
+    algo.config.update(ocr_text_height=0)
+    assert algo.resize_factor(screen, large_box) == 3.0
+
+
+def test_adaptive_ocr():
+    algo = OCRAlgorithm(OCRConfig(img_resize=2.0, ocr_cache_size=0, ocr_text_height=12, analysis_workers=0))
+    algo.backend = StaticBackend(HOCR)
+    large, _bbox = button(18)
+    screen = Image.new("L", (400, 300), 236)
+    screen.paste(large, (40, 50))
+    box = (40, 50, 40 + large.width, 50 + large.height)
+    assert algo.resize_factor(screen, box) == 1.0
+
+    results = []
+    algo.ocr_img(screen, None).addCallback(results.append)
+    algo.ocr_img(screen, box).addCallback(results.append)
+    assert [img.size for img in algo.backend.images] == [(800, 600), large.size]
+    assert algo.backend.images[1].tobytes() == large.tobytes()
+
+    # words of the screen are scaled back by img_resize, those of the box by its own factor
+    (((screen_word, _ok),), ((box_word, _ok),)) = results
+    assert screen_word.bbox.tolist() == [15, 15, 30, 20]
+    assert box_word.bbox.tolist() == [70, 80, 100, 90]
+
+    # the box is stacked below the screen with a gap of 20 pixels
+    algo.config.update(ocr_mode="batch")
+    algo.backend = StaticBackend(HOCR.replace(b"bbox 24 144 44 156", b"bbox 30 650 60 660"))
+    results = []
+    algo.ocr_batch(screen, [None, box]).addCallback(results.append)
+    assert algo.backend.images[0].size == (800 + 40, 600 + large.height + 60)
+    ((((screen_word,),), ((box_word,),)),) = results
+    assert screen_word.bbox.tolist() == [5, 5, 20, 10]
+    assert box_word.bbox.tolist() == [50, 60, 80, 70]
@@ -0,0 +1,137 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+from PIL import Image
+from twisted.internet import defer, reactor
+from twisted.internet.defer import CancelledError
+from twisted.internet.error import ConnectionRefusedError
+from twisted.trial import unittest
+
+from vncautomate.backend import FairOCRPool, OCRQueueFull
+from vncautomate.config import OCRConfig
+from vncautomate.sessions import SessionManager
+
+from .helpers import HOCR, FakeVNCFactory, ManualBackend, StaticBackend
+
+
+def request(session, width):
+    results = []
+    session.recognize(Image.new("L", (width, 1)), "eng").addBoth(results.append)
+    return results
+
+
+def served(backend):
+    return [img.width for img in backend.images]
+
+
+def test_round_robin():
+    backend = ManualBackend(1)
+    pool = FairOCRPool(backend)
+    a, b = pool.join("a"), pool.join("b")
+    for width in (1, 2, 3, 4):
+        request(a, width)
+    request(b, 11)
+    request(b, 12)
+    assert (a.queued, b.queued, pool.running) == (3, 2, 1)
+
+    while backend.running:
+        backend.running.pop(0).callback(b"")
+    # the sessions take turns instead of running the requests in order
+    assert served(backend) == [1, 2, 11, 3, 12, 4]
+    assert (a.served, b.served, pool.running) == (4, 2, 0)
+
+
+def test_cancel():
+    backend = ManualBackend(1)
+    pool = FairOCRPool(backend)
+    a, b = pool.join("a"), pool.join("b")
+    running = request(a, 1)
+    queued = request(a, 2)
+    other = request(b, 11)
+
+    # cancelling a queued request drops it, cancelling a running one stops it
+    a.requests[0].deferred.cancel()
+    assert queued[0].check(CancelledError)
+    assert served(backend) == [1]
+    backend.running[0].cancel()
+    assert running[0].check(CancelledError)
+    assert served(backend) == [1, 11]
+
+    # leaving the pool cancels the queued requests, running ones finish
+    finished = request(a, 3)
+    later = request(a, 4)
+    backend.running.pop(0).callback(b"hocr")
+    assert other[0][0] == b"hocr"
+    a.close()
+    assert later[0].check(CancelledError)
+    assert request(a, 5)[0].check(CancelledError)
+    backend.running.pop(0).callback(b"")
+    assert finished[0][0] == b""
+    assert served(backend) == [1, 11, 3]
+    assert pool.running == 0
+    assert list(pool.sessions) == ["b"]
+
+    try:
+        pool.join("b")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("joined twice")
+
+
+def test_bounded_queue():
+    backend = ManualBackend(1)
+    backend.max_queued = 1
+    pool = FairOCRPool(backend)
+    a, b = pool.join("a"), pool.join("b")
+    request(a, 1)
+    request(a, 2)
+    # each session may queue up to the limit of the shared backend
+    assert request(a, 3)[0].check(OCRQueueFull)
+    assert request(b, 11) == []
+    assert (a.queued, b.queued) == (1, 1)
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeVNCFactory(Image.new("RGB", (200, 200), "white"))
+        self.port = reactor.listenTCP(0, self.server, interface="127.0.0.1")
+        self.addCleanup(self.port.stopListening)
+        self.backend = StaticBackend(HOCR)
+        self.manager = SessionManager(OCRConfig(ocr_cache_size=0, location_margin=0), self.backend)
+        self.addCleanup(self.manager.close)
+
+    @defer.inlineCallbacks
+    def test_sessions(self):
+        server = "127.0.0.1::%d" % (self.port.getHost().port,)
+        a, b = yield defer.gatherResults([self.manager.connect("a", server), self.manager.connect("b", server, img_resize=1.0)])
+        self.assertEqual(len(self.server.clients), 2)
+        self.assertIs(self.manager["a"], a)
+        self.assertIs(a.ocr_algo, self.manager.sessions["a"].algo)
+        self.assertEqual((a.ocr_algo.config.img_resize, b.ocr_algo.config.img_resize), (2.0, 1.0))
+        # both sessions run OCR on the same backend and analyze screens in the same threads
+        self.assertEqual(sorted(self.manager.ocr_pool.sessions), ["a", "b"])
+        self.assertIs(a.ocr_algo.backend.pool, b.ocr_algo.backend.pool)
+        self.assertIs(a.ocr_algo.pool, b.ocr_algo.pool)
+
+        snapshots = []
+        yield a.snapshotScreen(snapshots)
+        self.assertEqual(snapshots[0].find("Screen"), (22, 17))
+        self.assertEqual(self.manager.sessions["a"].backend.served, 1)
+
+        yield self.manager.disconnect("a")
+        self.assertEqual(list(self.manager.sessions), ["b"])
+        self.assertEqual(list(self.manager.ocr_pool.sessions), ["b"])
+
+        # the other session keeps working
+        yield b.snapshotScreen(snapshots)
+        self.assertEqual(snapshots[1].find("Screen"), (45, 35))
+        self.assertEqual([img.size for img in self.backend.images], [(400, 400), (200, 200)])
+
+    @defer.inlineCallbacks
+    def test_connection_refused(self):
+        port = self.port.getHost().port
+        yield self.port.stopListening()
+        yield self.assertFailure(self.manager.connect("a", "127.0.0.1::%d" % (port,)), ConnectionRefusedError)
+        self.assertEqual(list(self.manager.sessions), [])
+        self.assertEqual(list(self.manager.ocr_pool.sessions), [])
@@ -0,0 +1,102 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import json
+
+from PIL import Image
+
+from vncautomate.config import OCRConfig
+from vncautomate.ocr import OCRAlgorithm
+from vncautomate.trace import NULL_SPAN, Tracer
+
+from .helpers import HOCR, ManualBackend
+
+
+def test_disabled():
+    tracer = Tracer()
+    assert tracer.span("stage") is NULL_SPAN
+    tracer.instant("point")
+    assert tracer.events == []
+
+
+def test_lanes():
+    tracer = Tracer()
+    tracer.enabled = True
+    a = tracer.span("a", lanes="jobs")
+    b = tracer.span("b", lanes="jobs")
+    a.end()
+    a.end()
+    c = tracer.span("c", lanes="jobs")
+    b.end()
+    c.end()
+    assert [(event["name"], event["tid"]) for event in tracer.events] == [("a", 1), ("b", 2), ("c", 1)]
+
+
+def test_export(tmpdir):
+    algo = OCRAlgorithm(OCRConfig(ocr_cache_size=0, trace_file=str(tmpdir.join("trace.json"))))
+    algo.backend = ManualBackend(1)
+    algo.boxes_from_image = lambda img, region=None: [(10, 10, 30, 20)]
+    tracer = algo.update_tracer()
+    tracer.new_attempt()
+    results = []
+    algo.search(Image.new("L", (200, 200), 255), "Screen").addCallback(results.append)
+    while algo.backend.running:
+        algo.backend.running.pop(0).callback(HOCR)
+    assert results == [("Screen", (22, 17))]
+
+    tracer.export(algo.config.trace_file)
+    with open(algo.config.trace_file) as fd:
+        events = json.load(fd)["traceEvents"]
+    lanes = {event["tid"]: event["args"]["name"] for event in events if event["ph"] == "M"}
+    spans = [(event["name"], lanes[event["tid"]]) for event in events if event["ph"] == "X"]
+    # both jobs ran one after the other on the single worker, the second one waited in the queue
+    assert sorted(spans) == [
+        ("match", "main"),
+        ("ocr_img", "ocr 1"),
+        ("ocr_img", "ocr 2"),
+        ("parse_hocr", "main"),
+        ("parse_hocr", "main"),
+        ("queued", "queue 1"),
+        ("queued", "queue 1"),
+        ("recognize", "workers 1"),
+        ("recognize", "workers 1"),
+    ]
+    assert all(event["args"]["attempt"] == 1 for event in events if event["ph"] == "X")
+
+
+def test_export_appends(tmpdir):
+    path = str(tmpdir.join("trace.json"))
+    tracer = Tracer()
+    tracer.enabled = True
+    tracer.span("first", lanes="ocr").end()
+    tracer.export(path)
+    assert tracer.events == []
+
+    # only the new events and lanes are written
+    a = tracer.span("second", lanes="ocr")
+    tracer.span("third", lanes="ocr").end()
+    a.end()
+    tracer.export(path)
+    tracer.export(path)
+    with open(path) as fd:
+        events = json.load(fd)["traceEvents"]
+    assert [(event["name"], event["tid"]) for event in events] == [
+        ("thread_name", 0),
+        ("thread_name", 1),
+        ("first", 1),
+        ("thread_name", 2),
+        ("third", 2),
+        ("second", 1),
+    ]
+
+    # another file gets all lanes
+    tracer.span("fourth").end()
+    tracer.export(str(tmpdir.join("other.json")))
+    with open(str(tmpdir.join("other.json"))) as fd:
+        events = json.load(fd)["traceEvents"]
+    assert [(event["name"], event["tid"]) for event in events] == [
+        ("thread_name", 0),
+        ("thread_name", 1),
+        ("thread_name", 2),
+        ("fourth", 0),
+    ]
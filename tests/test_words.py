@@ -0,0 +1,135 @@
+# coding: utf-8
+from __future__ import absolute_import
+
+import numpy as np
+
+from vncautomate.ocr import OCRAlgorithm, bounding_box, center
+from vncautomate.words import WordTable, parse_hocr, parse_tsv, parse_words
+
+from .helpers import HOCR
+
+DOCUMENT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><body>
+<div class='ocr_page' title='bbox 0 0 400 300'>
+<p class='ocr_par' title='bbox 10 10 200 60'>
+<span class='ocr_line' title='bbox 10 10 200 30; baseline 0 -3'>
+<span class='ocrx_word' title='bbox 10 10 80 30; x_wconf 91'><strong>Domain</strong></span>
+<span class='ocrx_word' title='bbox 90 10 200 30; x_wconf 88'>name</span>
+</span>
+<span class='ocr_line' title='bbox 10 40 60 60'>
+<span class='ocrx_word' title='bbox 10 40 60 60; x_wconf 42'>Next</span>
+</span>
+</p>
+<p class='ocr_par' title='bbox 0 0 1 1'></p>
+<p class='ocr_par' title='bbox 10 100 90 120'>
+<span class='ocr_line' title='bbox 10 100 90 120'>
+<span class='ocrx_word' title='bbox 10 100 90 120; x_wconf 96'>Cancel</span>
+</span>
+</p>
+</div></body></html>"""
+
+TSV = b"""level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext
+1\t1\t0\t0\t0\t0\t0\t0\t400\t300\t-1\t
+2\t1\t1\t0\t0\t0\t10\t10\t190\t50\t-1\t
+3\t1\t1\t1\t0\t0\t10\t10\t190\t50\t-1\t
+4\t1\t1\t1\t1\t0\t10\t10\t190\t20\t-1\t
+5\t1\t1\t1\t1\t1\t10\t10\t70\t20\t91.5\tDomain
+5\t1\t1\t1\t1\t2\t90\t10\t110\t20\t88\tname
+4\t1\t1\t1\t2\t0\t10\t40\t50\t20\t-1\t
+5\t1\t1\t1\t2\t1\t10\t40\t50\t20\t42\tNext
+2\t1\t2\t0\t0\t0\t10\t100\t80\t20\t-1\t
+3\t1\t2\t1\t0\t0\t10\t100\t80\t20\t-1\t
+4\t1\t2\t1\t1\t0\t10\t100\t80\t20\t-1\t
+5\t1\t2\t1\t1\t1\t10\t100\t80\t20\t96\tCancel
+"""
+
+
+def test_hocr():
+    columns = parse_hocr(DOCUMENT)
+    assert columns.texts == ["Domain", "name", "Next", "Cancel"]
+    assert columns.bboxes.tolist() == [[10, 10, 80, 30], [90, 10, 200, 30], [10, 40, 60, 60], [10, 100, 90, 120]]
+    assert columns.confidences.tolist() == [91, 88, 42, 96]
+    assert columns.lines.tolist() == [0, 0, 1, 2]
+    # the empty paragraph is kept
+    assert columns.paragraphs.tolist() == [0, 0, 0, 2]
+    assert columns.paragraph_bounds().tolist() == [0, 3, 3, 4]
+
+
+def test_hocr_titles():
+    # titles without confidence are searched word by word
+    columns = parse_hocr(HOCR)
+    assert columns.texts == ["Screen", "OK"]
+    assert columns.bboxes.tolist() == [[30, 30, 60, 40], [24, 144, 44, 156]]
+    assert columns.confidences.tolist() == [-1, -1]
+
+    columns = parse_hocr(DOCUMENT.replace(b"x_wconf 88", b"x_wconf 88; x_font Arial"))
+    assert columns.bboxes.tolist()[1] == [90, 10, 200, 30]
+    assert columns.confidences.tolist() == [91, 88, 42, 96]
+
+
+def test_tsv():
+    columns = parse_tsv(TSV)
+    assert columns.texts == ["Domain", "name", "Next", "Cancel"]
+    assert columns.bboxes.tolist() == [[10, 10, 80, 30], [90, 10, 200, 30], [10, 40, 60, 60], [10, 100, 90, 120]]
+    assert columns.confidences.tolist() == [91.5, 88, 42, 96]
+    assert columns.lines.tolist() == [0, 0, 1, 2]
+    assert columns.paragraphs.tolist() == [0, 0, 0, 1]
+    assert columns.nparagraphs == 2
+
+    assert len(parse_tsv(TSV.split(b"\n5")[0])) == 0
+
+
+def test_parse_words():
+    assert parse_words(DOCUMENT).texts == parse_words(TSV).texts
+
+
+def test_get_words():
+    algo = OCRAlgorithm()
+    hocr_words = algo.get_words_from_hocr(DOCUMENT)
+    tsv_words = algo.get_words_from_hocr(TSV)
+    assert [[(word.word, word.bbox.tolist()) for word in line] for line in hocr_words] == [
+        [("Domain", [10, 10, 80, 30]), ("name", [90, 10, 200, 30]), ("Next", [10, 40, 60, 60])],
+        [],
+        [("Cancel", [10, 100, 90, 120])],
+    ]
+    assert [[word.word for word in line] for line in tsv_words] == [["Domain", "name", "Next"], ["Cancel"]]
+
+    # malformed output is ignored
+    assert algo.get_words_from_hocr(DOCUMENT[:-20]) == []
+    assert algo.get_words_from_hocr(b"5\t1\t1\t1\t1\t1\tten\t10\t70\t20\t91\tDomain\n") == []
+
+
+def test_table():
+    table = WordTable.from_columns(parse_hocr(DOCUMENT))
+    assert [[word.word for word in line] for line in table.lines()] == [["Domain", "name", "Next"], [], ["Cancel"]]
+    assert table[3].lower == "cancel"
+    assert table[3].bbox.tolist() == [10, 100, 90, 120]
+
+    moved = table.offset(-10, -10).scale(2.0)
+    assert moved.bboxes.tolist()[0] == [0, 0, 140, 40]
+    assert moved.texts is table.texts
+    assert table.bboxes.tolist()[0] == [10, 10, 80, 30]
+
+    # paragraphs without words are dropped when selecting
+    selected = table.select(np.array([False, True, False, True]))
+    assert [[word.word for word in line] for line in selected.lines()] == [["name"], ["Cancel"]]
+    assert [[word.word for word in line] for line in table.within((0, 35, 100, 200)).lines()] == [["Next"], ["Cancel"]]
+    assert len(table.within((300, 300, 400, 400)).lines()) == 0
+
+
+def test_table_from_lines():
+    words = WordTable.from_columns(parse_hocr(DOCUMENT)).lines()
+    table = WordTable.from_lines([words[0][:2], []])
+    assert (table.texts, table.nparagraphs) == (["Domain", "name"], 2)
+    assert table.centroid().tolist() == [95, 20]
+    assert table.bounding_box().tolist() == [10, 10, 200, 30]
+
+
+def test_center():
+    words = WordTable.from_columns(parse_hocr(DOCUMENT)).scale(0.5).lines()
+    assert center(words[0][:2]) == (47, 10)
+    assert bounding_box(words[0][:2]) == (5, 5, 100, 15)
+    assert bounding_box([words[0][0], words[2][0]]) == (5, 5, 45, 60)
+    # words of different tables
+    domain = WordTable.from_columns(parse_hocr(DOCUMENT)).lines()[0][0]
+    assert center([domain, words[0][1]]) == (58, 15)